@@ -0,0 +1,150 @@
+"""
+Rendering cost per tick : the pandas path the scanner used before
+TableRenderer versus TableRenderer.
+
+  python benchmarks/bench_render.py
+"""
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.synthetic import option_chain, spot_response, futures_response
+from discount_check import FetchOptionData
+from index_registry import underlying
+
+class LegacyScanner:
+  """convert_df_to_html as FetchOptionData had it before TableRenderer, verbatim."""
+  def convert_df_to_html(self, index, spot_value, fut_value, percentage_diff, cheap_style, class_name, *dfs):
+    value_diff = round(fut_value - spot_value,2)
+    html = f"""<style>{cheap_style}"""
+    html += """
+        tr{
+          line-height:30px;
+        }
+        tbody tr th:nth-child(1){
+          width:5000px;
+        }
+        table tr td:nth-child(12){
+          background-color: #C5C5C5;
+          color: black;
+          text-align:center;
+          font-weight:bold;
+          font-size:16px;
+        }
+        table tr:nth-child(1){
+          font-weight:bold;
+        }
+        table tr td:nth-child(0){text-align:center; font-size:16px;}
+        table tr td:nth-child(1){text-align:center; font-size:16px;}
+        table tr td:nth-child(2){text-align:center; font-size:16px;}
+        table tr td:nth-child(3){text-align:center; font-size:16px;}
+        table tr td:nth-child(4){text-align:center; font-size:16px;}
+        table tr td:nth-child(5){text-align:center; font-size:16px;}
+        table tr td:nth-child(6){text-align:center; font-size:16px;}
+        table tr td:nth-child(7){text-align:center; font-size:16px;}
+        table tr td:nth-child(8){text-align:center; font-size:16px;}
+        table tr td:nth-child(9){text-align:center; font-size:16px;}
+        table tr td:nth-child(10){text-align:center; font-size:16px;}
+        table tr td:nth-child(11){text-align:center; font-size:16px;}
+        table tr td:nth-child(13){text-align:center; font-size:16px;}
+        table tr td:nth-child(14){text-align:center; font-size:16px;}
+        table tr td:nth-child(15){text-align:center; font-size:16px;}
+        table tr td:nth-child(16){text-align:center; font-size:16px;}
+        table tr td:nth-child(17){text-align:center; font-size:16px;}
+        table tr td:nth-child(18){text-align:center; font-size:16px;}
+        table tr td:nth-child(19){text-align:center; font-size:16px;}
+        table tr td:nth-child(20){text-align:center; font-size:16px;}
+        table tr td:nth-child(21){text-align:center; font-size:16px;}
+        table tr td:nth-child(22){text-align:center; font-size:16px;}
+        .set{
+          border-bottom: 5px double white;
+          padding: 10px;
+        }
+        #discount {
+          text-align: center;
+          background-color: lightgreen;
+          color: black;
+          font-weight: bold;
+          font-size: 12px;
+        }
+        caption{
+          font-size: 14px;
+          font-weight: bold;
+          padding: 5px;
+        }
+        #dataframe{
+          margin-top : 30px;
+          width : 100%;
+        }
+        .atm{
+          background-color: #C5C5C5; 
+          color: black; 
+          text-align: center;
+        }
+        .calls{
+          background-color: #32CD32; 
+          color: black; 
+          text-align: center;
+        }
+        .puts{
+          background-color: #FF5C5C; 
+          color: black; 
+          text-align: center;
+        }
+        content{
+          margin-left:10px;
+        }
+      </style>
+    """
+
+    html += '<div style="padding-left:30px; padding-right:30px">'
+    for df in dfs:
+        html += df.T.to_html()
+    html += '</div>'
+    html = html.replace("""<table border="1" class="dataframe">""", f"""<table border="1" class="dataframe {class_name}" id="dataframe">""")
+    html = html.replace("""<td>Discount</td>""",'<td id="discount">Discount</td>')
+    html = html.replace("""<th>10</th>""",'<th class="atm">ATM</th>')
+    html = html.replace("""<th>0</th>\n      <th>1</th>\n      <th>2</th>\n      <th>3</th>\n      <th>4</th>\n      <th>5</th>\n      <th>6</th>\n      <th>7</th>\n      <th>8</th>\n      <th>9</th>\n      """,'<th colspan=10 class="calls">Calls</th>')
+    html = html.replace("""<th>11</th>\n      <th>12</th>\n      <th>13</th>\n      <th>14</th>\n      <th>15</th>\n      <th>16</th>\n      <th>17</th>\n      <th>18</th>\n      <th>19</th>\n      <th>20</th>\n    """,'<th colspan=10 class="puts">Puts</th>')
+    html = html.replace(
+        f"""<table border="1" class="dataframe {class_name}" id="dataframe">""", 
+        f"""
+        <table border="1" class="dataframe {class_name}" id="dataframe">
+          <colgroup>
+            <col style="width:6%">
+          </colgroup>  
+          <caption>{index} Spot : {spot_value}</caption>
+          <caption>{index} Fut : {fut_value} <span style='color:{'#FF5C5C' if value_diff<0 else '#32CD32'}'>({value_diff})</span></caption>
+        """)
+
+    html = html.replace("&lt;br&gt;",  "<br>")
+    return html
+
+def legacy_html(snapshot):
+  """Old rendering of a snapshot : its DataFrame transposed to HTML, then patched by string replaces."""
+  class_name = underlying(snapshot.index).class_name
+  row = 4 if snapshot.cheap == 'CE' else 5
+  cheap_style = f""".{class_name} tr:nth-child({row}) td:nth-child(12){{background-color:#32CD32;color: black;}}"""
+  df = snapshot.result.to_frame(snapshot.atm_label)
+  return LegacyScanner().convert_df_to_html(snapshot.index, snapshot.spot_value, snapshot.futures_value, snapshot.percentage_diff,
+                                            cheap_style, class_name, df)
+
+def main(number=200):
+  scanner = FetchOptionData.offline()
+  for index in ('NIFTY', 'BANKNIFTY'):
+    snapshot = scanner.compute(index, spot_response(index), futures_response(index), option_chain(index))
+
+    def pandas_html():
+      return legacy_html(snapshot)
+
+    def renderer_html():
+      return scanner.render_table(snapshot)
+
+    for name, f in (('pandas', pandas_html), ('renderer', renderer_html)):
+      seconds = timeit.timeit(f, number=number)/number
+      print(f'{index:<10} {name:<9} {seconds*1e6:9.1f} us/tick {len(f()):7d} bytes/tick')
+
+if __name__ == '__main__':
+  main()
@@ -0,0 +1,362 @@
+"""
+Local stand-in for the 5paisa API, for load tests that must not touch the
+real broker. Serves the routes the scanner and the order path use, with
+configurable latency, jitter, error rate and option chain size :
+
+  python benchmarks/fake_broker.py --port 8800 --latency 0.03 --jitter 0.01 --error-rate 0.01
+
+then point a client at it with FivePaisaClient(..., base_url='http://127.0.0.1:8800')
+or FetchOptionData(..., BASE_URL=...). Every host of py5paisa.urlconst
+collapses onto this server, routes are told apart by their path.
+"""
+import os
+import sys
+import json
+import time
+import base64
+import random
+import asyncio
+import argparse
+import threading
+import itertools
+import collections
+
+from aiohttp import web, WSMsgType, WSCloseCode
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from benchmarks.synthetic import option_chain, STEPS, SPOTS
+
+INDEX_SCRIP_CODE = {'999920000' : 'NIFTY', '999920005' : 'BANKNIFTY', '999920041' : 'FINNIFTY'}
+FUTURES_SCRIP_CODE = {'NIFTY' : 35001, 'BANKNIFTY' : 35002, 'FINNIFTY' : 35003}
+ORDER_ROUTES = ('V1/PlaceOrderRequest', 'V1/ModifyOrderRequest', 'V1/CancelOrderRequest')
+
+def expiry_date(epoch_ms):
+  return f'/Date({epoch_ms}+0530)/'
+
+def fake_jwt(lifetime):
+  claims = json.dumps({'sub' : 'FAKE0001', 'exp' : time.time() + lifetime}).encode()
+  return 'eyJhbGciOiJub25lIn0.' + base64.urlsafe_b64encode(claims).rstrip(b'=').decode() + '.'
+
+def token_expired(request):
+  # Tokens that are not fake JWTs are let through
+  token = request.headers.get('Authorization', '').replace('Bearer ', '', 1)
+  try:
+    claims = token.split('.')[1]
+    return json.loads(base64.urlsafe_b64decode(claims + '=' * (-len(claims) % 4)))['exp'] < time.time()
+  except Exception:
+    return False
+
+
+class FakeBroker:
+  """
+  aiohttp server emulating the REST routes and the MarketFeedV3 socket.
+  Each request waits max(0, gauss(latency, jitter)) seconds, `tail_latency`
+  seconds more with probability `tail_rate`, and fails with a 503 with
+  probability `error_rate`. Option chains list
+  `strikes_each_side` strikes around a spot that random walks per index.
+  GetExpiryForSymbolOptions lists `expiries` (epoch milliseconds) so the
+  scanner's expiry checks pass. The feed socket pushes a tick for a share
+  `tick_ratio` of the subscribed codes every `tick_interval` seconds, the
+  20 level depth socket a full ladder of every subscribed instrument.
+  Login issues unsigned JWTs expiring after `token_lifetime` seconds,
+  requests carrying an expired one are answered with a 401. With `echo`
+  every response body carries the request payload under 'Echo'.
+  """
+  def __init__(self, latency=0.02, jitter=0.01, error_rate=0.0, strikes_each_side=60,
+               expiries=(), tick_interval=0.2, tick_ratio=0.3, seed=1, token_lifetime=8*3600,
+               tail_rate=0.0, tail_latency=0.5, echo=False):
+    self.latency = latency
+    self.jitter = jitter
+    self.tail_rate = tail_rate
+    self.tail_latency = tail_latency
+    self.echo = echo
+    self.error_rate = error_rate
+    self.strikes_each_side = strikes_each_side
+    self.expiries = list(expiries)
+    self.tick_interval = tick_interval
+    self.tick_ratio = tick_ratio
+    self.token_lifetime = token_lifetime
+    self.random = random.Random(seed)
+    self.spots = dict(SPOTS)
+    self.chain_seeds = itertools.count(seed)
+    self.order_ids = itertools.count(100000)
+    self.requests = collections.Counter()
+    self.errors = collections.Counter()
+    self.sockets = 0
+    self.open_sockets = set()
+    self.ticks_sent = 0
+    self.loop = None
+    self.thread = None
+    self.runner = None
+    self.url = None
+
+  # Routes
+
+  def app(self):
+    app = web.Application()
+    app.router.add_get('/Feeds/api/chat', self.market_feed_socket)
+    app.router.add_get('/ws', self.depth_socket)
+    app.router.add_post('/marketfeed-token/token', self.depth_token)
+    app.router.add_route('*', '/{path:.*}', self.handle)
+    return app
+
+  def routes(self):
+    return {
+      'V4/LoginRequestMobileNewbyEmail' : self.login,
+      'V2/GetExpiryForSymbolOptions' : self.expiry,
+      'GetOptionsForSymbol' : self.option_chain,
+      'V1/MarketDepth' : self.market_depth,
+      'MarketFeed' : self.market_feed,
+      'V1/OrderStatus' : self.order_status,
+      **{route : self.order for route in ORDER_ROUTES}}
+
+  def route_name(self, path):
+    for route in self.routes():
+      if path.endswith('/' + route):
+        return route
+    return path.rsplit('/', 1)[-1] or path
+
+  async def handle(self, request):
+    route = self.route_name(request.path)
+    self.requests[route] += 1
+    delay = max(0.0, self.random.gauss(self.latency, self.jitter))
+    if self.random.random() < self.tail_rate:
+      delay += self.tail_latency
+    await asyncio.sleep(delay)
+    if self.random.random() < self.error_rate:
+      self.errors[route] += 1
+      return web.Response(status=503, text='Service Unavailable')
+    if token_expired(request):
+      self.errors[route] += 1
+      return web.json_response({'head' : {'status' : '1', 'statusDescription' : 'Invalid Token'}, 'body' : None}, status=401)
+    try:
+      payload = await request.json()
+    except ValueError:
+      payload = {}
+    handler = self.routes().get(route, self.generic)
+    body = handler(payload.get('body') or {})
+    if self.echo and isinstance(body, dict):
+      body['Echo'] = payload
+    return web.json_response({'head' : {'status' : '0', 'statusDescription' : 'Success'}, 'body' : body})
+
+  def login(self, body):
+    return {'Message' : '', 'ClientCode' : 'FAKE0001', 'JWTToken' : fake_jwt(self.token_lifetime)}
+
+  def spot(self, index):
+    # A slow random walk keeps ATM strikes moving now and then
+    spot = self.spots[index] = round(self.spots[index] + self.random.gauss(0, STEPS[index]/10), 2)
+    return spot
+
+  def expiry(self, body):
+    index = body.get('Symbol', 'NIFTY')
+    return {'Message' : '', 'lastrate' : [{'LTP' : self.spot(index)}],
+            'Expiry' : [{'ExpiryDate' : expiry_date(epoch)} for epoch in self.expiries]}
+
+  def option_chain(self, body):
+    index = body.get('Symbol', 'NIFTY')
+    chain = option_chain(index, self.strikes_each_side, seed=next(self.chain_seeds), spot=self.spots[index])
+    chain['Message'] = ''
+    return chain
+
+  def market_depth(self, body):
+    data = []
+    for item in body.get('Data', []):
+      index = item.get('Symbol', 'NIFTY').split(' ')[0]
+      data.append({'LastTradedPrice' : round(self.spots.get(index, 0) + 40.5, 2),
+                   'ScripCode' : FUTURES_SCRIP_CODE.get(index, 0)})
+    return {'Message' : '', 'Data' : data}
+
+  def market_feed(self, body):
+    return {'Message' : '', 'Data' : [{'Token' : item.get('ScripCode'), 'LastRate' : self.price(item.get('ScripCode'))}
+                                      for item in body.get('MarketFeedData', [])]}
+
+  def order(self, body):
+    order_id = next(self.order_ids)
+    return {'Message' : 'Success', 'Status' : 0, 'BrokerOrderID' : order_id,
+            'ExchOrderID' : str(order_id), 'RemoteOrderID' : body.get('RemoteOrderID', '')}
+
+  def order_status(self, body):
+    return {'Message' : '', 'OrdStatusResLst' : [
+      {'ExchOrderID' : str(next(self.order_ids)), 'Status' : 'Fully Executed'} for _ in body.get('OrdStatusReqList', [])]}
+
+  def generic(self, body):
+    return {'Message' : ''}
+
+  # Market feed socket
+
+  def futures_price(self, code):
+    for index, futures_code in FUTURES_SCRIP_CODE.items():
+      if futures_code == code:
+        return round(self.spots[index] + 40.5, 2)
+    return None
+
+  def depth_details(self, code):
+    price = self.futures_price(code) or self.price(code)
+    tick = 0.05
+    levels = []
+    for side, flag in ((-1, 66), (1, 83)):
+      for level in range(20):
+        levels.append({'Price' : round(price + side * tick * (level + 1), 2), 'Quantity' : self.random.randint(1, 40) * 50,
+                       'NumberOfOrders' : self.random.randint(1, 20), 'BbBuySellFlag' : flag})
+    return levels
+
+  async def depth_token(self, request):
+    self.requests['marketfeed-token/token'] += 1
+    return web.json_response({'access_token' : 'fake-depth-token'})
+
+  async def depth_socket(self, request):
+    # Instruments are named exchange, segment and scrip code, e.g. ND35001
+    self.requests['ws'] += 1
+    ws = web.WebSocketResponse()
+    await ws.prepare(request)
+    self.sockets += 1
+    self.open_sockets.add(ws)
+    subscribed = set()
+
+    async def push():
+      while not ws.closed:
+        await asyncio.sleep(self.tick_interval)
+        if subscribed:
+          await ws.send_str(json.dumps([{'Token' : code, 'TimeStamp' : int(time.time()*1000),
+                                         'Details' : self.depth_details(code)} for code in subscribed]))
+          self.ticks_sent += len(subscribed)
+
+    pusher = asyncio.get_running_loop().create_task(push())
+    try:
+      async for frame in ws:
+        if frame.type != WSMsgType.TEXT:
+          continue
+        message = json.loads(frame.data)
+        codes = {int(instrument[2:]) for instrument in message.get('instruments', [])}
+        if message.get('method') == 'unsubscribe':
+          subscribed.difference_update(codes)
+        else:
+          subscribed.update(codes)
+    finally:
+      pusher.cancel()
+      self.sockets -= 1
+      self.open_sockets.discard(ws)
+    return ws
+
+  def price(self, code):
+    index = INDEX_SCRIP_CODE.get(str(code))
+    if index is not None:
+      return self.spots[index]
+    return round(max(0.05, self.random.uniform(1, 400)), 2)
+
+  async def market_feed_socket(self, request):
+    self.requests['Feeds/api/chat'] += 1
+    ws = web.WebSocketResponse()
+    await ws.prepare(request)
+    self.sockets += 1
+    self.open_sockets.add(ws)
+    subscribed = set()
+    prices = {}
+
+    async def push():
+      while not ws.closed:
+        await asyncio.sleep(self.tick_interval)
+        codes = [code for code in subscribed if self.random.random() < self.tick_ratio]
+        if not codes:
+          continue
+        now = int(time.time()*1000)
+        ticks = []
+        for code in codes:
+          index = INDEX_SCRIP_CODE.get(str(code))
+          if index is not None:
+            prices[code] = self.spot(index)
+          else:
+            prices[code] = round(max(0.05, prices.get(code, self.price(code)) + self.random.gauss(0, 1)), 2)
+          ticks.append({'Token' : int(code), 'LastRate' : prices[code], 'TickDt' : f'/Date({now})/',
+                        'TotalQty' : self.random.randint(0, 10**6), 'OpenInterest' : 0})
+        await ws.send_str(json.dumps(ticks))
+        self.ticks_sent += len(ticks)
+
+    pusher = asyncio.get_running_loop().create_task(push())
+    try:
+      async for frame in ws:
+        if frame.type != WSMsgType.TEXT:
+          continue
+        message = json.loads(frame.data)
+        codes = [item.get('ScripCode') for item in message.get('MarketFeedData', [])]
+        if message.get('Operation') == 'u':
+          subscribed.difference_update(codes)
+        else:
+          subscribed.update(codes)
+    finally:
+      pusher.cancel()
+      self.sockets -= 1
+      self.open_sockets.discard(ws)
+    return ws
+
+  # Lifecycle
+
+  async def _start(self, host, port):
+    self.runner = web.AppRunner(self.app(), access_log=None)
+    await self.runner.setup()
+    site = web.TCPSite(self.runner, host, port)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+    self.url = f'http://{host}:{port}'
+
+  def start(self, host='127.0.0.1', port=0):
+    """Serves on a background thread, `port` 0 picks a free one. Returns self, see `url`."""
+    self.loop = asyncio.new_event_loop()
+    self.thread = threading.Thread(target=self.loop.run_forever, daemon=True)
+    self.thread.start()
+    asyncio.run_coroutine_threadsafe(self._start(host, port), self.loop).result()
+    return self
+
+  async def _stop(self):
+    # Open sockets would hold the cleanup until aiohttp's shutdown timeout, clients see them drop
+    for ws in list(self.open_sockets):
+      await ws.close(code=WSCloseCode.GOING_AWAY)
+    await self.runner.cleanup()
+
+  def stop(self):
+    if self.loop is None:
+      return
+    asyncio.run_coroutine_threadsafe(self._stop(), self.loop).result()
+    self.loop.call_soon_threadsafe(self.loop.stop)
+    self.thread.join()
+    self.loop.close()
+    self.loop = None
+
+  def __enter__(self):
+    return self.start()
+
+  def __exit__(self, *exc):
+    self.stop()
+
+  def stats(self):
+    return {'requests' : dict(self.requests), 'errors' : dict(self.errors), 'ticks_sent' : self.ticks_sent}
+
+
+def main(argv=None):
+  parser = argparse.ArgumentParser(description='Local stand-in for the 5paisa API')
+  parser.add_argument('--host', default='127.0.0.1')
+  parser.add_argument('--port', type=int, default=8800)
+  parser.add_argument('--latency', type=float, default=0.02, help='mean response delay in seconds')
+  parser.add_argument('--jitter', type=float, default=0.01, help='standard deviation of the delay')
+  parser.add_argument('--error-rate', type=float, default=0.0, help='share of requests answered with a 503')
+  parser.add_argument('--strikes', type=int, default=60, help='option chain strikes each side of spot')
+  parser.add_argument('--expiry', action='append', type=int, default=[], help='listed expiry, epoch milliseconds')
+  args = parser.parse_args(argv)
+
+  broker = FakeBroker(args.latency, args.jitter, args.error_rate, args.strikes, args.expiry)
+  broker.start(args.host, args.port)
+  print(f'Serving on {broker.url}, Ctrl-C to stop', flush=True)
+  try:
+    while True:
+      time.sleep(3600)
+  except KeyboardInterrupt:
+    pass
+  finally:
+    broker.stop()
+    print(json.dumps(broker.stats(), indent=2))
+  return 0
+
+if __name__ == '__main__':
+  sys.exit(main())
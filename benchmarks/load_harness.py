@@ -0,0 +1,200 @@
+"""
+End-to-end load test of the scanner and the order path against the local
+FakeBroker, never the real API :
+
+  python benchmarks/load_harness.py stream --ticks 100 [--fetch-mode process|async] [--feed rest|websocket] [--no-pipeline] [--hedge] [--depth-books]
+  python benchmarks/load_harness.py orders --orders 1000 --concurrency 16
+
+Both take the broker settings --latency, --jitter, --tail-rate,
+--tail-latency, --error-rate and --strikes, and --rate-limit to turn the
+client's shared rate limit on. `stream` runs FetchOptionData.stream for
+--ticks ticks and reports the tick latency (fetch start to render, REST
+feed only), the interval between rendered ticks and the broker
+requests/second. `orders` places orders from --concurrency threads
+sharing one client and reports the order round trip and orders/second. Stage latencies come from
+metrics_registry.
+"""
+import os
+import sys
+import time
+import argparse
+import threading
+import concurrent.futures
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from benchmarks.fake_broker import FakeBroker
+from py5paisa import FivePaisaClient, metrics_registry, getEpochTime, convertTimeString
+
+CREDS = {'APP_SOURCE' : '1', 'APP_NAME' : 'loadtest', 'USER_ID' : 'loadtest', 'PASSWORD' : 'loadtest',
+         'USER_KEY' : 'loadtest', 'ENCRYPTION_KEY' : 'loadtestencryptionkey'}
+LOGIN = ('loadtest@example.com', 'password', '19900101')
+
+OPT_EXPIRY = '2023-03-16'
+FIN_OPT_EXPIRY = '2023-03-21'
+FUT_EXPIRY = '2023-03-29'
+FIN_FUT_EXPIRY = '2023-03-28'
+
+ORDER = {'OrderType' : 'B', 'Exchange' : 'N', 'ExchangeType' : 'C', 'ScripCode' : 1660,
+         'Qty' : 1, 'Price' : 0, 'IsIntraday' : True}
+
+
+class TickLimitReached(Exception):
+  pass
+
+
+def broker_expiries():
+  return [getEpochTime(OPT_EXPIRY), getEpochTime(FIN_OPT_EXPIRY),
+          getEpochTime(convertTimeString(FUT_EXPIRY), ' '), getEpochTime(convertTimeString(FIN_FUT_EXPIRY), ' ')]
+
+def start_broker(args):
+  return FakeBroker(args.latency, args.jitter, args.error_rate, args.strikes, broker_expiries(),
+                    tail_rate=args.tail_rate, tail_latency=args.tail_latency).start()
+
+def transport_options(args, **options):
+  return dict(options, rate_limit=args.rate_limit or None)
+
+def requests_served(broker):
+  return sum(broker.requests.values())
+
+
+class TickClock:
+  """
+  Wraps the scanner's fetch_values and compute_tick to stamp every tick
+  with the time its fetch started, so render can tell its age. Ticks the
+  pipeline drops are never rendered and never measured.
+  """
+  def __init__(self, scanner):
+    self.fetched = {}
+    self.computed = {}
+    fetch_values, compute_tick = scanner.fetch_values, scanner.compute_tick
+
+    def stamped_fetch(jobs):
+      started = time.perf_counter()
+      values = fetch_values(jobs)
+      self.fetched[id(values)] = started
+      return values
+
+    def stamped_compute(jobs, values):
+      result = compute_tick(jobs, values)
+      self.computed[id(result)] = self.fetched.pop(id(values), None)
+      return result
+
+    scanner.fetch_values = stamped_fetch
+    scanner.compute_tick = stamped_compute
+
+  def age(self, result):
+    started = self.computed.pop(id(result), None)
+    return None if started is None else time.perf_counter() - started
+
+
+def run_stream(args):
+  from discount_check import FetchOptionData
+
+  with start_broker(args) as broker:
+    scanner = FetchOptionData(
+      CREDS, *LOGIN,
+      getEpochTime(OPT_EXPIRY), getEpochTime(FIN_OPT_EXPIRY),
+      True, True, True,
+      convertTimeString(FUT_EXPIRY), convertTimeString(FIN_FUT_EXPIRY),
+      FETCH_MODE=args.fetch_mode, FEED=args.feed, PIPELINE=not args.no_pipeline,
+      NOTIFY=lambda message, level='info' : None, BASE_URL=broker.url,
+      TRANSPORT=transport_options(args, hedge=args.hedge), DEPTH_BOOKS=args.depth_books)
+    clock = TickClock(scanner) if args.feed == 'rest' else None
+    state = {'ticks' : 0, 'failed' : 0, 'last' : None}
+
+    def render(snapshots):
+      now = time.perf_counter()
+      if clock is not None:
+        age = clock.age(snapshots)
+        if age is not None:
+          metrics_registry.record('harness.tick_latency', age)
+      if state['last'] is not None:
+        metrics_registry.record('harness.tick_interval', now - state['last'])
+      state['last'] = now
+      state['ticks'] += 1
+      state['failed'] += sum(snapshot is None for snapshot in snapshots.values())
+      if state['ticks'] >= args.ticks:
+        raise TickLimitReached
+
+    metrics_registry.reset()
+    served = requests_served(broker)
+    started = time.perf_counter()
+    try:
+      scanner.stream(render=render)
+    except TickLimitReached:
+      pass
+    finally:
+      elapsed = time.perf_counter() - started
+      scanner.close()
+
+    print(metrics_registry.format_summary())
+    print(f"\n{state['ticks']} ticks in {elapsed:.2f}s : {state['ticks']/elapsed:.1f} ticks/s, "
+          f"{state['failed']} failed index snapshots")
+    print(f'{requests_served(broker) - served} broker requests : {(requests_served(broker) - served)/elapsed:.1f} requests/s, '
+          f'{sum(broker.errors.values())} injected errors, {broker.ticks_sent} feed ticks sent')
+    if args.hedge:
+      stats = scanner.client.transport.stats()
+      print(f"{stats.get('hedges', 0)} hedges : {stats['hedge_rate']:.1%} of hedgeable requests, "
+            f"{stats['hedge_win_rate']:.1%} answered first")
+  return 0
+
+
+def run_orders(args):
+  with start_broker(args) as broker:
+    client = FivePaisaClient(*LOGIN, cred=CREDS, base_url=broker.url, transport=transport_options(args))
+    client.login()
+    if not client.is_logged_in:
+      print('Login against the fake broker failed')
+      return 1
+
+    metrics_registry.reset()
+    lock = threading.Lock()
+    outcome = {'placed' : 0, 'failed' : 0}
+
+    def place(_):
+      response = client.place_order(**ORDER)
+      with lock:
+        outcome['placed' if response and response.get('BrokerOrderID') else 'failed'] += 1
+
+    started = time.perf_counter()
+    with concurrent.futures.ThreadPoolExecutor(args.concurrency) as pool:
+      list(pool.map(place, range(args.orders)))
+    elapsed = time.perf_counter() - started
+
+    print(metrics_registry.format_summary())
+    print(f"\n{outcome['placed']} orders placed, {outcome['failed']} failed in {elapsed:.2f}s : "
+          f"{args.orders/elapsed:.1f} orders/s with {args.concurrency} threads")
+  return 0
+
+
+def main(argv=None):
+  parser = argparse.ArgumentParser(description='Load test the scanner and order path against a local fake broker')
+  broker = argparse.ArgumentParser(add_help=False)
+  broker.add_argument('--latency', type=float, default=0.02, help='mean broker response delay in seconds')
+  broker.add_argument('--jitter', type=float, default=0.01, help='standard deviation of the delay')
+  broker.add_argument('--tail-rate', type=float, default=0.0, help='share of requests delayed by --tail-latency')
+  broker.add_argument('--tail-latency', type=float, default=0.5, help='extra delay of the slow requests in seconds')
+  broker.add_argument('--error-rate', type=float, default=0.0, help='share of requests failing with a 503')
+  broker.add_argument('--strikes', type=int, default=60, help='option chain strikes each side of spot')
+  broker.add_argument('--rate-limit', action='store_true', help="pace requests to the client's default route rates")
+  scenarios = parser.add_subparsers(dest='scenario', required=True)
+
+  stream = scenarios.add_parser('stream', parents=[broker], help='FetchOptionData.stream ticks')
+  stream.add_argument('--ticks', type=int, default=50)
+  stream.add_argument('--fetch-mode', choices=('process', 'async'), default='async')
+  stream.add_argument('--feed', choices=('rest', 'websocket'), default='rest')
+  stream.add_argument('--no-pipeline', action='store_true', help='serial fetch, compute, render loop')
+  stream.add_argument('--hedge', action='store_true', help='hedge slow option chain and market depth requests')
+  stream.add_argument('--depth-books', action='store_true', help='futures values from the depth feed order books')
+
+  orders = scenarios.add_parser('orders', parents=[broker], help='concurrent place_order calls')
+  orders.add_argument('--orders', type=int, default=500)
+  orders.add_argument('--concurrency', type=int, default=8)
+
+  args = parser.parse_args(argv)
+  return run_stream(args) if args.scenario == 'stream' else run_orders(args)
+
+if __name__ == '__main__':
+  sys.exit(main())
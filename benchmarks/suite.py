@@ -0,0 +1,183 @@
+"""
+Microbenchmarks of the tick hot paths, compared against stored baselines.
+
+  python benchmarks/suite.py                 # run and compare with benchmarks/baseline.json
+  python benchmarks/suite.py --save          # run and store the results as the new baseline
+  python benchmarks/suite.py -k run -k html  # only cases whose name contains one of the filters
+
+Every case reports the median time per call and the peak memory
+allocated during one call (tracemalloc). A case regresses when either is
+more than --threshold above its baseline, and the exit status is then 1.
+Baselines are machine specific : refresh them with --save on the machine
+the comparison runs on.
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import platform
+import statistics
+import tracemalloc
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from benchmarks.synthetic import option_chain, spot_response, futures_response
+from discount_check import FetchOptionData
+from py5paisa import getEpochTime
+from py5paisa.auth import EncryptionClient
+
+BASELINE = os.path.join(ROOT, 'benchmarks', 'baseline.json')
+
+# Strikes each side of spot listed for an expiry, roughly a live weekly chain
+CHAIN_SIZE = {'NIFTY' : 75, 'BANKNIFTY' : 60, 'FINNIFTY' : 50}
+INDICES = list(CHAIN_SIZE)
+EXPIRIES = (1, 3, 5)
+
+CASES = {}
+
+def case(name):
+  def register(setup):
+    CASES[name] = setup
+    return setup
+  return register
+
+def scanner():
+  return FetchOptionData.offline()
+
+def payloads(index, expiries):
+  return [(spot_response(index), futures_response(index), option_chain(index, CHAIN_SIZE[index], seed=seed))
+          for seed in range(expiries)]
+
+for index in INDICES:
+  @case(f'getStrikes[{index}]')
+  def _(index=index):
+    s = scanner()
+    return lambda: s.getStrikes(index, 17432.35)
+
+  for expiries in EXPIRIES:
+    @case(f'run[{index} x{expiries} expiries]')
+    def _(index=index, expiries=expiries):
+      s = scanner()
+      chains = payloads(index, expiries)
+      def run():
+        for spot, futures, chain in chains:
+          s.run(index, spot, futures, chain)
+      return run
+
+  # convert_df_to_html was replaced by TableRenderer, render_table is its successor
+  @case(f'render_table[{index}]')
+  def _(index=index):
+    s = scanner()
+    snapshot = s.compute(index, *payloads(index, 1)[0])
+    return lambda: s.render_table(snapshot)
+
+@case('index_stack[3 indices]')
+def _():
+  s = scanner()
+  tables = {index : s.run(index, *payloads(index, 1)[0])[1] for index in INDICES}
+  return lambda: s.stack_html(tables)
+
+@case('getEpochTime')
+def _():
+  return lambda: getEpochTime('2023-03-16')
+
+@case('EncryptionClient.encrypt')
+def _():
+  client = EncryptionClient('benchmarkkey')
+  return lambda: client.encrypt('user@example.com')
+
+
+def time_per_call(fn, min_time=0.2, repeat=5):
+  loops = 1
+  while True:
+    started = time.perf_counter()
+    for _ in range(loops):
+      fn()
+    if time.perf_counter() - started >= min_time/repeat or loops >= 1 << 20:
+      break
+    loops *= 2
+  samples = []
+  for _ in range(repeat):
+    started = time.perf_counter()
+    for _ in range(loops):
+      fn()
+    samples.append((time.perf_counter() - started)/loops)
+  return statistics.median(samples), min(samples)
+
+def peak_allocation(fn):
+  tracemalloc.start()
+  try:
+    fn()
+    tracemalloc.reset_peak()
+    before, _ = tracemalloc.get_traced_memory()
+    fn()
+    _, peak = tracemalloc.get_traced_memory()
+    return max(0, peak - before)
+  finally:
+    tracemalloc.stop()
+
+def run_cases(filters):
+  results = {}
+  for name, setup in CASES.items():
+    if filters and not any(f in name for f in filters):
+      continue
+    fn = setup()
+    fn()
+    median, best = time_per_call(fn)
+    results[name] = {'median_us' : round(median*1e6, 2), 'min_us' : round(best*1e6, 2),
+                     'peak_kb' : round(peak_allocation(fn)/1024, 1)}
+    print(f"{name:<34}{results[name]['median_us']:>12.1f} us{results[name]['peak_kb']:>12.1f} KB", flush=True)
+  return results
+
+def machine():
+  return {'python' : platform.python_version(), 'machine' : platform.machine(), 'processor' : platform.processor()}
+
+def compare(results, baseline, threshold):
+  regressions = []
+  for name, result in results.items():
+    base = baseline.get(name)
+    if base is None:
+      continue
+    for metric, slack in (('median_us', 0), ('peak_kb', 1)):
+      if result[metric] > base[metric]*(1 + threshold) + slack:
+        regressions.append(f'{name} {metric} {base[metric]} -> {result[metric]}')
+  return regressions
+
+def main(argv=None):
+  parser = argparse.ArgumentParser(description='Tick hot path microbenchmarks')
+  parser.add_argument('-k', dest='filters', action='append', default=[], help='only cases containing this text')
+  parser.add_argument('--save', action='store_true', help='store the results as the baseline')
+  parser.add_argument('--baseline', default=BASELINE)
+  parser.add_argument('--threshold', type=float, default=0.25, help='allowed slowdown/growth ratio')
+  args = parser.parse_args(argv)
+
+  results = run_cases(args.filters)
+  if args.save:
+    stored = {'machine' : machine(), 'results' : {}}
+    if os.path.exists(args.baseline):
+      with open(args.baseline) as f:
+        stored['results'] = json.load(f).get('results', {})
+    stored['results'].update(results)
+    with open(args.baseline, 'w') as f:
+      json.dump(stored, f, indent=2, sort_keys=True)
+    print(f'Baseline saved to {args.baseline}')
+    return 0
+
+  if not os.path.exists(args.baseline):
+    print('No baseline to compare with, run with --save first')
+    return 0
+  with open(args.baseline) as f:
+    stored = json.load(f)
+  if stored.get('machine') != machine():
+    print(f"Baseline recorded on {stored.get('machine')}, timings may not compare")
+  regressions = compare(results, stored['results'], args.threshold)
+  for regression in regressions:
+    print('REGRESSION', regression)
+  if not regressions:
+    print('No regression against the baseline')
+  return 1 if regressions else 0
+
+if __name__ == '__main__':
+  sys.exit(main())
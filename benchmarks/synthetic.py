@@ -0,0 +1,37 @@
+import random
+
+STEPS = {'NIFTY' : 50, 'BANKNIFTY' : 100, 'FINNIFTY' : 50, 'MIDCPNIFTY' : 25}
+SPOTS = {'NIFTY' : 17432.35, 'BANKNIFTY' : 40123.45, 'FINNIFTY' : 18011.2, 'MIDCPNIFTY' : 8862.4}
+
+def option_chain(index, strikes_each_side=60, seed=1, spot=None):
+  """
+  GetOptionsForSymbol shaped response with `strikes_each_side` strikes
+  around the index spot, CE and PE legs in random order.
+  """
+  rnd = random.Random(seed)
+  spot = SPOTS[index] if spot is None else spot
+  step = STEPS[index]
+  atm = round(spot/step)*step
+  options = []
+  for k in range(-strikes_each_side, strikes_each_side + 1):
+    strike = float(atm + k*step)
+    for cp_type in ('CE', 'PE'):
+      intrinsic = max(0, spot - strike if cp_type == 'CE' else strike - spot)
+      options.append({
+        'CPType' : cp_type,
+        'StrikeRate' : strike,
+        'LastRate' : round(max(0.05, intrinsic + rnd.uniform(-15, 40)), 2),
+        'ScripCode' : 40000 + 2*(k + strikes_each_side) + (cp_type == 'PE'),
+        'OpenInterest' : rnd.randint(0, 10**6),
+        'PreviousClose' : 0,
+        'Volume' : rnd.randint(0, 10**5),
+        'Name' : f'{index} {cp_type} {strike:.2f}'})
+  rnd.shuffle(options)
+  return {'Options' : options}
+
+def spot_response(index, spot=None):
+  return {'lastrate' : [{'LTP' : SPOTS[index] if spot is None else spot}]}
+
+def futures_response(index, spot=None):
+  spot = SPOTS[index] if spot is None else spot
+  return {'Data' : [{'LastTradedPrice' : round(spot + 40.5, 2)}]}
@@ -2,11 +2,9 @@ import time
 import warnings
 import traceback
 import datetime
+import concurrent.futures
 import numpy as np
-import pandas as pd
-import multiprocessing
 
-from IPython.display import clear_output, display, HTML
 from py5paisa import (
     FivePaisaClient,
     InvalidLoginCredentialsException,
@@ -17,12 +15,20 @@ from py5paisa import (
     FuturesFetchException, 
     SpotFetchException, 
     OptionChainFetchException,
-    getEpochTime
+    getEpochTime,
+    metrics_registry,
+    timed,
+    TickStore
     )
+from py5paisa.token_store import token_store
+from fetch_engine import FetchEngine, AsyncFetchEngine
+from discount_engine import OptionChainArrays, IndexSnapshot, compute_discount
+from html_renderer import TableRenderer, fetching_message
+from pipeline import TickPipeline
+from snapshot_recorder import SnapshotRecorder, PayloadLog
+from index_registry import underlying, register_all, class_names, caption_colors
 
 warnings.filterwarnings('ignore')
-pd.set_option('display.max_rows', None)
-pd.set_option('display.max_columns', None)
 
 month_list = ['Jan','Feb','Mar',
               'Apr','May','Jun',
@@ -30,29 +36,22 @@ month_list = ['Jan','Feb','Mar',
               'Oct','Nov','Dec']
 MONTH = {m:str(i+1).zfill(2) for i,m in enumerate(month_list)}
 
-NIFTY_SCRIP_CODE = '999920000'
-BANK_SCRIP_CODE = '999920005'
-FINNIFTY_SCRIP_CODE = '999920041'
-
-class CustomMultiProcess(multiprocessing.Process):
-    def __init__(self, *args, **kwargs):
-        multiprocessing.Process.__init__(self, *args, **kwargs)
-        self._pconn, self._cconn = multiprocessing.Pipe()
-        self._exception = None
-
-    def run(self):
-        try:
-            multiprocessing.Process.run(self)
-            self._cconn.send(None)
-        except Exception as e:
-            tb = traceback.format_exc()
-            self._cconn.send((e, tb))
-
-    @property
-    def exception(self):
-        if self._pconn.poll():
-            self._exception = self._pconn.recv()
-        return self._exception
+STRIKE_WINDOW = 10
+
+# Past a dozen worker processes FETCH_MODE='async' is the way to scan many
+# underlyings, every request of a tick then shares one connection pool
+MAX_FETCH_WORKERS = 12
+
+STATUS_COLOR = {'ok' : '#00D100', 'error' : '#FF4500', 'info' : '#FD7F20'}
+
+# IPython is only imported once something is actually shown in a notebook,
+# the headless daemon never pulls it in
+def show_html(html):
+  from IPython.display import display, HTML
+  display(HTML(html))
+
+def notebook_notify(message, level='info'):
+  show_html(f"<h2 style='color: {STATUS_COLOR[level]}'>{message}</h2>")
 
 class FetchOptionData:
   def __init__(self, creds, email, 
@@ -64,7 +63,27 @@ class FetchOptionData:
                INCLUDE_FINNIFTY,
                BNF_NIFTY_FUT_EXPIRY,
                FINNIFTY_FUT_EXPIRY,
-               DEBUG=False
+               DEBUG=False,
+               FETCH_WORKERS=None,
+               FETCH_MODE='process',
+               STRIKE_WINDOW=STRIKE_WINDOW,
+               PIPELINE=True,
+               REFRESH_INTERVAL=0,
+               DISPLAY_MODE='cells',
+               NOTIFY=notebook_notify,
+               METRICS_DUMP=False,
+               FEED='rest',
+               TICK_HISTORY=0,
+               RECORD_DIR=None,
+               RECORD_PAYLOADS=None,
+               CONNECT=True,
+               BASE_URL=None,
+               UNDERLYINGS=None,
+               EXPIRIES=None,
+               TOKEN_CACHE=None,
+               TOKEN_REFRESH=600,
+               TRANSPORT=None,
+               DEPTH_BOOKS=False
                ):
     self.INCLUDE_NIFTY = INCLUDE_NIFTY
     self.INCLUDE_BANKNIFTY = INCLUDE_BANKNIFTY
@@ -77,528 +96,450 @@ class FetchOptionData:
     self.NF_BNF_OPT_EXPIRY_EPOCH_TIME = NF_BNF_OPT_EXPIRY_EPOCH_TIME
     self.FIN_OPT_EXPIRY_EPOCH_TIME = FIN_OPT_EXPIRY_EPOCH_TIME
 
-    self.is_bnf_nifty_fut_date_valid = None
-    self.is_finnifty_fut_date_valid = None
-    self.is_bnf_nifty_opt_date_valid = None
-    self.is_finnifty_opt_date_valid = None
-
-    self.is_parallel_run = True if INCLUDE_NIFTY + INCLUDE_BANKNIFTY + INCLUDE_FINNIFTY > 1 else False
+    # Scanned underlyings in table order, registry symbols or index_registry.Underlying
+    # definitions (objects or keyword dicts). INCLUDE_* pick among the default three otherwise
+    if UNDERLYINGS is None:
+      UNDERLYINGS = [symbol for symbol, include in (('NIFTY', INCLUDE_NIFTY), ('BANKNIFTY', INCLUDE_BANKNIFTY),
+                                                   ('FINNIFTY', INCLUDE_FINNIFTY)) if include]
+    self.underlyings = [underlying(symbol) for symbol in register_all(UNDERLYINGS)]
+    # (option expiry epoch time, futures expiry) of every expiry family
+    self.expiries = {'NIFTY' : (NF_BNF_OPT_EXPIRY_EPOCH_TIME, BNF_NIFTY_FUT_EXPIRY),
+                     'FINNIFTY' : (FIN_OPT_EXPIRY_EPOCH_TIME, FINNIFTY_FUT_EXPIRY)}
+    self.expiries.update(EXPIRIES or {})
+    # (futures expiry valid, option expiry valid) of every checked family
+    self.expiry_valid = {}
+
+    # One worker per request of every underlying keeps a tick fully concurrent
+    self.FETCH_WORKERS = FETCH_WORKERS or min(MAX_FETCH_WORKERS, 3 * max(1, len(self.underlyings)))
+    self.FETCH_MODE = FETCH_MODE
+    # Strikes each side of ATM : an int, a per index dict, or None for the whole chain.
+    # A window registered with the Underlying wins over a plain int
+    self.STRIKE_WINDOW = STRIKE_WINDOW
+    # Overlap fetch, compute and render stages, fetching at most once every REFRESH_INTERVAL seconds
+    self.PIPELINE = PIPELINE
+    self.REFRESH_INTERVAL = REFRESH_INTERVAL
+    # 'cells' patches changed cells in place, 'tables' redraws changed tables, 'refresh' clears and redraws every tick
+    self.DISPLAY_MODE = DISPLAY_MODE
+    # Status messages go through NOTIFY(message, level), level being 'ok', 'error' or 'info'
+    self.notify = NOTIFY
+    # Stage latencies are dumped at exit : True prints the table to stderr, a path writes JSON
+    if METRICS_DUMP:
+      metrics_registry.dump_at_exit(None if METRICS_DUMP is True else METRICS_DUMP)
+    self.engine = None
+    self.pipeline = None
+    self.renderer = TableRenderer(caption_colors())
+    self.live_display = None
+    # 'rest' polls every request each tick, 'websocket' bootstraps the chains over REST then follows MarketFeedV3 ticks
+    self.FEED = FEED
+    self.feed = None
+    self.live_snapshots = {}
+    # Ticks kept per instrument in websocket mode, 0 keeps no history
+    self.TICK_HISTORY = TICK_HISTORY
+    self.ticks = None
+    # Every computed snapshot is appended to a daily columnar archive under RECORD_DIR
+    self.recorder = SnapshotRecorder(RECORD_DIR) if RECORD_DIR else None
+    # Raw spot/futures/option chain responses of every tick are appended as JSON lines to RECORD_PAYLOADS
+    self.payload_log = PayloadLog(RECORD_PAYLOADS) if RECORD_PAYLOADS else None
 
     self.creds = creds
     self.email = email
     self.pwd = pwd
     self.dob = dob
-    
+    self.client = None
+    # Every REST route and websocket goes to BASE_URL when set, e.g. benchmarks/fake_broker.py
+    self.BASE_URL = BASE_URL
+    # Session tokens are reused across restarts while valid : True caches them in
+    # ~/.cache/py5paisa, a path elsewhere, 'memory' for this process only
+    self.token_store = token_store(TOKEN_CACHE)
+    # The session is refreshed in the background TOKEN_REFRESH seconds before the JWT expires, None disables
+    self.TOKEN_REFRESH = TOKEN_REFRESH
+    # HTTP pool size, per-route deadlines and retries, a py5paisa Transport or a dict of its arguments
+    self.TRANSPORT = TRANSPORT
+    # REST feed : futures values come from 20 level depth order books once subscribed, not a MarketDepth request per tick
+    self.DEPTH_BOOKS = DEPTH_BOOKS
+    self.depth = None
+
+    # CONNECT=False skips login, expiry checks and the fetch engine, for offline replay
+    if CONNECT:
+      self.connect()
+
+  @classmethod
+  def offline(cls, INCLUDE_NIFTY=True, INCLUDE_BANKNIFTY=True, INCLUDE_FINNIFTY=True, **options):
+    """
+    Scanner that never talks to 5paisa : run(), compute() and rendering
+    work on payloads handed to them, e.g. by replay.ReplayEngine.
+    """
+    options.setdefault('NOTIFY', lambda message, level='info' : None)
+    return cls(None, None, None, None, None, None,
+               INCLUDE_NIFTY, INCLUDE_BANKNIFTY, INCLUDE_FINNIFTY,
+               None, None, CONNECT=False, **options)
+
+  def connect(self):
     try:
-      self.client = FivePaisaClient(email = self.email, passwd = self.pwd, dob = self.dob, cred = self.creds)
+      self.client = FivePaisaClient(email = self.email, passwd = self.pwd, dob = self.dob, cred = self.creds,
+                                    base_url = self.BASE_URL, token_store = self.token_store,
+                                    transport = self.TRANSPORT)
       self.client.login()
       
       if self.client.login_response_message is not None or not self.client.is_logged_in:
         raise InvalidLoginException
       else:
-        display(HTML("<h2 style='color: #00D100'>Logged In...!!</h2>"))
+        self.notify("Logged In...!!", 'ok')
+        if self.TOKEN_REFRESH:
+          self.client.start_token_refresh(self.TOKEN_REFRESH)
+        if self.DEPTH_BOOKS and self.FEED == 'rest':
+          # Imported here so sessions without the depth feed never load aiohttp
+          from futures_depth import FuturesDepth
+          self.depth = FuturesDepth(self.client)
 
     except InvalidLoginException:
       if self.client.login_response_message is not None:
-        display(HTML(f"<h2 style='color: #FF4500'>Error during Sign in : {self.client.login_response_message}</h2>"))
+        self.notify(f"Error during Sign in : {self.client.login_response_message}", 'error')
       else:
-        display(HTML(f"<h2 style='color: #FF4500'>Error during Sign in : Invalid Credentials</h2>"))
+        self.notify("Error during Sign in : Invalid Credentials", 'error')
       raise InvalidLoginException
 
     try:
-      display(HTML("<h2 style='color: #FD7F20'>Checking Futures and Options Expiry date</h2>"))
-      self.check_expiry_dates('NIFTY')
-      self.check_expiry_dates('FINNIFTY')
+      self.notify("Checking Futures and Options Expiry date", 'info')
+      # One get_expiry per family, all in flight at once
+      families = list(self.families())
+      with concurrent.futures.ThreadPoolExecutor(max(1, len(families))) as pool:
+        list(pool.map(self.timed_expiry_check, families))
 
-      if (not self.is_bnf_nifty_fut_date_valid) or (not self.is_finnifty_fut_date_valid):
+      if not all(fut_valid for fut_valid, _ in self.expiry_valid.values()):
         raise InvalidFutureExpiryDateException
       else:
-        display(HTML("<h2 style='color: #00D100'>Futures date Valid</h2>"))
+        self.notify("Futures date Valid", 'ok')
 
-      if (not self.is_bnf_nifty_opt_date_valid) or (not self.is_finnifty_opt_date_valid):
+      if not all(opt_valid for _, opt_valid in self.expiry_valid.values()):
         raise InvalidOptionExpiryDateException
       else:
-        display(HTML("<h2 style='color: #00D100'>Option Expiry date Valid</h2>"))
+        self.notify("Option Expiry date Valid", 'ok')
 
     except InvalidFutureExpiryDateException:
-      if not self.is_bnf_nifty_fut_date_valid:
-        display(HTML(f"<h2 style='color: #FF4500'>NIFTY/BANKNIFTY Futures Date Invalid</h2>"))
-      if not self.is_finnifty_fut_date_valid:
-        display(HTML(f"<h2 style='color: #FF4500'>FINNIFTY Futures Date Invalid</h2>"))
+      for family, symbols in self.families().items():
+        if not self.expiry_valid[family][0]:
+          self.notify(f"{'/'.join(symbols)} Futures Date Invalid", 'error')
       raise InvalidFutureExpiryDateException
 
     except InvalidOptionExpiryDateException:
-      if not self.is_bnf_nifty_opt_date_valid:
-        display(HTML(f"<h2 style='color: #FF4500'>NIFTY/BANKNIFTY Option Expiry Date Invalid</h2>"))
-      if not self.is_finnifty_opt_date_valid:
-        display(HTML(f"<h2 style='color: #FF4500'>FINNIFTY Option Expiry Date Invalid</h2>"))
+      for family, symbols in self.families().items():
+        if not self.expiry_valid[family][1]:
+          self.notify(f"{'/'.join(symbols)} Option Expiry Date Invalid", 'error')
       raise InvalidOptionExpiryDateException
 
     except Exception as err:
-      display(HTML(f"<h2 style='color: #FF4500'>Unable to fetch expiry dates : {err}</h2>"))
+      self.notify(f"Unable to fetch expiry dates : {err}", 'error')
       raise FetchExpiryException
 
-  def check_expiry_dates(self, index):
-    expiry_dates = self.client.get_expiry('N', index)
+    if self.FETCH_MODE == 'async':
+      self.engine = AsyncFetchEngine(self.client)
+    else:
+      self.engine = FetchEngine(self.client, self.creds, processes=self.FETCH_WORKERS)
+
+  def families(self):
+    """Symbols of the scanned underlyings grouped by expiry family, in table order."""
+    families = {}
+    for u in self.underlyings:
+      families.setdefault(u.family, []).append(u.symbol)
+    return families
+
+  def timed_expiry_check(self, family):
+    with timed('check_expiry_dates'):
+      self.check_expiry_dates(family)
+
+  def check_expiry_dates(self, family):
+    if family not in self.expiries:
+      raise KeyError(f'No expiry dates given for {family}')
+    expiry_dates = self.client.get_expiry('N', self.families()[family][0])
     if expiry_dates is None:
       print(f'Error here check_futures_date()')
       raise TypeError
     else:
       expiry_dates = [int(x['ExpiryDate'][6:][:-7]) for x in expiry_dates['Expiry']]
-      if (index == 'BANKNIFTY' or index == 'NIFTY'):
-        exp = getEpochTime(self.BNF_NIFTY_FUT_EXPIRY, ' ')
-        if exp in expiry_dates:
-          self.is_bnf_nifty_fut_date_valid = True
-        else:
-          self.is_bnf_nifty_fut_date_valid = False
-
-        if self.NF_BNF_OPT_EXPIRY_EPOCH_TIME in expiry_dates:
-          self.is_bnf_nifty_opt_date_valid = True
-        else:
-          self.is_bnf_nifty_opt_date_valid = False
-
-      elif index == 'FINNIFTY':
-        exp = getEpochTime(self.FINNIFTY_FUT_EXPIRY, ' ')
-        if exp in expiry_dates:
-          self.is_finnifty_fut_date_valid = True
-        else:
-          self.is_finnifty_fut_date_valid = False
-
-        if self.FIN_OPT_EXPIRY_EPOCH_TIME in expiry_dates:
-          self.is_finnifty_opt_date_valid = True
-        else:
-          self.is_finnifty_opt_date_valid = False
-
-  def getStrikes(self, index, spot):
-    step = 11
-    spot_diff = 1000 if index == 'BANKNIFTY' else 500
-    rem = spot%100
-    #refined_spot = None
-    if index == 'BANKNIFTY': 
-      spot = spot-rem if rem < 50 else spot+(100-rem)
-    else:
-      if rem <= 24:
-        spot = spot-rem
-      elif rem >= 25 and rem <= 74:
-        if rem <= 50:
-          spot = spot + (50 - rem)
-        else:
-          spot = spot - (rem - 50)
-      elif rem >= 75:
-        spot = spot+(100-rem)
-
-    call_strikes = np.linspace(spot-spot_diff, spot, step)
-    put_strikes = np.linspace(spot, spot+spot_diff, step)
-
-    if index == 'BANKNIFTY':
-      call_strikes = np.append(call_strikes, [call_strikes[-1]+100])
-      put_strikes = np.insert(put_strikes, 0, put_strikes[0]-100)
-    else:
-      call_strikes = np.append(call_strikes, [call_strikes[-1]+50])
-      put_strikes = np.insert(put_strikes, 0, put_strikes[0]-50)
-
-    return spot, call_strikes, put_strikes   
+      option_expiry, futures_expiry = self.expiries[family]
+      self.expiry_valid[family] = (getEpochTime(futures_expiry, ' ') in expiry_dates,
+                                   option_expiry in expiry_dates)
+
+  def strike_window(self, index):
+    window = self.STRIKE_WINDOW
+    if isinstance(window, dict) and index in window:
+      return window[index]
+    if underlying(index).window is not None:
+      return underlying(index).window
+    return STRIKE_WINDOW if isinstance(window, dict) else window
+
+  def getATMStrike(self, index, spot):
+    step = underlying(index).step
+    return float(np.floor(spot/step + 0.5)*step)
+
+  def getStrikes(self, index, spot, chain=None):
+    """
+    ATM strike and the call and put strikes scanned around it. Without a
+    strike window every strike of `chain` (OptionChainArrays) is, as in
+    compute_discount : calls up to one strike above ATM, puts from one below.
+    """
+    step = underlying(index).step
+    window = self.strike_window(index)
+    spot = self.getATMStrike(index, spot)
 
-  def getSpot(self, result, index):
-    response = self.client.get_expiry('N', index)
-    result.update({'SPOT' : response})
+    if window is None:
+      if chain is None:
+        raise ValueError(f'{index} scans the whole chain, getStrikes needs the option chain')
+      strikes = np.union1d(chain.call_strikes, chain.put_strikes)
+      return spot, strikes[strikes <= spot + step], strikes[strikes >= spot - step]
 
-  def getFutures(self, result, index, expiry):
-    fut_value_request_payload = [{
-      "Exchange": "N",
-      "ExchangeType": "D",
-      "Symbol": index + ' ' + expiry
-    }]
-    response = self.client.fetch_market_depth_by_symbol(fut_value_request_payload)
-    result.update({'FUTURES' : response})
+    call_strikes = np.arange(spot - window*step, spot + 2*step, step)
+    put_strikes = np.arange(spot - step, spot + (window + 1)*step, step)
 
-  def get_option_chain(self, result, index, time_code):
-    response = self.client.get_option_chain("N", index, time_code)
-    result.update({'OPTION_CHAIN':response})
+    return spot, call_strikes, put_strikes
 
-  def run(self, index, spot, futures, option_chain):
-    try:
-      if spot is not None:
-        if len(spot['lastrate']) == 0:
-          raise SpotFetchException
-      else:
+  def compute(self, index, spot, futures, option_chain):
+    if spot is not None:
+      if len(spot['lastrate']) == 0:
         raise SpotFetchException
+    else:
+      raise SpotFetchException
 
-      if futures is not None:
-        if futures['Data'] is None:
-          display(HTML(f"<h2 style='color: #FF4500'>Error Fetching {index} Futures Value</h2>"))
-          raise FuturesFetchException
-      else:
+    if futures is not None:
+      if futures['Data'] is None:
+        self.notify(f"Error Fetching {index} Futures Value", 'error')
         raise FuturesFetchException
+    else:
+      raise FuturesFetchException
 
-      if option_chain is not None:
-        if len(option_chain['Options']) == 0:
-          display(HTML(f"<h2 style='color: #FF4500'>Error Fetching {index} Option Chain</h2>"))
-          raise OptionChainFetchException
-      else:
+    if option_chain is not None:
+      if len(option_chain['Options']) == 0:
+        self.notify(f"Error Fetching {index} Option Chain", 'error')
         raise OptionChainFetchException
-      
-      spot_value = spot['lastrate'][0]['LTP']
-      futures_value = futures['Data'][0]['LastTradedPrice']
-      option_chain = option_chain['Options']
-
-      refined_spot, call_strikes, put_strikes = self.getStrikes(index, spot_value)
-      call_strike_ltp_map = {'Strikes':[], 'CE LTP':[]}
-      put_strike_ltp_map = {'Strikes':[], 'PE LTP':[]}
-
-      for oc in option_chain:
-        if oc['CPType'] == 'CE' and oc['StrikeRate'] in call_strikes:
-          call_strike_ltp_map['Strikes'].append(oc['StrikeRate'])
-          call_strike_ltp_map['CE LTP'].append(oc['LastRate'])
-        if oc['CPType'] == 'PE' and oc['StrikeRate'] in put_strikes:
-          put_strike_ltp_map['Strikes'].append(oc['StrikeRate'])
-          put_strike_ltp_map['PE LTP'].append(oc['LastRate'])
-
-      call_df = pd.DataFrame(call_strike_ltp_map)
-      call_df['CE IV'] = spot_value - call_df['Strikes']
-      call_df['CE Premium'] = np.where(call_df['CE IV'] <= 0, call_df['CE LTP'], call_df['CE LTP']-call_df['CE IV'])
-      call_df['CE Premium'] = np.where(call_df['CE LTP'] == 0, 0, call_df['CE Premium'])
-
-      put_df = pd.DataFrame(put_strike_ltp_map)
-      put_df['PE IV'] = put_df['Strikes'] - spot_value
-      put_df['PE Premium'] = np.where(put_df['PE IV'] <= 0, put_df['PE LTP'], put_df['PE LTP']-put_df['PE IV'])
-      put_df['PE Premium'] = np.where(put_df['PE LTP'] == 0, 0, put_df['PE Premium'])
-
-      df = pd.merge(call_df, put_df, on='Strikes', how='outer')
-
-      if df.shape[0] > 0 and df.shape[1] > 0: 
-        call_premium = float(df.iloc[10][3])
-        put_premium = float(df.iloc[10][-1])
-      else:
-        raise Exception
-
-      if call_premium < put_premium:
-        cheap_premium = 'CE'
-        row = 4
-      elif put_premium < call_premium:
-        cheap_premium = 'PE'
-        row = 5
-
-      if index == 'NIFTY':
-        class_name = 'nifty'
-        color = 'red'
-      elif index == 'BANKNIFTY':
-        class_name = 'banknifty'
-        color = 'yellow'
-      else:
-        class_name = 'finnifty'
-        color = 'blue'
+    else:
+      raise OptionChainFetchException
 
-      premium_style = '{background-color:#32CD32;color: black;}'
-      cheap_style = f""".{class_name} tr:nth-child({row}) td:nth-child(12){premium_style}"""
+    spot_value = spot['lastrate'][0]['LTP']
+    # Futures read off a depth book carry its mid instead of a traded price
+    futures_row = futures['Data'][0]
+    futures_source = 'ltp' if 'LastTradedPrice' in futures_row else 'mid'
+    futures_value = futures_row['LastTradedPrice'] if futures_source == 'ltp' else futures_row['Mid']
+    option_chain = OptionChainArrays.from_options(option_chain['Options'])
 
-      max_value = max(call_premium, put_premium)
-      min_value = min(call_premium, put_premium)
-      percentage_diff = round(((max_value - min_value)/max_value)*100, 2)
+    atm_strike = self.getATMStrike(index, spot_value)
+    result = compute_discount(spot_value, option_chain, atm_strike, underlying(index).step, self.strike_window(index))
+    if len(result.strikes) == 0:
+      raise OptionChainFetchException
 
-      df['Discount'] = np.where(((df['CE LTP'] < df['CE IV']) | (df['PE LTP'] < df['PE IV'])) & (df['CE Premium'] != 0) & (df['PE Premium'] != 0), 'Discount', ' ')
-      df['Discount'] = np.where(df['Strikes'] == refined_spot, str(round(abs(call_premium - put_premium),2)) + f'<br>({percentage_diff}%)', df['Discount'])
+    return IndexSnapshot(index, spot_value, futures_value, result, futures_source)
 
-      df.fillna(' ', inplace=True)
-      df = df[['Strikes','CE LTP', 'PE LTP', 'CE Premium', 'PE Premium', 'Discount']]
-      
-      return index, self.convert_df_to_html(index, spot_value, futures_value, percentage_diff, cheap_style, class_name, df)
-    
-    except (SpotFetchException, FuturesFetchException, OptionChainFetchException, Exception) as e:
-      return index, None
-  
-  def fetch_values(self, index, fut_expiry, time_code, result):
+  def snapshot(self, index, spot, futures, option_chain):
     try:
-      child_jobs = []
-      spot_process = CustomMultiProcess(target=self.getSpot, args=(result, index))
-      child_jobs.append(spot_process)
-
-      fut_process = CustomMultiProcess(target=self.getFutures, args=(result, index, fut_expiry))
-      child_jobs.append(fut_process)
-
-      option_chain_process = CustomMultiProcess(target=self.get_option_chain, args=(result, index, time_code))
-      child_jobs.append(option_chain_process)
-
-      for j in child_jobs:
-        j.start()
-
-      for j in child_jobs:
-        j.join()
-
-      for j in child_jobs:
-        j.kill()
-
-    except KeyboardInterrupt:
-      for j in child_jobs:
-        j.kill()
-      raise KeyboardInterrupt
-
-  def fetchNifty(self):
-    try:
-      index = 'NIFTY'
-      fut_expiry = self.BNF_NIFTY_FUT_EXPIRY
-      time_code = self.NF_BNF_OPT_EXPIRY_EPOCH_TIME
-
-      manager = multiprocessing.Manager()
-      value_result = manager.dict()
-
-      self.fetch_values(index, fut_expiry, time_code, value_result)
-
-      spot = value_result['SPOT']
-      futures = value_result['FUTURES']
-      option_chain = value_result['OPTION_CHAIN']    
-
-      index, option = self.run(index, spot, futures, option_chain)
-
-      return 'NIFTY', option
+      with timed('compute'):
+        return self.compute(index, spot, futures, option_chain)
+    except (SpotFetchException, FuturesFetchException, OptionChainFetchException, Exception) as e:
+      return None
 
-    except Exception as e:
-      if self.DEBUG:
-        print('Error in Fetching NIFTY')
-        traceback.print_exc()
-        print('='*20)
-      return 'NIFTY', None
+  def run(self, index, spot, futures, option_chain):
+    snapshot = self.snapshot(index, spot, futures, option_chain)
+    if snapshot is None:
+      return index, None
+    return index, self.render_table(snapshot)
 
-  def fetchBankNifty(self):
+  def render_table(self, snapshot):
+    with timed('render'):
+      return self.renderer.render(snapshot, underlying(snapshot.index).class_name)
+  
+  def fetch_index(self, index):
     try:
-      index = 'BANKNIFTY'
-      fut_expiry = self.BNF_NIFTY_FUT_EXPIRY
-      time_code = self.NF_BNF_OPT_EXPIRY_EPOCH_TIME
-
-      manager = multiprocessing.Manager()
-      value_result = manager.dict()
-      
-      self.fetch_values(index, fut_expiry, time_code, value_result)
-
-      spot = value_result['SPOT']
-      futures = value_result['FUTURES']
-      option_chain = value_result['OPTION_CHAIN']      
-      index, option = self.run(index, spot, futures, option_chain)
-
-      return 'BANKNIFTY', option
+      values = self.engine.fetch_all([self.job(index)])[index]
+      return self.run(index, values['SPOT'], values['FUTURES'], values['OPTION_CHAIN'])
 
     except Exception as e:
       if self.DEBUG:
-        print('Error in Fetching BANKNIFTY')
+        print(f'Error in Fetching {index}')
         traceback.print_exc()
         print('='*20)
-      return 'BANKNIFTY', None
-
-  def fetchFinNifty(self):
-    try:
-      index = 'FINNIFTY'
-      fut_expiry = self.FINNIFTY_FUT_EXPIRY
-      time_code =  self.FIN_OPT_EXPIRY_EPOCH_TIME
-
-      manager = multiprocessing.Manager()
-      value_result = manager.dict()
-      
-      self.fetch_values(index, fut_expiry, time_code, value_result)
-
-      spot = value_result['SPOT']
-      futures = value_result['FUTURES']
-      option_chain = value_result['OPTION_CHAIN']      
-      index, option = self.run(index, spot, futures, option_chain)
+      return index, None
 
-      return 'FINNIFTY', option
+  def job(self, index):
+    """(index, futures expiry, option expiry epoch time) fetch job of an underlying."""
+    option_expiry, futures_expiry = self.expiries[underlying(index).family]
+    return index, futures_expiry, option_expiry
 
-    except Exception as e:
-      if self.DEBUG:
-        print('Error in Fetching FINNIFTY')
-        traceback.print_exc()
-        print('='*20)
-      return 'FINNIFTY', None
+  def fetch_jobs(self):
+    return [self.job(u.symbol) for u in self.underlyings]
 
-  def smap_parallel(self, f, result):
+  def fetch_values(self, jobs):
     try:
-      idx, opt = f()
-      result.update({idx : opt})
-
+      with timed('fetch'):
+        if self.depth is None:
+          return self.engine.fetch_all(jobs)
+        return self.fetch_with_books(jobs)
     except Exception as e:
       if self.DEBUG:
-        print('Error in smap_parallel()')
+        print('Error in fetch_values()')
         traceback.print_exc()
         print('='*20)
-      raise OptionChainFetchException
+      return {}
+
+  def fetch_with_books(self, jobs):
+    """fetch_all() taking the futures of indices with a fresh depth book off the book."""
+    booked = {index : self.depth.futures(index) for index, _, _ in jobs}
+    values = self.engine.fetch_all([(index, None if booked[index] else futures_expiry, option_expiry)
+                                    for index, futures_expiry, option_expiry in jobs])
+    for index, futures in booked.items():
+      if futures is not None and index in values:
+        values[index]['FUTURES'] = futures
+    self.depth.watch(values)
+    return values
+
+  def compute_tick(self, jobs, values):
+    result = {}
+    for index, _, _ in jobs:
+      if index not in values:
+        result[index] = None
+        continue
+      index_values = values[index]
+      result[index] = self.snapshot(index, index_values['SPOT'], index_values['FUTURES'], index_values['OPTION_CHAIN'])
+    self.record(result, values)
+    return result
+
+  def record(self, snapshots, values=None):
+    if self.recorder is not None:
+      with timed('record'):
+        self.recorder.record_all(snapshots)
+    if self.payload_log is not None and values:
+      self.payload_log.write_tick(values)
+
+  def fetch_tick(self, jobs):
+    return self.compute_tick(jobs, self.fetch_values(jobs))
+
+  def render_tick(self, result):
+    with timed('display'):
+      if self.DISPLAY_MODE == 'refresh':
+        from IPython.display import clear_output
+        self.index_stack({index : None if snapshot is None else self.render_table(snapshot) for index, snapshot in result.items()})
+        clear_output(wait=True)
+        return
+      if self.live_display is None:
+        from live_display import LiveDisplay
+        self.live_display = LiveDisplay(self.renderer, class_names(), mode=self.DISPLAY_MODE)
+      self.live_display.update(result)
+
+  def latency_summary(self):
+    """
+    p50/p95/p99 in milliseconds of every timed stage and client route so far.
+    """
+    return metrics_registry.summary()
 
-  def smap(self, f):
+  def stream(self, render=None):
+    """
+    Fetch, compute and render ticks until interrupted. `render` receives
+    the dict of index to IndexSnapshot (None when the index failed) of
+    every tick and defaults to the notebook tables.
+    """
+    render = render or self.render_tick
+    jobs = self.fetch_jobs()
     try:
-      return f()
-
-    except Exception as e:
-      raise OptionChainFetchException
+      if self.FEED == 'websocket':
+        self.start_feed(jobs)
+        self.pipeline = TickPipeline(
+          fetch=lambda: self.feed.wait(),
+          compute=lambda _: self.compute_live(),
+          render=render,
+          interval=self.REFRESH_INTERVAL)
+        self.pipeline.run()
+      elif self.PIPELINE:
+        self.pipeline = TickPipeline(
+          fetch=lambda: self.fetch_values(jobs),
+          compute=lambda values: self.compute_tick(jobs, values),
+          render=render,
+          interval=self.REFRESH_INTERVAL)
+        self.pipeline.run()
+      else:
+        while True:
+          started = time.monotonic()
+          render(self.fetch_tick(jobs))
+          time.sleep(max(0, self.REFRESH_INTERVAL - (time.monotonic() - started)))
 
-  def stream(self):
-    functions = self.fetch_required_function()
-    while True:
-      if self.is_parallel_run:
-        try:
-          jobs = []
-          manager = multiprocessing.Manager()
-          result = manager.dict()
-          
-          for i in range(len(functions)):
-            process = CustomMultiProcess(target=self.smap_parallel, args=(functions[i], result))
-            jobs.append(process)
-
-          for j in jobs:
-            j.start()
-
-          for j in jobs:
-            j.join()
-          
-          for j in jobs:
-            j.kill()
-
-          self.index_stack(result)
-          clear_output(wait=True)
-
-        except KeyboardInterrupt:
-          for j in jobs:
-            j.kill()
-          raise KeyboardInterrupt
+    except KeyboardInterrupt:
+      self.close()
+      raise KeyboardInterrupt
 
-      else:
-        try:
-          result = [self.smap(f) for f in functions]
-          self.index_stack(result)
-          clear_output(wait=True)
-
-        except KeyboardInterrupt:
-          raise KeyboardInterrupt
-
-  def fetch_required_function(self):
-    functions = []
-    if self.INCLUDE_NIFTY:
-      functions.append(self.fetchNifty)
-    if self.INCLUDE_BANKNIFTY:
-      functions.append(self.fetchBankNifty)
-    if self.INCLUDE_FINNIFTY:
-      functions.append(self.fetchFinNifty)
-
-    return functions
-
-  def convert_df_to_html(self, index, spot_value, fut_value, percentage_diff, cheap_style, class_name, *dfs):
-    value_diff = round(fut_value - spot_value,2)
-    html = f"""<style>{cheap_style}"""
-    html += """
-        tr{
-          line-height:30px;
-        }
-        tbody tr th:nth-child(1){
-          width:5000px;
-        }
-        table tr td:nth-child(12){
-          background-color: #C5C5C5;
-          color: black;
-          text-align:center;
-          font-weight:bold;
-          font-size:16px;
-        }
-        table tr:nth-child(1){
-          font-weight:bold;
-        }
-        table tr td:nth-child(0){text-align:center; font-size:16px;}
-        table tr td:nth-child(1){text-align:center; font-size:16px;}
-        table tr td:nth-child(2){text-align:center; font-size:16px;}
-        table tr td:nth-child(3){text-align:center; font-size:16px;}
-        table tr td:nth-child(4){text-align:center; font-size:16px;}
-        table tr td:nth-child(5){text-align:center; font-size:16px;}
-        table tr td:nth-child(6){text-align:center; font-size:16px;}
-        table tr td:nth-child(7){text-align:center; font-size:16px;}
-        table tr td:nth-child(8){text-align:center; font-size:16px;}
-        table tr td:nth-child(9){text-align:center; font-size:16px;}
-        table tr td:nth-child(10){text-align:center; font-size:16px;}
-        table tr td:nth-child(11){text-align:center; font-size:16px;}
-        table tr td:nth-child(13){text-align:center; font-size:16px;}
-        table tr td:nth-child(14){text-align:center; font-size:16px;}
-        table tr td:nth-child(15){text-align:center; font-size:16px;}
-        table tr td:nth-child(16){text-align:center; font-size:16px;}
-        table tr td:nth-child(17){text-align:center; font-size:16px;}
-        table tr td:nth-child(18){text-align:center; font-size:16px;}
-        table tr td:nth-child(19){text-align:center; font-size:16px;}
-        table tr td:nth-child(20){text-align:center; font-size:16px;}
-        table tr td:nth-child(21){text-align:center; font-size:16px;}
-        table tr td:nth-child(22){text-align:center; font-size:16px;}
-        .set{
-          border-bottom: 5px double white;
-          padding: 10px;
-        }
-        #discount {
-          text-align: center;
-          background-color: lightgreen;
-          color: black;
-          font-weight: bold;
-          font-size: 12px;
-        }
-        caption{
-          font-size: 14px;
-          font-weight: bold;
-          padding: 5px;
-        }
-        #dataframe{
-          margin-top : 30px;
-          width : 100%;
-        }
-        .atm{
-          background-color: #C5C5C5; 
-          color: black; 
-          text-align: center;
-        }
-        .calls{
-          background-color: #32CD32; 
-          color: black; 
-          text-align: center;
-        }
-        .puts{
-          background-color: #FF5C5C; 
-          color: black; 
-          text-align: center;
-        }
-        content{
-          margin-left:10px;
-        }
-      </style>
+  def start_feed(self, jobs):
     """
-
-    html += '<div style="padding-left:30px; padding-right:30px">'
-    for df in dfs:
-        html += df.T.to_html()
-    html += '</div>'
-    html = html.replace("""<table border="1" class="dataframe">""", f"""<table border="1" class="dataframe {class_name}" id="dataframe">""")
-    html = html.replace("""<td>Discount</td>""",'<td id="discount">Discount</td>')
-    html = html.replace("""<th>10</th>""",'<th class="atm">ATM</th>')
-    html = html.replace("""<th>0</th>\n      <th>1</th>\n      <th>2</th>\n      <th>3</th>\n      <th>4</th>\n      <th>5</th>\n      <th>6</th>\n      <th>7</th>\n      <th>8</th>\n      <th>9</th>\n      """,'<th colspan=10 class="calls">Calls</th>')
-    html = html.replace("""<th>11</th>\n      <th>12</th>\n      <th>13</th>\n      <th>14</th>\n      <th>15</th>\n      <th>16</th>\n      <th>17</th>\n      <th>18</th>\n      <th>19</th>\n      <th>20</th>\n    """,'<th colspan=10 class="puts">Puts</th>')
-    html = html.replace(
-        f"""<table border="1" class="dataframe {class_name}" id="dataframe">""", 
-        f"""
-        <table border="1" class="dataframe {class_name}" id="dataframe">
-          <colgroup>
-            <col style="width:6%">
-          </colgroup>  
-          <caption>{index} Spot : {spot_value}</caption>
-          <caption>{index} Fut : {fut_value} <span style='color:{'#FF5C5C' if value_diff<0 else '#32CD32'}'>({value_diff})</span></caption>
-        """)
-
-    html = html.replace("&lt;br&gt;",  "<br>")
-    return html
+    Streaming mode bootstrap : one REST fetch resolves the scrip codes of
+    every index, then the chains follow MarketFeedV3 ticks.
+    """
+    # Imported here so REST only sessions never load aiohttp
+    from live_chain import LiveChain, ChainFeed
+    values = self.fetch_values(jobs)
+    chains = {}
+    for index, _, _ in jobs:
+      if index not in values:
+        raise OptionChainFetchException
+      index_values = values[index]
+      snapshot = self.compute(index, index_values['SPOT'], index_values['FUTURES'], index_values['OPTION_CHAIN'])
+      futures = index_values['FUTURES']['Data'][0]
+      chains[index] = LiveChain(
+        index, underlying(index).scrip_code, snapshot.spot_value,
+        futures.get('ScripCode'), snapshot.futures_value,
+        index_values['OPTION_CHAIN']['Options'],
+        underlying(index).step, self.strike_window(index),
+        self.getATMStrike(index, snapshot.spot_value))
+      self.live_snapshots[index] = snapshot
+    if self.TICK_HISTORY:
+      instruments = sum(len(chain.codes()) for chain in chains.values())
+      self.ticks = TickStore(max_instruments=instruments, capacity=self.TICK_HISTORY)
+    self.feed = ChainFeed(self.client, chains, tickstore=self.ticks)
+    self.feed.start()
+
+  def compute_live(self):
+    updated = {}
+    for index, chain in self.feed.chains.items():
+      with timed('compute'):
+        snapshot = chain.snapshot(self.getATMStrike(index, chain.spot_value))
+      if snapshot is not None:
+        self.live_snapshots[index] = updated[index] = snapshot
+    self.record(updated)
+    self.feed.follow()
+    return dict(self.live_snapshots)
+
+  def close(self):
+    if self.pipeline is not None:
+      self.pipeline.stop()
+      self.pipeline = None
+    if self.feed is not None:
+      self.feed.stop()
+      self.feed = None
+    if self.depth is not None:
+      self.depth.stop()
+      self.depth = None
+    if self.engine is not None:
+      self.engine.shutdown()
+      self.engine = None
+    if self.client is not None:
+      self.client.stop_token_refresh()
+    if self.recorder is not None:
+      self.recorder.close()
+    if self.payload_log is not None:
+      self.payload_log.close()
 
   def index_stack(self, dfs):
-    html = '<div style="width: 100%;">'
+    show_html(self.stack_html(dfs))
+
+  def stack_html(self, dfs):
+    html = self.renderer.stylesheet()
+    html += '<div style="width: 100%;">'
     if isinstance(dfs, list):
       for idx, df in dfs:
         if df is not None:
           html += df
         else:
-          html += f'<h3><i>Fetching {idx} Option data.....</i></h3>'
+          html += fetching_message(idx)
     else:
-      for idx in ['NIFTY', 'BANKNIFTY', 'FINNIFTY']:
-        if idx in dfs:
-          if dfs[idx] is not None:
-            html += dfs[idx]
-          else:
-            html += f'<h3><i>Fetching {idx} Option data.....</i></h3>'
+      for idx in dfs:
+        if dfs[idx] is not None:
+          html += dfs[idx]
+        else:
+          html += fetching_message(idx)
     html += '</div>'
-    display(HTML(html))
+    return html
     
@@ -0,0 +1,113 @@
+"""
+Headless scanner : streams every tick as JSON lines or CSV instead of
+notebook tables, IPython is never imported.
+
+  python -m discount_daemon --config daemon.json [--format jsonl|csv] [--output FILE] [--ticks N]
+
+The config file holds the same inputs as the notebook form :
+
+  {
+    "creds" : {"APP_NAME" : "...", "APP_SOURCE" : "...", "USER_ID" : "...",
+               "PASSWORD" : "...", "USER_KEY" : "...", "ENCRYPTION_KEY" : "..."},
+    "email" : "...", "password" : "...", "dob" : "YYYYMMDD",
+    "include_nifty" : true, "include_banknifty" : true, "include_finnifty" : false,
+    "bnf_nifty_expiry" : "2023-03-16", "finnifty_expiry" : "2023-03-21",
+    "bnf_nifty_fut_expiry" : "2023-03-29", "finnifty_fut_expiry" : "2023-03-28",
+    "options" : {"STRIKE_WINDOW" : 10, "REFRESH_INTERVAL" : 1},
+    "format" : "jsonl", "output" : "-"
+  }
+
+"options" are passed through as FetchOptionData keyword arguments.
+
+Other underlyings than the include_* three are listed under "underlyings",
+registry symbols or index_registry.Underlying keyword dicts, with the
+expiry dates of their families under "expiries" :
+
+    "underlyings" : ["NIFTY", {"symbol" : "MIDCPNIFTY", "scrip_code" : "...", "step" : 25}],
+    "expiries" : {"MIDCPNIFTY" : {"option" : "2023-03-20", "futures" : "2023-03-27"}}
+"""
+import sys
+import json
+import argparse
+import logging
+
+from py5paisa import getEpochTime, convertTimeString
+from discount_check import FetchOptionData
+from snapshot_sink import open_sink, SINKS
+
+logger = logging.getLogger('discount_daemon')
+
+LOG_LEVEL = {'ok' : logging.INFO, 'info' : logging.INFO, 'error' : logging.ERROR}
+
+def log_notify(message, level='info'):
+  logger.log(LOG_LEVEL.get(level, logging.INFO), message)
+
+
+class TickLimitReached(Exception):
+  pass
+
+
+def load_config(path):
+  with open(path) as f:
+    return json.load(f)
+
+def option_expiry(date):
+  return None if date is None else getEpochTime(date)
+
+def futures_expiry(date):
+  return None if date is None else convertTimeString(date)
+
+def build_scanner(config):
+  options = dict(config.get('options', {}))
+  options.setdefault('NOTIFY', log_notify)
+  if 'underlyings' in config:
+    options.setdefault('UNDERLYINGS', config['underlyings'])
+  if 'expiries' in config:
+    options.setdefault('EXPIRIES', {family : (option_expiry(dates['option']), futures_expiry(dates['futures']))
+                                    for family, dates in config['expiries'].items()})
+  return FetchOptionData(
+    config['creds'], config['email'],
+    config['password'], config['dob'],
+    option_expiry(config.get('bnf_nifty_expiry')), option_expiry(config.get('finnifty_expiry')),
+    config.get('include_nifty', True), config.get('include_banknifty', True), config.get('include_finnifty', False),
+    futures_expiry(config.get('bnf_nifty_fut_expiry')), futures_expiry(config.get('finnifty_fut_expiry')),
+    **options)
+
+def limit_ticks(sink, ticks):
+  if not ticks:
+    return sink
+  def render(snapshots):
+    sink(snapshots)
+    if sink.ticks >= ticks:
+      raise TickLimitReached
+  return render
+
+def main(argv=None):
+  parser = argparse.ArgumentParser(description='Stream option discount snapshots without a notebook')
+  parser.add_argument('--config', required=True, help='JSON config file')
+  parser.add_argument('--format', choices=sorted(SINKS), help='output format, jsonl by default')
+  parser.add_argument('--output', help="output file, '-' for stdout")
+  parser.add_argument('--ticks', type=int, default=0, help='stop after this many ticks, 0 runs until interrupted')
+  args = parser.parse_args(argv)
+
+  logging.basicConfig(stream=sys.stderr, level=logging.INFO, format='%(asctime)s %(levelname)s %(message)s')
+  config = load_config(args.config)
+  sink = open_sink(args.format or config.get('format', 'jsonl'), args.output or config.get('output', '-'))
+  scanner = None
+  try:
+    scanner = build_scanner(config)
+    scanner.stream(render=limit_ticks(sink, args.ticks))
+  except (TickLimitReached, KeyboardInterrupt):
+    pass
+  except Exception as e:
+    logger.error(f'Stopped : {e!r}')
+    return 1
+  finally:
+    if scanner is not None:
+      scanner.close()
+    sink.close()
+  return 0
+
+
+if __name__ == '__main__':
+  sys.exit(main())
@@ -0,0 +1,207 @@
+import numpy as np
+
+def _side(strikes, mask, *columns):
+  side_strikes = strikes[mask]
+  order = np.argsort(side_strikes, kind='stable')
+  return (side_strikes[order],) + tuple(column[mask][order] for column in columns)
+
+def lookup(sorted_strikes, values, targets):
+  """
+  Values of `targets` strikes from a strike sorted side of the chain,
+  NaN where the chain has no such strike.
+  """
+  out = np.full(len(targets), np.nan)
+  if len(sorted_strikes) == 0:
+    return out
+  pos = np.searchsorted(sorted_strikes, targets)
+  pos = np.minimum(pos, len(sorted_strikes) - 1)
+  found = sorted_strikes[pos] == targets
+  out[found] = values[pos[found]]
+  return out
+
+
+class OptionChainArrays:
+  """
+  Option chain of a GetOptionsForSymbol response as strike sorted
+  NumPy arrays, strikes, LTP and open interest for calls and for puts.
+  """
+  def __init__(self, call_strikes, call_ltp, put_strikes, put_ltp, call_oi=None, put_oi=None):
+    self.call_strikes = call_strikes
+    self.call_ltp = call_ltp
+    self.put_strikes = put_strikes
+    self.put_ltp = put_ltp
+    self.call_oi = np.zeros(len(call_strikes), dtype=np.int64) if call_oi is None else call_oi
+    self.put_oi = np.zeros(len(put_strikes), dtype=np.int64) if put_oi is None else put_oi
+
+  @classmethod
+  def from_options(cls, options):
+    n = len(options)
+    strikes = np.fromiter((oc['StrikeRate'] for oc in options), dtype=np.float64, count=n)
+    ltp = np.fromiter((oc['LastRate'] for oc in options), dtype=np.float64, count=n)
+    oi = np.fromiter((oc.get('OpenInterest') or 0 for oc in options), dtype=np.int64, count=n)
+    cp_type = np.array([oc['CPType'] for oc in options])
+    call_strikes, call_ltp, call_oi = _side(strikes, cp_type == 'CE', ltp, oi)
+    put_strikes, put_ltp, put_oi = _side(strikes, cp_type == 'PE', ltp, oi)
+    return cls(call_strikes, call_ltp, put_strikes, put_ltp, call_oi, put_oi)
+
+
+class DiscountResult:
+  """
+  Intrinsic value, premium and Discount flag of every selected strike.
+  Strikes without a call (put) leg hold NaN in the CE (PE) arrays.
+  """
+  COLUMNS = ['Strikes', 'CE LTP', 'PE LTP', 'CE Premium', 'PE Premium', 'Discount']
+
+  def __init__(self, spot, strikes, ce_ltp, pe_ltp, ce_iv, pe_iv, ce_premium, pe_premium, discount, atm, atm_strike=None, step=None):
+    self.spot = spot
+    self.strikes = strikes
+    self.ce_ltp = ce_ltp
+    self.pe_ltp = pe_ltp
+    self.ce_iv = ce_iv
+    self.pe_iv = pe_iv
+    self.ce_premium = ce_premium
+    self.pe_premium = pe_premium
+    self.discount = discount
+    self.atm = atm
+    # ATM strike and step the CE/PE masks were cut with, for update_discount
+    self.atm_strike = atm_strike
+    self.step = step
+    # Open interest of each row, 0 where the leg is missing, set by compute_discount
+    self.ce_oi = None
+    self.pe_oi = None
+
+  @property
+  def call_premium(self):
+    return float(self.ce_premium[self.atm])
+
+  @property
+  def put_premium(self):
+    return float(self.pe_premium[self.atm])
+
+  def to_frame(self, atm_label=None):
+    """
+    pandas view of the result in display order with blanks for missing
+    legs, `atm_label` replaces the Discount cell of the ATM strike.
+    """
+    import pandas as pd
+
+    discount = np.where(self.discount, 'Discount', ' ').astype(object)
+    if atm_label is not None:
+      discount[self.atm] = atm_label
+    df = pd.DataFrame({
+      'Strikes': self.strikes,
+      'CE LTP': self.ce_ltp,
+      'PE LTP': self.pe_ltp,
+      'CE Premium': self.ce_premium,
+      'PE Premium': self.pe_premium,
+      'Discount': discount})
+    df.fillna(' ', inplace=True)
+    return df
+
+
+def _premium(ltp, iv):
+  premium = np.where(iv <= 0, ltp, ltp - iv)
+  return np.where(ltp == 0, 0, premium)
+
+def strike_window(atm, step, window):
+  return atm + np.arange(-window, window + 1) * step
+
+def _mask_legs(strikes, ce_ltp, pe_ltp, atm, step):
+  ce_ltp[strikes > atm + step] = np.nan
+  pe_ltp[strikes < atm - step] = np.nan
+
+def _evaluate(spot, strikes, ce_ltp, pe_ltp):
+  ce_iv = np.where(np.isnan(ce_ltp), np.nan, spot - strikes)
+  pe_iv = np.where(np.isnan(pe_ltp), np.nan, strikes - spot)
+  ce_premium = _premium(ce_ltp, ce_iv)
+  pe_premium = _premium(pe_ltp, pe_iv)
+
+  with np.errstate(invalid='ignore'):
+    discount = ((ce_ltp < ce_iv) | (pe_ltp < pe_iv)) & (ce_premium != 0) & (pe_premium != 0)
+  return ce_iv, pe_iv, ce_premium, pe_premium, discount
+
+def compute_discount(spot, chain, atm, step, window=None):
+  """
+  Vectorised discount scan of `chain` (OptionChainArrays) around the `atm`
+  strike. `window` strikes of `step` are taken each side of ATM, or every
+  strike of the chain when it is None. Calls are kept up to one strike
+  above ATM and puts from one strike below, strikes missing from both legs
+  are dropped and the ATM row is located by value.
+  """
+  if window is None:
+    strikes = np.union1d(chain.call_strikes, chain.put_strikes)
+  else:
+    strikes = strike_window(atm, step, window)
+  ce_ltp = lookup(chain.call_strikes, chain.call_ltp, strikes)
+  pe_ltp = lookup(chain.put_strikes, chain.put_ltp, strikes)
+  _mask_legs(strikes, ce_ltp, pe_ltp, atm, step)
+
+  listed = ~(np.isnan(ce_ltp) & np.isnan(pe_ltp))
+  strikes, ce_ltp, pe_ltp = strikes[listed], ce_ltp[listed], pe_ltp[listed]
+
+  atm_row = int(np.argmin(np.abs(strikes - atm))) if len(strikes) else 0
+  result = DiscountResult(spot, strikes, ce_ltp, pe_ltp, *_evaluate(spot, strikes, ce_ltp, pe_ltp), atm_row, atm, step)
+  result.ce_oi = np.where(np.isnan(ce_ltp), 0, lookup(chain.call_strikes, chain.call_oi, strikes)).astype(np.int64)
+  result.pe_oi = np.where(np.isnan(pe_ltp), 0, lookup(chain.put_strikes, chain.put_oi, strikes)).astype(np.int64)
+  return result
+
+def update_discount(result, chain, strikes):
+  """
+  Re-evaluates in place the rows of `result` at `strikes` whose LTPs
+  changed in `chain`, spot and ATM being unchanged. Strikes that are not
+  rows of the result are ignored. Returns the number of rows updated.
+  """
+  rows = np.searchsorted(result.strikes, np.asarray(strikes, dtype=np.float64))
+  rows = rows[rows < len(result.strikes)]
+  rows = np.unique(rows[np.isin(result.strikes[rows], strikes)])
+  if len(rows) == 0:
+    return 0
+
+  row_strikes = result.strikes[rows]
+  ce_ltp = lookup(chain.call_strikes, chain.call_ltp, row_strikes)
+  pe_ltp = lookup(chain.put_strikes, chain.put_ltp, row_strikes)
+  _mask_legs(row_strikes, ce_ltp, pe_ltp, result.atm_strike, result.step)
+  ce_iv, pe_iv, ce_premium, pe_premium, discount = _evaluate(result.spot, row_strikes, ce_ltp, pe_ltp)
+
+  result.ce_ltp[rows] = ce_ltp
+  result.pe_ltp[rows] = pe_ltp
+  result.ce_iv[rows] = ce_iv
+  result.pe_iv[rows] = pe_iv
+  result.ce_premium[rows] = ce_premium
+  result.pe_premium[rows] = pe_premium
+  result.discount[rows] = discount
+  return len(rows)
+
+
+class IndexSnapshot:
+  """
+  One tick of an index : spot, futures and the discount scan of its chain,
+  with the ATM straddle comparison the table highlights. `futures_source`
+  is 'ltp' for a last traded price, 'mid' for an order book mid.
+  """
+  def __init__(self, index, spot_value, futures_value, result, futures_source='ltp'):
+    self.index = index
+    self.spot_value = spot_value
+    self.futures_value = futures_value
+    self.futures_source = futures_source
+    self.result = result
+
+    self.call_premium = result.call_premium
+    self.put_premium = result.put_premium
+    if self.call_premium < self.put_premium:
+      self.cheap = 'CE'
+    elif self.put_premium < self.call_premium:
+      self.cheap = 'PE'
+    else:
+      self.cheap = None
+
+    max_value = max(self.call_premium, self.put_premium)
+    min_value = min(self.call_premium, self.put_premium)
+    self.percentage_diff = round(((max_value - min_value)/max_value)*100, 2) if max_value else 0.0
+
+  @property
+  def atm_label(self):
+    # a leg missing at the ATM strike has no premium to compare
+    if np.isnan(self.call_premium) or np.isnan(self.put_premium):
+      return '-'
+    return str(round(abs(self.call_premium - self.put_premium),2)) + f'<br>({self.percentage_diff}%)'
@@ -0,0 +1,168 @@
+import time
+import signal
+import asyncio
+import threading
+import multiprocessing
+
+from py5paisa import FivePaisaClient, metrics_registry
+
+# Client owned by each worker process, created once by _init_worker and
+# reused for every task so the HTTP session stays warm across ticks.
+_client = None
+# Histogram states and transport counts already sent to the parent with a task result
+_reported = {}
+_reported_counts = {}
+
+def _init_worker(creds, client_code, jwt_token, access_token, base_url=None, transport=None):
+  global _client
+  # Ctrl-C is handled by the parent, which terminates the whole pool.
+  signal.signal(signal.SIGINT, signal.SIG_IGN)
+  _client = FivePaisaClient(cred=creds, base_url=base_url, transport=transport)
+  _client._set_tokens(client_code, jwt_token, access_token)
+  _client.is_logged_in = True
+  # Timings a forked worker inherited from the parent are not sent back
+  metrics_registry.changes(_reported)
+  _client.transport.changes(_reported_counts)
+
+def _adopt_tokens(tokens):
+  # The parent refreshes the session, every task carries its current tokens
+  if tokens != _client.tokens():
+    _client._set_tokens(*tokens)
+
+def _adopt_hedge_delays(delays):
+  # Worker latencies are merged in the parent, whose hedge delays rest on all of them
+  _client.transport.shared_hedge_delays = delays
+
+def task_call(task):
+  """
+  Maps a fetch task to the client method name and arguments serving it,
+  shared by the process and the asyncio engines.
+  """
+  kind, index, arg = task
+  if kind == 'SPOT':
+    return 'get_expiry', ('N', index)
+  elif kind == 'FUTURES':
+    fut_value_request_payload = [{
+      "Exchange": "N",
+      "ExchangeType": "D",
+      "Symbol": index + ' ' + arg
+    }]
+    return 'fetch_market_depth_by_symbol', (fut_value_request_payload,)
+  elif kind == 'OPTION_CHAIN':
+    return 'get_option_chain', ("N", index, arg)
+  raise ValueError(f'Unknown fetch task {kind}')
+
+def _run_task(work):
+  # Timed in the worker and recorded by the parent, whose registry is the one
+  # reported. The route timings and transport counts (requests, hedges, ...)
+  # of the worker go along.
+  task, tokens, hedge_delays = work
+  _adopt_tokens(tokens)
+  _adopt_hedge_delays(hedge_delays)
+  method, args = task_call(task)
+  started = time.perf_counter()
+  response = getattr(_client, method)(*args)
+  return (time.perf_counter() - started, response, metrics_registry.changes(_reported),
+          _client.transport.changes(_reported_counts))
+
+def build_tasks(jobs):
+  # A job without futures expiry takes its futures value from elsewhere, e.g. an order book
+  tasks = []
+  for index, fut_expiry, time_code in jobs:
+    tasks.append(('SPOT', index, None))
+    if fut_expiry is not None:
+      tasks.append(('FUTURES', index, fut_expiry))
+    tasks.append(('OPTION_CHAIN', index, time_code))
+  return tasks
+
+def collect_results(tasks, responses, transport):
+  result = {}
+  for (kind, index, _), (elapsed, response, changes, counts) in zip(tasks, responses):
+    metrics_registry.record('fetch.' + kind, elapsed)
+    metrics_registry.merge(changes)
+    transport.merge(counts)
+    result.setdefault(index, {})[kind] = response
+  return result
+
+
+class FetchEngine:
+  """
+  Long-lived pool of fetch workers shared by every tick of the stream.
+  Each worker holds its own logged-in FivePaisaClient, so a tick only costs
+  the HTTP round trips instead of forking processes and managers.
+  """
+  def __init__(self, client, creds, processes=None):
+    self.processes = processes or 3
+    self.client = client
+    self.pool = multiprocessing.Pool(
+      processes=self.processes,
+      initializer=_init_worker,
+      initargs=(creds, client.client_code, client.Jwt_token, client.access_token, client.base_url,
+                client.transport.config))
+
+  def fetch_all(self, jobs):
+    """
+    jobs : list of (index, futures expiry, option expiry epoch time)
+    Returns {index : {'SPOT' : .., 'FUTURES' : .., 'OPTION_CHAIN' : ..}}
+    """
+    tasks = build_tasks(jobs)
+    tokens = self.client.tokens()
+    hedge_delays = self.client.transport.hedge_delays()
+    responses = self.pool.map_async(_run_task, [(task, tokens, hedge_delays) for task in tasks],
+                                    chunksize=1).get()
+    return collect_results(tasks, responses, self.client.transport)
+
+  def shutdown(self):
+    if self.pool is not None:
+      self.pool.terminate()
+      self.pool.join()
+      self.pool = None
+
+  def __enter__(self):
+    return self
+
+  def __exit__(self, *exc):
+    self.shutdown()
+
+
+class AsyncFetchEngine:
+  """
+  Drop-in alternative to FetchEngine that fires every request of a tick
+  concurrently from a single event loop running on a background thread,
+  sharing one connection pool instead of one process per request.
+  """
+  def __init__(self, client, pool_size=100):
+    from py5paisa.async_client import AsyncFivePaisaClient
+    self.client = AsyncFivePaisaClient.from_client(client, pool_size=pool_size)
+    self.loop = asyncio.new_event_loop()
+    self.thread = threading.Thread(target=self.loop.run_forever, daemon=True)
+    self.thread.start()
+
+  async def _run_task(self, task):
+    method, args = task_call(task)
+    started = time.perf_counter()
+    response = await getattr(self.client, method)(*args)
+    # Route timings and transport counts land in this process already
+    return time.perf_counter() - started, response, {}, {}
+
+  async def _fetch_all(self, tasks):
+    return await asyncio.gather(*[self._run_task(t) for t in tasks])
+
+  def fetch_all(self, jobs):
+    tasks = build_tasks(jobs)
+    responses = asyncio.run_coroutine_threadsafe(self._fetch_all(tasks), self.loop).result()
+    return collect_results(tasks, responses, self.client.client.transport)
+
+  def shutdown(self):
+    if self.loop is not None:
+      asyncio.run_coroutine_threadsafe(self.client.close(), self.loop).result()
+      self.loop.call_soon_threadsafe(self.loop.stop)
+      self.thread.join()
+      self.loop.close()
+      self.loop = None
+
+  def __enter__(self):
+    return self
+
+  def __exit__(self, *exc):
+    self.shutdown()
@@ -0,0 +1,86 @@
+import math
+import threading
+
+from py5paisa.orderbook import OrderBooks, depth_payload
+from py5paisa.ws_consumer import AsyncFeedConsumer, QueueClosed
+
+# Seconds without a depth message after which a book is stale and the
+# futures of its index go back to a MarketDepth request
+MAX_BOOK_AGE = 5
+
+
+class FuturesDepth:
+  """
+  Futures values of the scanned indices read off L2 order books kept by
+  the 20 level depth feed, instead of a MarketDepth request every tick.
+  The futures scrip code of an index is learnt from its first REST
+  response, subscribed on the depth feed, and from then on its mid price
+  answers the lookup while the book is fresh. The depth feed carries no
+  trades, so the value is the book mid under 'Mid', not a traded price.
+  """
+  def __init__(self, client, max_age=MAX_BOOK_AGE):
+    self.client = client
+    self.max_age = max_age
+    self.books = OrderBooks()
+    # Futures scrip code of every watched index
+    self.codes = {}
+    self.lock = threading.Lock()
+    self.consumer = None
+    self.connection = None
+    self.thread = None
+
+  def payloads(self):
+    with self.lock:
+      codes = list(self.codes.values())
+    return [depth_payload(codes)] if codes else []
+
+  def watch(self, values):
+    """Subscribes the futures of the REST responses in `values` not watched yet."""
+    new = {}
+    for index, index_values in values.items():
+      try:
+        code = int(index_values['FUTURES']['Data'][0]['ScripCode'])
+      except (KeyError, IndexError, TypeError, ValueError):
+        continue
+      if self.codes.get(index) != code:
+        new[index] = code
+    if not new:
+      return
+    with self.lock:
+      self.codes.update(new)
+    if self.consumer is None:
+      self.start()
+    else:
+      self.connection.send(depth_payload(new.values()))
+
+  def start(self):
+    self.consumer = AsyncFeedConsumer()
+    self.connection = self.consumer.add_depth_feed(self.client, self.payloads)
+    self.consumer.start()
+    self.thread = threading.Thread(target=self._dispatch, daemon=True)
+    self.thread.start()
+
+  def _dispatch(self):
+    while True:
+      try:
+        message = self.consumer.get()
+      except QueueClosed:
+        return
+      if message is not None:
+        self.books.ingest(message[1])
+
+  def futures(self, index):
+    """MarketDepth shaped futures response of `index` with its book mid, None without a fresh book."""
+    code = self.codes.get(index)
+    quote = None if code is None else self.books.quote(code, self.max_age)
+    if quote is None or math.isnan(quote['mid']):
+      return None
+    return {'Data' : [{'Mid' : round(quote['mid'], 2), 'ScripCode' : code}]}
+
+  def stop(self):
+    if self.consumer is not None:
+      self.consumer.stop()
+      self.consumer = None
+    if self.thread is not None:
+      self.thread.join(timeout=1)
+      self.thread = None
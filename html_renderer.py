@@ -0,0 +1,166 @@
+from functools import lru_cache
+
+# Static for the whole session: per tick styling only toggles cell classes
+STYLESHEET = """<style>
+        tr{
+          line-height:30px;
+        }
+        tbody tr th:nth-child(1){
+          width:5000px;
+        }
+        table.dataframe td{
+          text-align:center;
+          font-size:16px;
+        }
+        table.dataframe td.atm-col{
+          background-color: #C5C5C5;
+          color: black;
+          font-weight:bold;
+        }
+        table.dataframe td.atm-col.cheap{
+          background-color:#32CD32;
+          color: black;
+        }
+        table tr:nth-child(1){
+          font-weight:bold;
+        }
+        .set{
+          border-bottom: 5px double white;
+          padding: 10px;
+        }
+        table.dataframe td.discount {
+          text-align: center;
+          background-color: lightgreen;
+          color: black;
+          font-weight: bold;
+          font-size: 12px;
+        }
+        caption{
+          font-size: 14px;
+          font-weight: bold;
+          padding: 5px;
+        }
+        table.dataframe{
+          margin-top : 30px;
+          width : 100%;
+        }
+        .atm{
+          background-color: #C5C5C5;
+          color: black;
+          text-align: center;
+        }
+        .calls{
+          background-color: #32CD32;
+          color: black;
+          text-align: center;
+        }
+        .puts{
+          background-color: #FF5C5C;
+          color: black;
+          text-align: center;
+        }
+        content{
+          margin-left:10px;
+        }
+      </style>"""
+
+TABLE_TEMPLATE = """<div style="padding-left:30px; padding-right:30px">
+<table border="1" class="dataframe %(class_name)s"%(table_id)s>
+  <colgroup>
+    <col style="width:6%%">
+  </colgroup>
+  <caption>%(spot_caption)s</caption>
+  <caption>%(fut_caption)s</caption>
+%(header)s
+  <tbody>
+%(rows)s
+  </tbody>
+</table></div>"""
+
+ROWS = [('Strikes', 'strikes'), ('CE LTP', 'ce_ltp'), ('PE LTP', 'pe_ltp'),
+        ('CE Premium', 'ce_premium'), ('PE Premium', 'pe_premium')]
+ROW_LABELS = [label for label, _ in ROWS] + ['Discount']
+
+def fetching_message(index):
+  return f'<h3><i>Fetching {index} Option data.....</i></h3>'
+
+def format_value(value):
+  if value != value:
+    return ''
+  return repr(round(float(value), 2))
+
+@lru_cache(maxsize=64)
+def table_header(n_strikes, atm):
+  header = '  <thead>\n    <tr style="text-align: right;">\n      <th></th>'
+  if atm > 0:
+    header += f'<th colspan={atm} class="calls">Calls</th>'
+  header += '<th class="atm">ATM</th>'
+  if atm < n_strikes - 1:
+    header += f'<th colspan={n_strikes - atm - 1} class="puts">Puts</th>'
+  return header + '</tr>\n  </thead>'
+
+
+class TableRenderer:
+  """
+  Renders an IndexSnapshot straight from its arrays into the option table.
+  The stylesheet is static and shipped separately through stylesheet(),
+  only the cells change from one tick to the next. `caption_colors` maps
+  a table class name to the color of its captions.
+  """
+  def __init__(self, caption_colors=None):
+    self.caption_colors = caption_colors or {}
+
+  def stylesheet(self):
+    if not self.caption_colors:
+      return STYLESHEET
+    rules = ''.join(f'table.dataframe.{class_name} caption{{color: {color};}}'
+                    for class_name, color in self.caption_colors.items())
+    return STYLESHEET + f'<style>{rules}</style>'
+
+  def cells(self, snapshot):
+    """
+    Display text of every cell, row by row in ROWS order followed by the
+    Discount row.
+    """
+    result = snapshot.result
+    rows = [[format_value(v) for v in getattr(result, attr).tolist()] for _, attr in ROWS]
+    discount = ['Discount' if flag else '' for flag in result.discount.tolist()]
+    discount[result.atm] = snapshot.atm_label
+    rows.append(discount)
+    return rows
+
+  def grid(self, snapshot):
+    """
+    (text, class) of every body cell, row by row in ROW_LABELS order.
+    """
+    atm = snapshot.result.atm
+    grid = []
+    for label, row in zip(ROW_LABELS, self.cells(snapshot)):
+      classes = ['discount' if label == 'Discount' and text == 'Discount' else '' for text in row]
+      cheap = (label == 'CE Premium' and snapshot.cheap == 'CE') or (label == 'PE Premium' and snapshot.cheap == 'PE')
+      classes[atm] = 'atm-col cheap' if cheap else 'atm-col'
+      grid.append(list(zip(row, classes)))
+    return grid
+
+  def captions(self, snapshot):
+    value_diff = round(snapshot.futures_value - snapshot.spot_value, 2)
+    diff_color = '#FF5C5C' if value_diff < 0 else '#32CD32'
+    fut_label = 'Fut mid' if snapshot.futures_source == 'mid' else 'Fut'
+    return (f'{snapshot.index} Spot : {snapshot.spot_value}',
+            f"{snapshot.index} {fut_label} : {snapshot.futures_value} <span style='color:{diff_color}'>({value_diff})</span>")
+
+  def row_html(self, label, row):
+    tds = ''.join(('<td class="%s">%s</td>' % (cls, text)) if cls else ('<td>%s</td>' % text) for text, cls in row)
+    return '    <tr>\n      <th>%s</th>%s</tr>' % (label, tds)
+
+  def render(self, snapshot, class_name, table_id=None):
+    result = snapshot.result
+    spot_caption, fut_caption = self.captions(snapshot)
+    rows = [self.row_html(label, row) for label, row in zip(ROW_LABELS, self.grid(snapshot))]
+    return TABLE_TEMPLATE % {
+      'class_name' : class_name,
+      'table_id' : f' id="{table_id}"' if table_id else '',
+      'spot_caption' : spot_caption,
+      'fut_caption' : fut_caption,
+      'header' : table_header(len(result.strikes), result.atm),
+      'rows' : '\n'.join(rows)}
@@ -0,0 +1,72 @@
+"""
+Registry of the underlyings the scanner knows. Adding one is configuration
+only :
+
+  register(Underlying('MIDCPNIFTY', MIDCPNIFTY_SPOT_SCRIP_CODE, 25))
+
+then FetchOptionData(..., UNDERLYINGS=['NIFTY', 'MIDCPNIFTY'],
+EXPIRIES={'MIDCPNIFTY' : (option_expiry_epoch, futures_expiry)}).
+Underlyings of one expiry `family` share their option and futures expiry
+dates, as NIFTY and BANKNIFTY do.
+"""
+
+class Underlying:
+  """
+  symbol      : trading symbol, as sent to GetOptionsForSymbol
+  scrip_code  : scrip code of the spot on the market feed
+  step        : strike interval
+  window      : strikes each side of ATM, None for the scanner's STRIKE_WINDOW
+  family      : expiry family, defaults to the symbol
+  class_name  : CSS class of the table, defaults to the lowercased symbol
+  color       : caption color of the table, None for the default
+  """
+  def __init__(self, symbol, scrip_code, step, window=None, family=None, class_name=None, color=None):
+    self.symbol = symbol
+    self.scrip_code = str(scrip_code)
+    self.step = step
+    self.window = window
+    self.family = family or symbol
+    self.class_name = class_name or symbol.lower()
+    self.color = color
+
+  def __repr__(self):
+    return f'Underlying({self.symbol!r}, step={self.step}, family={self.family!r})'
+
+
+UNDERLYINGS = {}
+
+def register(underlying):
+  UNDERLYINGS[underlying.symbol] = underlying
+  return underlying
+
+def register_all(definitions):
+  """
+  Registers Underlying objects or their keyword dicts, returns the
+  symbols in order. Plain strings must already be registered.
+  """
+  symbols = []
+  for definition in definitions:
+    if isinstance(definition, dict):
+      definition = register(Underlying(**definition))
+    if isinstance(definition, Underlying):
+      definition = register(definition).symbol
+    underlying(definition)
+    symbols.append(definition)
+  return symbols
+
+def underlying(symbol):
+  try:
+    return UNDERLYINGS[symbol]
+  except KeyError:
+    raise KeyError(f'Unknown underlying {symbol}, register() it first') from None
+
+def class_names():
+  return {symbol : u.class_name for symbol, u in UNDERLYINGS.items()}
+
+def caption_colors():
+  return {u.class_name : u.color for u in UNDERLYINGS.values() if u.color}
+
+
+register(Underlying('NIFTY', '999920000', 50, family='NIFTY'))
+register(Underlying('BANKNIFTY', '999920005', 100, family='NIFTY'))
+register(Underlying('FINNIFTY', '999920041', 50, family='FINNIFTY'))
@@ -0,0 +1,218 @@
+import threading
+import numpy as np
+
+from py5paisa.subscriptions import SubscriptionManager, AtmTracker
+from py5paisa.ws_consumer import AsyncFeedConsumer, QueueClosed
+from discount_engine import OptionChainArrays, IndexSnapshot, compute_discount, update_discount
+
+# Strikes subscribed beyond the discount window : one for the CE/PE overlap
+# around ATM and one for the lag of the hysteresis on the window centre
+SUBSCRIPTION_MARGIN = 2
+
+def feed_item(exch, exch_type, scrip_code):
+  return {'Exch' : exch, 'ExchType' : exch_type, 'ScripCode' : int(scrip_code)}
+
+
+class LiveChain:
+  """
+  Option chain of one index kept up to date by MarketFeedV3 ticks.
+
+  Built once from the REST responses : spot, futures and every option of
+  the chain sit in strike sorted arrays (OptionChainArrays) and a dict
+  maps each scrip code to its slot, so a tick is applied in O(1). Strikes
+  whose LTP changed since the last snapshot are tracked, letting
+  snapshot() re-evaluate only those rows while spot and ATM stay put.
+  """
+  def __init__(self, index, spot_code, spot_value, futures_code, futures_value, options, step, window, atm_strike):
+    self.index = index
+    self.step = step
+    self.window = window
+    self.atm_strike = atm_strike
+    # Centre of the subscribed strikes, moved by ChainFeed.follow()
+    self.centre = atm_strike
+    self.spot_code = int(spot_code)
+    self.spot_value = spot_value
+    self.futures_code = None if futures_code is None else int(futures_code)
+    self.futures_value = futures_value
+
+    self.chain = OptionChainArrays.from_options(options)
+    self.slots = {}
+    for side, strikes in (('CE', self.chain.call_strikes), ('PE', self.chain.put_strikes)):
+      codes = {oc['StrikeRate'] : oc['ScripCode'] for oc in options if oc['CPType'] == side}
+      for row, strike in enumerate(strikes.tolist()):
+        self.slots[int(codes[strike])] = (side, row)
+
+    self.lock = threading.Lock()
+    self.spot_moved = True
+    self.futures_moved = False
+    self.dirty = set()
+    self.result = None
+    self.updated_rows = 0
+
+  def scrip_codes(self, centre, window=None):
+    """
+    Option scrip codes of the strikes within `window` strikes of `centre`,
+    or of the whole chain when the window is None.
+    """
+    codes = []
+    for code, (side, row) in self.slots.items():
+      strikes = self.chain.call_strikes if side == 'CE' else self.chain.put_strikes
+      if window is None or abs(strikes[row] - centre) <= window*self.step:
+        codes.append(code)
+    return codes
+
+  def codes(self):
+    """Every scrip code ticks of this chain can carry."""
+    codes = [self.spot_code] + list(self.slots)
+    if self.futures_code is not None:
+      codes.append(self.futures_code)
+    return codes
+
+  def feed_items(self):
+    """MarketFeedV3 items of the index, its futures and the strikes around the centre."""
+    items = [feed_item('N', 'C', self.spot_code)]
+    if self.futures_code is not None:
+      items.append(feed_item('N', 'D', self.futures_code))
+    window = None if self.window is None else self.window + SUBSCRIPTION_MARGIN
+    items.extend(feed_item('N', 'D', code) for code in self.scrip_codes(self.centre, window))
+    return items
+
+  def apply(self, code, ltp):
+    """
+    Applies the LTP of one tick, True when it changed a value of this chain.
+    """
+    with self.lock:
+      if code == self.spot_code:
+        if ltp == self.spot_value:
+          return False
+        self.spot_value = ltp
+        self.spot_moved = True
+        return True
+      if code == self.futures_code:
+        if ltp == self.futures_value:
+          return False
+        self.futures_value = ltp
+        self.futures_moved = True
+        return True
+      slot = self.slots.get(code)
+      if slot is None:
+        return False
+      side, row = slot
+      strikes, ltps = (self.chain.call_strikes, self.chain.call_ltp) if side == 'CE' else (self.chain.put_strikes, self.chain.put_ltp)
+      if ltps[row] == ltp:
+        return False
+      ltps[row] = ltp
+      self.dirty.add(strikes[row])
+      return True
+
+  @property
+  def changed(self):
+    return self.spot_moved or self.futures_moved or bool(self.dirty)
+
+  def snapshot(self, atm_strike):
+    """
+    IndexSnapshot of the chain around `atm_strike`. A spot or ATM move
+    recomputes every row, otherwise only the rows of changed strikes are
+    re-evaluated. None when nothing changed since the last snapshot.
+    """
+    with self.lock:
+      if self.result is not None and not self.changed:
+        return None
+      if self.result is None or self.spot_moved or atm_strike != self.atm_strike:
+        self.atm_strike = atm_strike
+        self.result = compute_discount(self.spot_value, self.chain, atm_strike, self.step, self.window)
+        self.updated_rows = len(self.result.strikes)
+      elif self.dirty:
+        self.updated_rows = update_discount(self.result, self.chain, np.fromiter(self.dirty, dtype=np.float64))
+      else:
+        self.updated_rows = 0
+      self.spot_moved = self.futures_moved = False
+      self.dirty.clear()
+      return IndexSnapshot(self.index, self.spot_value, self.futures_value, self.result)
+
+
+class ChainFeed:
+  """
+  Feeds LiveChains from one MarketFeedV3 subscription on the openfeed
+  websocket, owned by an AsyncFeedConsumer that reconnects and subscribes
+  again on its own. Decoded messages are applied on a dispatch thread,
+  wait() blocks the caller until a tick changed a chain.
+  follow() moves each chain's subscribed strikes along with spot, sending
+  only the strikes entering and leaving the window.
+  """
+  def __init__(self, client, chains, hysteresis=0.25, tickstore=None):
+    self.client = client
+    self.chains = chains
+    # Optional TickStore recording the full tick history of the feed
+    self.tickstore = tickstore
+    self.routes = {}
+    for chain in chains.values():
+      for code in chain.codes():
+        self.routes[code] = chain
+    self.subscriptions = SubscriptionManager(client)
+    self.trackers = {index : AtmTracker(chain.step, hysteresis, chain.centre) for index, chain in chains.items()}
+    for index, chain in chains.items():
+      self.subscriptions.set_desired(index, chain.feed_items())
+    self.updated = threading.Event()
+    self.consumer = None
+    self.thread = None
+
+  def apply_ticks(self, ticks):
+    if isinstance(ticks, dict):
+      ticks = [ticks]
+    if self.tickstore is not None:
+      self.tickstore.ingest(ticks)
+    changed = False
+    for tick in ticks:
+      if 'Token' not in tick or 'LastRate' not in tick:
+        continue
+      code = int(tick['Token'])
+      chain = self.routes.get(code)
+      if chain is not None:
+        changed |= chain.apply(code, float(tick['LastRate']))
+    if changed:
+      self.updated.set()
+
+  def _dispatch(self):
+    while True:
+      try:
+        message = self.consumer.get()
+      except QueueClosed:
+        return
+      if message is not None:
+        self.apply_ticks(message[1])
+
+  def follow(self):
+    """
+    Re-centres the subscribed strikes of chains whose spot left the
+    hysteresis band, returns the (added, removed) instrument counts.
+    """
+    for index, chain in self.chains.items():
+      if self.trackers[index].update(chain.spot_value):
+        chain.centre = self.trackers[index].centre
+        self.subscriptions.set_desired(index, chain.feed_items())
+    # Also retries batches a previous sync failed to send
+    return self.subscriptions.sync()
+
+  def start(self, consumer=None):
+    self.consumer = consumer or AsyncFeedConsumer()
+    self.consumer.add_market_feed(self.client, self.subscriptions)
+    # Marked subscribed now, the connection sends them on every (re)connect
+    self.subscriptions.take_pending()
+    self.consumer.start()
+    self.thread = threading.Thread(target=self._dispatch, daemon=True)
+    self.thread.start()
+
+  def wait(self, timeout=1):
+    """True when at least one tick changed a chain since the last wait."""
+    updated = self.updated.wait(timeout)
+    self.updated.clear()
+    return updated
+
+  def stop(self):
+    if self.consumer is not None:
+      self.consumer.stop()
+      self.consumer = None
+    if self.thread is not None:
+      self.thread.join(timeout=1)
+      self.thread = None
@@ -0,0 +1,133 @@
+import json
+import uuid
+from IPython.display import display, HTML, Javascript
+from html_renderer import fetching_message
+
+DISPLAY_MODES = ('cells', 'tables', 'refresh')
+
+# Applies one tick of changed cells to the tables already on screen. Patches
+# are [table_id, [spot_caption, fut_caption] or null, [[row, col, html, class], ...]]
+PATCH_SCRIPT = """(function(patches){
+  patches.forEach(function(patch){
+    var table = document.getElementById(patch[0]);
+    if (!table) return;
+    if (patch[1]) {
+      var captions = table.getElementsByTagName('caption');
+      captions[0].innerHTML = patch[1][0];
+      captions[1].innerHTML = patch[1][1];
+    }
+    var rows = table.tBodies[0].rows;
+    patch[2].forEach(function(cell){
+      var td = rows[cell[0]].cells[cell[1] + 1];
+      td.innerHTML = cell[2];
+      td.className = cell[3];
+    });
+  });
+})(%s);"""
+
+
+class LiveDisplay:
+  """
+  Keeps the option tables in place between ticks instead of clearing the
+  cell output and re-displaying everything.
+
+  The stylesheet is displayed once and every index owns a display handle.
+  In 'tables' mode a handle is only updated when its rendered table
+  changed. In 'cells' mode the new snapshot is diffed against the previous
+  one and only the changed cells are pushed to the page through a small
+  script; a full table update is only sent when the layout (number of
+  strikes or ATM column) moves. Ticks where nothing changed send nothing.
+  """
+  def __init__(self, renderer, class_names, mode='cells'):
+    if mode not in ('cells', 'tables'):
+      raise ValueError(f'Unknown display mode {mode!r}')
+    self.renderer = renderer
+    self.class_names = class_names
+    self.mode = mode
+    self.session = uuid.uuid4().hex[:8]
+    self.stylesheet = None
+    self.handles = {}
+    self.shown = {}
+    self.patch_handle = None
+    self.updates = 0
+    self.patches = 0
+    self.skipped = 0
+
+  def table_id(self, index):
+    return f'{self.class_names[index]}-{self.session}'
+
+  def _show(self, index, html):
+    if index in self.handles:
+      self.handles[index].update(HTML(html))
+    else:
+      self.handles[index] = display(HTML(html), display_id=True)
+    self.updates += 1
+
+  def _patch(self, patches):
+    script = Javascript(PATCH_SCRIPT % json.dumps(patches))
+    if self.patch_handle is None:
+      self.patch_handle = display(script, display_id=True)
+    else:
+      self.patch_handle.update(script)
+    self.patches += 1
+
+  def _diff(self, index, layout, captions, grid):
+    """
+    Cell patch of `index` against what is on screen, None when the table
+    has to be redrawn.
+    """
+    previous = self.shown.get(index)
+    if not isinstance(previous, tuple) or previous[0] != layout:
+      return None
+    _, shown_captions, shown_grid = previous
+    changed = [[r, c, text, cls]
+               for r, (row, shown_row) in enumerate(zip(grid, shown_grid))
+               for c, ((text, cls), shown_cell) in enumerate(zip(row, shown_row))
+               if (text, cls) != shown_cell]
+    if captions == shown_captions and not changed:
+      return []
+    return [self.table_id(index), list(captions) if captions != shown_captions else None, changed]
+
+  def update(self, snapshots):
+    """
+    Bring the output in line with `snapshots`, a dict of index to
+    IndexSnapshot or None while the index is still being fetched.
+    """
+    if self.stylesheet is None:
+      self.stylesheet = display(HTML(self.renderer.stylesheet()), display_id=True)
+
+    patches = []
+    for index, snapshot in snapshots.items():
+      if snapshot is None:
+        html = fetching_message(index)
+        if self.shown.get(index) != html:
+          self._show(index, html)
+          self.shown[index] = html
+        else:
+          self.skipped += 1
+        continue
+
+      if self.mode == 'tables':
+        html = self.renderer.render(snapshot, self.class_names[index], self.table_id(index))
+        if self.shown.get(index) != html:
+          self._show(index, html)
+          self.shown[index] = html
+        else:
+          self.skipped += 1
+        continue
+
+      result = snapshot.result
+      layout = (len(result.strikes), result.atm)
+      captions = self.renderer.captions(snapshot)
+      grid = self.renderer.grid(snapshot)
+      patch = self._diff(index, layout, captions, grid)
+      if patch is None:
+        self._show(index, self.renderer.render(snapshot, self.class_names[index], self.table_id(index)))
+      elif patch:
+        patches.append(patch)
+      else:
+        self.skipped += 1
+      self.shown[index] = (layout, captions, grid)
+
+    if patches:
+      self._patch(patches)
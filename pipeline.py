@@ -0,0 +1,129 @@
+import time
+import threading
+
+class PipelineClosed(Exception):
+  pass
+
+
+class HandOff:
+  """
+  Single slot hand-off between two pipeline stages. The producer waits
+  for the slot to be empty before starting its next item, so nothing is
+  ever overwritten or dropped.
+  """
+  EMPTY = object()
+
+  def __init__(self):
+    self.item = self.EMPTY
+    self.cond = threading.Condition()
+    self.closed = False
+
+  def put(self, item):
+    with self.cond:
+      if self.closed:
+        raise PipelineClosed
+      self.item = item
+      self.cond.notify_all()
+
+  def get(self):
+    with self.cond:
+      while self.item is self.EMPTY:
+        if self.closed:
+          raise PipelineClosed
+        # Short waits keep the render thread responsive to KeyboardInterrupt
+        self.cond.wait(0.5)
+      item, self.item = self.item, self.EMPTY
+      self.cond.notify_all()
+      return item
+
+  def wait_empty(self):
+    """Blocks until the consumer took the item handed over."""
+    with self.cond:
+      while self.item is not self.EMPTY:
+        if self.closed:
+          raise PipelineClosed
+        self.cond.wait(0.5)
+      if self.closed:
+        raise PipelineClosed
+
+  def close(self):
+    with self.cond:
+      self.closed = True
+      self.cond.notify_all()
+
+
+class TickPipeline:
+  """
+  Runs fetch, compute and render as three overlapping stages:
+
+    fetch()          -> values   (background thread)
+    compute(values)  -> result   (background thread)
+    render(result)               (calling thread, so notebook output stays in the cell)
+
+  Fetching tick N+1 overlaps computing tick N, computing tick N+1
+  overlaps rendering tick N. A stage only starts its next tick once the
+  next stage took the previous one, so the slowest stage sets the pace
+  and no tick is fetched just to be dropped. The price is lag : while
+  tick N renders, tick N+1 waits computed and tick N+2 fetched, so the
+  data on screen is up to two ticks of the slowest stage old. `interval`
+  is the minimum number of seconds between two fetches, 0 fetches as
+  fast as the other stages keep up.
+  """
+  def __init__(self, fetch, compute, render, interval=0):
+    self.fetch = fetch
+    self.compute = compute
+    self.render = render
+    self.interval = interval
+    self.fetched = HandOff()
+    self.computed = HandOff()
+    self.stopped = threading.Event()
+    self.error = None
+    self.threads = []
+
+  def _fetch_stage(self):
+    while not self.stopped.is_set():
+      self.fetched.wait_empty()
+      started = time.monotonic()
+      self.fetched.put(self.fetch())
+      wait = self.interval - (time.monotonic() - started)
+      if wait > 0:
+        self.stopped.wait(wait)
+
+  def _compute_stage(self):
+    while not self.stopped.is_set():
+      self.computed.wait_empty()
+      self.computed.put(self.compute(self.fetched.get()))
+
+  def _guard(self, stage):
+    try:
+      stage()
+    except PipelineClosed:
+      pass
+    except BaseException as e:
+      self.error = e
+      self.stop()
+
+  def start(self):
+    for stage in (self._fetch_stage, self._compute_stage):
+      thread = threading.Thread(target=self._guard, args=(stage,), daemon=True)
+      thread.start()
+      self.threads.append(thread)
+
+  def run(self):
+    self.start()
+    try:
+      while True:
+        self.render(self.computed.get())
+    except PipelineClosed:
+      if self.error is not None:
+        raise self.error
+    finally:
+      self.stop()
+
+  def stop(self):
+    self.stopped.set()
+    self.fetched.close()
+    self.computed.close()
+    for thread in self.threads:
+      if thread is not threading.current_thread():
+        thread.join(timeout=1)
@@ -1,4 +1,11 @@
 from py5paisa.py5paisa import FivePaisaClient
+from py5paisa.token_store import MemoryTokenStore, FileTokenStore
+from py5paisa.transport import Transport, RetryBudget
+from py5paisa.rate_limit import RateLimiter
+from py5paisa.tickstore import TickStore
+from py5paisa.orderbook import OrderBook, OrderBooks
+from py5paisa.subscriptions import SubscriptionManager, AtmTracker
+from py5paisa.metrics import registry as metrics_registry, timed
 from py5paisa.time_utils import getEpochTime, convertTimeString
 from py5paisa.custom_exceptions import InvalidLoginCredentialsException
 from py5paisa.custom_exceptions import InvalidFutureExpiryDateException
@@ -8,10 +15,38 @@ from py5paisa.custom_exceptions import OptionChainFetchException
 from py5paisa.custom_exceptions import SpotFetchException
 from py5paisa.custom_exceptions import FuturesFetchException
 
+# aiohttp is only imported once the asyncio client or the feed consumer is used
+_LAZY = {"AsyncFivePaisaClient": "py5paisa.async_client",
+         "AsyncFeedConsumer": "py5paisa.ws_consumer",
+         "BoundedQueue": "py5paisa.ws_consumer",
+         "QueueClosed": "py5paisa.ws_consumer"}
+
+def __getattr__(name):
+    if name in _LAZY:
+        import importlib
+        return getattr(importlib.import_module(_LAZY[name]), name)
+    raise AttributeError(f"module 'py5paisa' has no attribute {name!r}")
+
 __all__ = ["FivePaisaClient", 
+          "MemoryTokenStore",
+          "FileTokenStore",
+          "Transport",
+          "RetryBudget",
+          "RateLimiter",
+          "AsyncFivePaisaClient",
+          "AsyncFeedConsumer",
+          "BoundedQueue",
+          "QueueClosed",
+          "SubscriptionManager",
+          "TickStore",
+          "OrderBook",
+          "OrderBooks",
+          "AtmTracker",
           "FetchOptionData", 
           "getEpochTime", 
           "convertTimeString",
+          "metrics_registry",
+          "timed",
           "InvalidLoginCredentialsException",
           "InvalidFutureExpiryDateException",
           "InvalidLoginException",
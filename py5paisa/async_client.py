@@ -0,0 +1,211 @@
+"""
+Asyncio client for concurrent market data and order calls
+"""
+import time
+import asyncio
+import aiohttp
+from .py5paisa import FivePaisaClient
+from .const import TODAY_TIMESTAMP
+from .urlconst import USER_INFO_ROUTES
+from .logging import log_response
+from .metrics import timed, registry
+from .token_refresh import is_auth_failure
+
+
+class AsyncFivePaisaClient:
+
+    def __init__(self, email=None, passwd=None, dob=None, cred=None, client=None, pool_size=100, base_url=None):
+        """
+        Async counterpart of FivePaisaClient with the same method surface.
+        Either pass the usual credentials or an already logged in
+        FivePaisaClient through `client` to reuse its session tokens.
+        All requests share one aiohttp connection pool of `pool_size` and
+        keep to the per-route deadlines of the client's transport.
+        """
+        self.client = client if client is not None else FivePaisaClient(
+            email=email, passwd=passwd, dob=dob, cred=cred, base_url=base_url)
+        self.pool_size = pool_size
+        self._http = None
+
+    @classmethod
+    def from_client(cls, client, pool_size=100):
+        return cls(client=client, pool_size=pool_size)
+
+    @property
+    def client_code(self):
+        return self.client.client_code
+
+    @property
+    def is_logged_in(self):
+        return self.client.is_logged_in
+
+    @property
+    def login_response_message(self):
+        return self.client.login_response_message
+
+    def _session(self):
+        if self._http is None or self._http.closed:
+            connector = aiohttp.TCPConnector(limit=self.pool_size)
+            self._http = aiohttp.ClientSession(connector=connector)
+        return self._http
+
+    async def _send(self, url, payload, headers, route):
+        transport = self.client.transport
+        deadline = transport.deadline(route)
+        wait = 0.0
+        if transport.limiter is not None:
+            # Reserving a slot locks the file shared with other processes, keep it off the event loop
+            loop = asyncio.get_running_loop()
+            wait = await loop.run_in_executor(None, transport.pace, route, deadline)
+        if wait:
+            await asyncio.sleep(wait)
+        timeout = aiohttp.ClientTimeout(total=deadline - wait)
+        started = time.perf_counter()
+        async with self._session().post(url, json=payload, headers=headers, timeout=timeout) as res:
+            try:
+                response = await res.json(content_type=None)
+            except ValueError:
+                response = None
+        if route is not None:
+            registry.record(transport.latency_metric(route), time.perf_counter() - started)
+        return res.status, response, time.perf_counter()
+
+    async def _post(self, url, payload, headers, route=None):
+        # Hedged like Transport.request : past the route's tail latency a
+        # duplicate goes out and the first answer wins, the other one is
+        # left to finish so its connection goes back to the pool
+        transport = self.client.transport
+        delay = transport.hedge_delay(route)
+        if delay is None:
+            return (await self._send(url, payload, headers, route))[:2]
+        primary = asyncio.ensure_future(self._send(url, payload, headers, route))
+        done, _ = await asyncio.wait((primary,), timeout=delay)
+        if done or not transport.take_hedge():
+            return (await primary)[:2]
+        hedge = asyncio.ensure_future(self._send(url, payload, headers, route))
+        await asyncio.wait((primary, hedge), return_when=asyncio.FIRST_COMPLETED)
+        if not hedge.done() or hedge.exception() is not None:
+            return (await primary)[:2]
+        if primary.done() and primary.exception() is None:
+            return primary.result()[:2]
+        status, response, answered = hedge.result()
+        transport.hedge_won()
+        primary.add_done_callback(lambda original: self._record_saved(original, answered))
+        return status, response
+
+    def _record_saved(self, original, answered):
+        if not original.cancelled() and original.exception() is None:
+            self.client.transport.hedge_saved(original.result()[2] - answered)
+
+    async def _post_authorized(self, metric, build, route=None):
+        # Same single retry as FivePaisaClient._post_authorized, the blocking
+        # re-login runs off the event loop and concurrent failures share it
+        stale_token = self.client.Jwt_token
+        with timed(metric):
+            status, response = await self._post(*build(), route)
+            if is_auth_failure(status, response):
+                loop = asyncio.get_running_loop()
+                if await loop.run_in_executor(None, self.client.refresh_session, stale_token):
+                    status, response = await self._post(*build(), route)
+        return response
+
+    async def close(self):
+        if self._http is not None:
+            await self._http.close()
+            self._http = None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+    async def login(self):
+        # Login is a one-off blocking handshake, keep it off the event loop
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(None, self.client.login)
+
+    async def order_request(self, req_type, body=None):
+        try:
+            res = await self._post_authorized("order_request." + req_type,
+                                              lambda: self.client._prepare_request(req_type, body), req_type)
+            if req_type == "MS":
+                log_response(res["head"]["statusDescription"])
+            else:
+                log_response(res["body"]["Message"])
+            return res["body"]
+        except Exception as e:
+            log_response(e)
+
+    async def _user_info_request(self, data_type):
+        try:
+            if data_type not in USER_INFO_ROUTES:
+                raise Exception("Invalid data type requested")
+            return_type = USER_INFO_ROUTES[data_type][1]
+            response = await self._post_authorized("user_info." + data_type,
+                                                   lambda: self.client._prepare_user_info_request(data_type))
+            return response["body"][return_type]
+        except Exception as e:
+            log_response(e)
+
+    async def holdings(self):
+        return await self._user_info_request("HOLDINGS")
+
+    async def margin(self):
+        return await self._user_info_request("MARGIN")
+
+    async def order_book(self):
+        return await self._user_info_request("ORDER_BOOK")
+
+    async def positions(self):
+        return await self._user_info_request("POSITIONS")
+
+    async def fetch_order_status(self, req_list:list):
+        return await self.order_request("OS", {"OrdStatusReqList": req_list})
+
+    async def fetch_trade_info(self, req_list:list):
+        return await self.order_request("TI", {"TradeInformationList": req_list})
+
+    async def fetch_market_depth(self, req_list:list):
+        return await self.order_request("MD", {"Count": "1", "Data": req_list})
+
+    async def fetch_market_depth_by_symbol(self, req_list:list):
+        return await self.order_request("MDS", {"Count": "1", "Data": req_list})
+
+    async def fetch_market_feed(self, req_list:list):
+        return await self.order_request("MF", {
+            "MarketFeedData": req_list,
+            "ClientLoginType": 0,
+            "LastRequestTime": f"/Date({TODAY_TIMESTAMP})/",
+            "RefreshRate": "H"})
+
+    async def place_order(self, **order):
+        if(order['Price'] >= 0 and order["ScripCode"] and order['Exchange'] and order['OrderType'] and order['Qty'] and order['ExchangeType']):
+            return await self.order_request("OP", order)
+        return log_response("please enter valid input")
+
+    async def modify_order(self, **order):
+        if(order['Price'] and order['ExchOrderID']):
+            return await self.order_request("OM", order)
+
+    async def cancel_order(self, exch_order_id:str):
+        return await self.order_request("OC", {"ExchOrderID": exch_order_id})
+
+    async def get_tradebook(self):
+        return await self.order_request("TB")
+
+    async def get_market_status(self):
+        try:
+            market_status_response = await self.order_request("MS")
+            return market_status_response["Data"]
+        except Exception as e:
+            log_response(e)
+
+    async def get_expiry(self, exch:str, symbol:str):
+        return await self.order_request("GE", {"Exch": exch, "Symbol": symbol})
+
+    async def get_option_chain(self, exch:str, symbol:str, expire:int):
+        return await self.order_request("GOC", {
+            "Exch": exch,
+            "Symbol": symbol,
+            "ExpiryDate": f"/Date({expire})/"})
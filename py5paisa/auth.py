@@ -2,9 +2,7 @@
 Contains the core encryption logic
 """
 
-from Crypto.Cipher import AES
 import base64
-from pbkdf2 import PBKDF2
 
 
 
@@ -14,16 +12,25 @@ class EncryptionClient:
         self.iv = bytes([83, 71, 26, 58, 54, 35, 22, 11,
                          83, 71, 26, 58, 54, 35, 22, 11])
         self.enc_key = ENCRYPTION_KEY 
+        self._key = None
 
     def _pad_and_convert_to_bytes(self, text):
         return bytes(text+chr(16-len(text) % 16)*(16-len(text) % 16), encoding="utf-8")
 
+    def _derive_key(self):
+        # PBKDF2 dominates login time and only depends on the key, derive it once
+        if self._key is None:
+            from pbkdf2 import PBKDF2
+            key_gen = PBKDF2(self.enc_key, self.iv)
+            aesiv = key_gen.read(16)
+            aeskey = key_gen.read(32)
+            self._key = (aesiv, aeskey)
+        return self._key
+
     def encrypt(self, text):
+        from Crypto.Cipher import AES
         padded_text = self._pad_and_convert_to_bytes(text)
-        key_gen = PBKDF2(self.enc_key, self.iv)
-
-        aesiv = key_gen.read(16)
-        aeskey = key_gen.read(32)
+        aesiv, aeskey = self._derive_key()
         cipher = AES.new(aeskey, AES.MODE_CBC, aesiv)
     
         return str(base64.b64encode(cipher.encrypt(padded_text)), encoding="utf-8")
\ No newline at end of file
@@ -0,0 +1,194 @@
+"""
+Contains latency histograms and the registry timing client routes and
+scanner stages
+"""
+import sys
+import json
+import math
+import time
+import atexit
+import threading
+from contextlib import contextmanager
+
+# Log spaced buckets, 8 per doubling (~9% resolution) from 10us to ~3 hours
+BUCKET_BASE = 1e-5
+BUCKETS_PER_DOUBLING = 8
+BUCKET_COUNT = 8 * 30
+
+
+def bucket_index(seconds):
+    if seconds <= BUCKET_BASE:
+        return 0
+    index = int(math.log2(seconds / BUCKET_BASE) * BUCKETS_PER_DOUBLING) + 1
+    return min(index, BUCKET_COUNT - 1)
+
+
+def bucket_upper_bound(index):
+    return BUCKET_BASE * 2 ** (index / BUCKETS_PER_DOUBLING)
+
+
+class LatencyHistogram:
+
+    def __init__(self):
+        """
+        Fixed size histogram of durations in seconds. Recording is O(1)
+        and percentiles are read off the bucket counts, so it can stay on
+        for the whole session.
+        """
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.counts = [0] * BUCKET_COUNT
+            self.count = 0
+            self.total = 0.0
+            self.min = math.inf
+            self.max = 0.0
+
+    def record(self, seconds):
+        with self.lock:
+            self.counts[bucket_index(seconds)] += 1
+            self.count += 1
+            self.total += seconds
+            if seconds < self.min:
+                self.min = seconds
+            if seconds > self.max:
+                self.max = seconds
+
+    def state(self):
+        with self.lock:
+            return list(self.counts), self.count, self.total, self.min, self.max
+
+    def merge(self, buckets, count, total, low, high):
+        """Adds durations recorded elsewhere, `buckets` maps bucket indices to counts."""
+        with self.lock:
+            for index, bucket_count in buckets.items():
+                self.counts[index] += bucket_count
+            self.count += count
+            self.total += total
+            self.min = min(self.min, low)
+            self.max = max(self.max, high)
+
+    def percentile(self, q):
+        """
+        Upper bound of the bucket holding the `q` (0-100) percentile,
+        clamped to the observed min and max. None when nothing was recorded.
+        """
+        with self.lock:
+            if self.count == 0:
+                return None
+            rank = max(1, math.ceil(self.count * q / 100))
+            seen = 0
+            for index, count in enumerate(self.counts):
+                seen += count
+                if seen >= rank:
+                    return min(max(bucket_upper_bound(index), self.min), self.max)
+            return self.max
+
+    def snapshot(self):
+        """Summary in milliseconds."""
+        if self.count == 0:
+            return {"count": 0}
+        ms = lambda seconds: round(seconds * 1000, 3)
+        return {"count": self.count,
+                "mean": ms(self.total / self.count),
+                "min": ms(self.min),
+                "p50": ms(self.percentile(50)),
+                "p95": ms(self.percentile(95)),
+                "p99": ms(self.percentile(99)),
+                "max": ms(self.max)}
+
+
+class MetricsRegistry:
+
+    def __init__(self):
+        """
+        Named latency histograms, created on first use. Timing can be
+        switched off through `enabled`.
+        """
+        self.histograms = {}
+        self.lock = threading.Lock()
+        self.enabled = True
+
+    def histogram(self, name):
+        histogram = self.histograms.get(name)
+        if histogram is None:
+            with self.lock:
+                histogram = self.histograms.setdefault(name, LatencyHistogram())
+        return histogram
+
+    def record(self, name, seconds):
+        if self.enabled:
+            self.histogram(name).record(seconds)
+
+    @contextmanager
+    def timed(self, name):
+        """Records the duration of the `with` block under `name`, errors included."""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - started)
+
+    def percentile(self, name, q):
+        histogram = self.histograms.get(name)
+        return None if histogram is None else histogram.percentile(q)
+
+    def changes(self, reported):
+        """
+        Durations recorded since the call that filled `reported`, a dict
+        this updates, as {name: (buckets, count, total, min, max)}. A
+        worker process sends them for the parent to merge() into the
+        registry it reports.
+        """
+        changes = {}
+        for name, histogram in list(self.histograms.items()):
+            previous = reported.get(name)
+            if previous is not None and previous[1] == histogram.count:
+                continue
+            state = histogram.state()
+            counts, count, total, low, high = state
+            if previous is None:
+                previous = ([0] * BUCKET_COUNT, 0, 0.0)
+            buckets = {index: now - before for index, (now, before) in enumerate(zip(counts, previous[0]))
+                       if now != before}
+            changes[name] = (buckets, count - previous[1], total - previous[2], low, high)
+            reported[name] = state
+        return changes
+
+    def merge(self, changes):
+        if self.enabled:
+            for name, change in changes.items():
+                self.histogram(name).merge(*change)
+
+    def summary(self):
+        return {name: self.histograms[name].snapshot() for name in sorted(self.histograms)}
+
+    def reset(self):
+        for histogram in list(self.histograms.values()):
+            histogram.reset()
+
+    def format_summary(self):
+        lines = [f"{'stage':<28}{'count':>8}{'mean':>10}{'p50':>10}{'p95':>10}{'p99':>10}{'max':>10}  (ms)"]
+        for name, stats in self.summary().items():
+            if stats["count"] == 0:
+                continue
+            lines.append(f"{name:<28}{stats['count']:>8}{stats['mean']:>10}{stats['p50']:>10}"
+                         f"{stats['p95']:>10}{stats['p99']:>10}{stats['max']:>10}")
+        return "\n".join(lines)
+
+    def dump(self, path=None):
+        """Writes the summary as JSON to `path`, or the text table to stderr."""
+        if path is None:
+            print(self.format_summary(), file=sys.stderr)
+            return
+        with open(path, "w") as f:
+            json.dump(self.summary(), f, indent=2)
+
+    def dump_at_exit(self, path=None):
+        atexit.register(self.dump, path)
+
+
+registry = MetricsRegistry()
+timed = registry.timed
@@ -0,0 +1,247 @@
+"""
+Contains array backed L2 order books maintained from the 20 level depth
+feed opened by socket_20_depth
+"""
+import json
+import math
+import time
+import threading
+import numpy as np
+
+DEPTH_LEVELS = 20
+
+# BbBuySellFlag of a depth level, as a character code or a letter
+BID_FLAGS = (66, "B", "b")
+ASK_FLAGS = (83, "S", "s")
+
+
+class Ladder:
+
+    def __init__(self, descending, depth=DEPTH_LEVELS):
+        """
+        One side of a book: the best `depth` price levels in preallocated
+        arrays, best first (highest bid / lowest ask).
+        """
+        self.descending = descending
+        self.depth = depth
+        self.price = np.zeros(depth)
+        self.qty = np.zeros(depth)
+        self.orders = np.zeros(depth, dtype=np.int64)
+        self.size = 0
+
+    def _key(self, prices):
+        # searchsorted needs ascending keys, bids are stored descending
+        return -prices if self.descending else prices
+
+    def replace(self, levels):
+        """Replaces the side with `levels`, (price, qty, orders) tuples in any order."""
+        levels = sorted((l for l in levels if l[1] > 0), key=lambda l: l[0], reverse=self.descending)[:self.depth]
+        self.size = len(levels)
+        for i, (price, qty, orders) in enumerate(levels):
+            self.price[i] = price
+            self.qty[i] = qty
+            self.orders[i] = orders
+
+    def update(self, price, qty, orders=0):
+        """
+        Sets the level at `price` to `qty`, 0 removes it. Levels beyond
+        depth fall off the end.
+        """
+        n = self.size
+        pos = int(np.searchsorted(self._key(self.price[:n]), -price if self.descending else price))
+        exists = pos < n and self.price[pos] == price
+        if qty <= 0:
+            if exists:
+                self.price[pos:n - 1] = self.price[pos + 1:n]
+                self.qty[pos:n - 1] = self.qty[pos + 1:n]
+                self.orders[pos:n - 1] = self.orders[pos + 1:n]
+                self.size -= 1
+            return
+        if exists:
+            self.qty[pos] = qty
+            self.orders[pos] = orders
+            return
+        if pos >= self.depth:
+            return
+        end = min(n, self.depth - 1)
+        self.price[pos + 1:end + 1] = self.price[pos:end]
+        self.qty[pos + 1:end + 1] = self.qty[pos:end]
+        self.orders[pos + 1:end + 1] = self.orders[pos:end]
+        self.price[pos] = price
+        self.qty[pos] = qty
+        self.orders[pos] = orders
+        self.size = end + 1
+
+    def apply(self, levels):
+        """
+        Brings the side to `levels`, (price, qty, orders) tuples in any
+        order, through update() of the levels that changed only. Returns
+        the number of levels updated.
+        """
+        n = self.size
+        current = dict(zip(self.price[:n].tolist(), zip(self.qty[:n].tolist(), self.orders[:n].tolist())))
+        wanted = {price: (qty, orders) for price, qty, orders in levels if qty > 0}
+        changed = 0
+        # Removals first, so levels entering the top are not pushed off the end
+        for price in current:
+            if price not in wanted:
+                self.update(price, 0)
+                changed += 1
+        for price, level in wanted.items():
+            if current.get(price) != level:
+                self.update(price, *level)
+                changed += 1
+        return changed
+
+    def levels(self):
+        n = self.size
+        return list(zip(self.price[:n].tolist(), self.qty[:n].tolist(), self.orders[:n].tolist()))
+
+
+class OrderBook:
+
+    def __init__(self, code, depth=DEPTH_LEVELS):
+        """
+        L2 book of one instrument. Spread, mid, microprice and imbalance
+        are recomputed once per applied message, reading them is O(1).
+        """
+        self.code = code
+        self.bids = Ladder(True, depth)
+        self.asks = Ladder(False, depth)
+        self.updates = 0
+        self.timestamp = None
+        # time.monotonic() of the last applied message
+        self.received = None
+        self._stats()
+
+    def _stats(self):
+        bids, asks = self.bids, self.asks
+        self.best_bid = float(bids.price[0]) if bids.size else math.nan
+        self.best_ask = float(asks.price[0]) if asks.size else math.nan
+        self.best_bid_qty = float(bids.qty[0]) if bids.size else 0.0
+        self.best_ask_qty = float(asks.qty[0]) if asks.size else 0.0
+        self.bid_depth = float(bids.qty[:bids.size].sum())
+        self.ask_depth = float(asks.qty[:asks.size].sum())
+
+        self.spread = self.best_ask - self.best_bid
+        self.mid = (self.best_ask + self.best_bid) / 2
+        top = self.best_bid_qty + self.best_ask_qty
+        # Weighted toward the side with less resting size, where price is likelier to move
+        self.microprice = ((self.best_bid * self.best_ask_qty + self.best_ask * self.best_bid_qty) / top
+                           if top else self.mid)
+        total = self.bid_depth + self.ask_depth
+        self.imbalance = (self.bid_depth - self.ask_depth) / total if total else 0.0
+
+    def replace(self, bids, asks, timestamp=None):
+        self.bids.replace(bids)
+        self.asks.replace(asks)
+        self._applied(timestamp)
+        self._stats()
+
+    def apply(self, bids, asks, timestamp=None):
+        """
+        Brings both sides to a depth snapshot level by level, the stats are
+        only recomputed when a level changed. Returns the levels updated.
+        """
+        changed = self.bids.apply(bids) + self.asks.apply(asks)
+        self._applied(timestamp)
+        if changed:
+            self._stats()
+        return changed
+
+    def _applied(self, timestamp):
+        self.timestamp = timestamp
+        self.received = time.monotonic()
+        self.updates += 1
+
+    def update(self, side, price, qty, orders=0, timestamp=None):
+        """Incremental change of one level, side being 'B' or 'S'."""
+        (self.bids if side == "B" else self.asks).update(price, qty, orders)
+        self._applied(timestamp)
+        self._stats()
+
+    def quote(self):
+        return {"bid": self.best_bid, "ask": self.best_ask,
+                "bid_qty": self.best_bid_qty, "ask_qty": self.best_ask_qty,
+                "spread": self.spread, "mid": self.mid,
+                "microprice": self.microprice, "imbalance": self.imbalance}
+
+
+def depth_instrument(code, exch="N", exch_type="D"):
+    """Instrument name of a scrip code on the depth feed, e.g. ND35001."""
+    return f"{exch}{exch_type}{int(code)}"
+
+
+def depth_payload(codes, exch="N", exch_type="D", method="subscribe"):
+    """socket_20_depth payload subscribing (or with method 'unsubscribe' dropping) `codes`."""
+    return {"method": method, "operation": "20depth",
+            "instruments": [depth_instrument(code, exch, exch_type) for code in codes]}
+
+
+def depth_levels(details):
+    bids, asks = [], []
+    for level in details:
+        level_ = (float(level["Price"]), float(level["Quantity"]), int(level.get("NumberOfOrders", 0)))
+        flag = level.get("BbBuySellFlag")
+        if flag in BID_FLAGS:
+            bids.append(level_)
+        elif flag in ASK_FLAGS:
+            asks.append(level_)
+    return bids, asks
+
+
+class OrderBooks:
+
+    def __init__(self, depth=DEPTH_LEVELS):
+        """
+        Order books of every instrument seen on the depth feed, keyed by
+        scrip code. Each depth message carries the full ladder of its
+        instrument, only the levels that changed since the previous one
+        are updated in place.
+        """
+        self.depth = depth
+        self.books = {}
+        self.lock = threading.Lock()
+
+    def book(self, code):
+        book = self.books.get(code)
+        if book is None:
+            book = self.books[code] = OrderBook(code, self.depth)
+        return book
+
+    def ingest(self, message):
+        """
+        Applies a depth feed message (JSON string or decoded), returns the
+        scrip codes it updated.
+        """
+        if isinstance(message, (str, bytes)):
+            message = json.loads(message)
+        if isinstance(message, dict):
+            message = [message]
+        updated = []
+        with self.lock:
+            for item in message:
+                code = item.get("Token", item.get("ScripCode"))
+                if code is None or "Details" not in item:
+                    continue
+                bids, asks = depth_levels(item["Details"])
+                self.book(int(code)).apply(bids, asks, item.get("TimeStamp"))
+                updated.append(int(code))
+        return updated
+
+    def quote(self, code, max_age=None):
+        """
+        Top of book of `code`, None before its first depth message or when
+        the last one is more than `max_age` seconds old.
+        """
+        with self.lock:
+            book = self.books.get(code)
+            if book is None or (max_age is not None and time.monotonic() - book.received > max_age):
+                return None
+            return book.quote()
+
+    def __contains__(self, code):
+        return code in self.books
+
+    def __getitem__(self, code):
+        return self.books[code]
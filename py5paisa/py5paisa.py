@@ -4,18 +4,35 @@ from .auth import EncryptionClient
 from .const import *
 from .order import Order, Bo_co_order,RequestType,Basket_order
 from .logging import log_response
+from .metrics import timed
+from .token_store import jwt_expiry, session_key, session_valid
+from .token_refresh import TokenRefresher, is_auth_failure, response_json
+from .transport import transport as make_transport
+import copy
 import json
-import websocket
+import threading
 from .urlconst  import *
 from enum import Enum
 
 class FivePaisaClient:
     
     
-    def __init__(self, email=None, passwd=None, dob=None,cred=None):
+    def __init__(self, email=None, passwd=None, dob=None,cred=None,base_url=None,token_store=None,transport=None):
         """
         Main constructor for client.
         Expects user's email, password and date of birth in YYYYMMDD format.
+        `base_url` sends every request and websocket to that host instead,
+        e.g. a local stand-in of the API for load tests.
+        With a `token_store` (see token_store.py) login reuses the stored
+        session while its JWT is valid and stores every new one.
+        A request refused for an expired token is sent once more after
+        refresh_session(), start_token_refresh() refreshes ahead of expiry.
+        Every request goes through `transport` (see transport.py), a
+        Transport or a dict of its arguments : pool size, keep-alive,
+        per-route deadlines, the retries of market data reads, their
+        opt-in hedging (`{"hedge": True}`) and the opt-in per-route rate
+        limit (`{"rate_limit": True}`), shared with the other processes
+        of the OS user sending with the same USER_KEY.
         """
         try:
             self.email = email
@@ -31,14 +48,20 @@ class FivePaisaClient:
             self.access_token= ""
             self.is_logged_in = False
             self.login_response_message = None
-            self.session = requests.Session()
+            self.transport = make_transport(transport, rate_limit_key=(cred or {}).get("USER_KEY"))
+            self.session = self.transport.session
+            self.base_url = base_url
+            self.token_store = token_store
+            self.token_refresher = None
+            self._token_lock = threading.Lock()
+            self._refresh_lock = threading.Lock()
+            self._encryption_client = None
             self.APP_SOURCE=cred["APP_SOURCE"]
             self.APP_NAME=cred["APP_NAME"]
             self.USER_ID=cred["USER_ID"]
             self.PASSWORD=cred["PASSWORD"]
             self.USER_KEY=cred["USER_KEY"]
             self.ENCRYPTION_KEY=cred["ENCRYPTION_KEY"]
-            self.create_payload()
             self.set_url()
             
         except Exception as e:
@@ -46,20 +69,16 @@ class FivePaisaClient:
     
 
     def login(self):
+        # Timed as a whole, session restore and payload encryption included
+        with timed("login"):
+            self._login()
+
+    def _login(self):
         try:
-            encryption_client = EncryptionClient(self.ENCRYPTION_KEY)
-            secret_email = encryption_client.encrypt(self.email)
-            secret_passwd = encryption_client.encrypt(self.passwd)
-            secret_dob = encryption_client.encrypt(self.dob)
-            self.login_payload["body"]["Email_id"] = secret_email
-            self.login_payload["body"]["Password"] = secret_passwd
-            self.login_payload["body"]["My2PIN"] = secret_dob
-            self.login_payload["head"]["requestCode"] = "5PLoginV4"
-            self.login_payload["head"]["appName"] = self.APP_NAME
-            self.login_payload["head"]["key"] = self.USER_KEY
-            self.login_payload["head"]["userId"] = self.USER_ID
-            self.login_payload["head"]["password"] = self.PASSWORD  
-            res = self._login_request(self.LOGIN_ROUTE)
+            if self._restore_session():
+                return
+            login_payload = self._build_login_payload()
+            res = self._login_request(self.LOGIN_ROUTE, login_payload)
             
             message = res["body"]["Message"]
             if message == "":
@@ -70,6 +89,122 @@ class FivePaisaClient:
               self.login_response_message = message
               log_response(message)
             self._set_client_code(res["body"]["ClientCode"])
+            if self.is_logged_in:
+                self._save_session()
+        except Exception as e:
+            log_response(e)
+
+    def _build_login_payload(self):
+        if self._encryption_client is None:
+            self._encryption_client = EncryptionClient(self.ENCRYPTION_KEY)
+        encryption_client = self._encryption_client
+        login_payload = copy.deepcopy(LOGIN_PAYLOAD)
+        login_payload["body"]["Email_id"] = encryption_client.encrypt(self.email)
+        login_payload["body"]["Password"] = encryption_client.encrypt(self.passwd)
+        login_payload["body"]["My2PIN"] = encryption_client.encrypt(self.dob)
+        login_payload["head"]["requestCode"] = "5PLoginV4"
+        login_payload["head"]["appName"] = self.APP_NAME
+        login_payload["head"]["key"] = self.USER_KEY
+        login_payload["head"]["userId"] = self.USER_ID
+        login_payload["head"]["password"] = self.PASSWORD
+        return login_payload
+
+    def refresh_session(self, stale_token=None):
+        """
+        Logs in again and swaps the new tokens in at once, requests keep
+        using the current ones meanwhile. Skipped when the token is no
+        longer `stale_token`, another thread refreshed it already.
+        Returns True when the client holds fresh tokens.
+        """
+        with self._refresh_lock:
+            if stale_token is not None and self.Jwt_token != stale_token:
+                return True
+            if not (self.email and self.passwd and self.dob):
+                return False
+            try:
+                with timed("login.refresh"):
+                    res = self.transport.post(self.LOGIN_ROUTE, route="login", json=self._build_login_payload(),
+                                              headers=dict(HEADERS)).json()
+                body = res["body"]
+                if body.get("Message") or not body.get("JWTToken"):
+                    log_response(body.get("Message") or "Session refresh refused")
+                    return False
+                self._set_tokens(body.get("ClientCode") or self.client_code, body["JWTToken"], body["JWTToken"])
+                self._save_session()
+                log_response("Session refreshed")
+                return True
+            except Exception as e:
+                log_response(e)
+                return False
+
+    def _set_tokens(self, client_code, jwt_token, access_token):
+        with self._token_lock:
+            self.client_code = client_code
+            self.Jwt_token = jwt_token
+            self.access_token = access_token
+
+    def tokens(self):
+        """(client_code, Jwt_token, access_token), read together."""
+        with self._token_lock:
+            return self.client_code, self.Jwt_token, self.access_token
+
+    def start_token_refresh(self, lead=600):
+        """Refreshes the session `lead` seconds ahead of JWT expiry from a background thread."""
+        if self.token_refresher is None:
+            self.token_refresher = TokenRefresher(self, lead).start()
+        return self.token_refresher
+
+    def stop_token_refresh(self):
+        if self.token_refresher is not None:
+            self.token_refresher.stop()
+            self.token_refresher = None
+
+    def _post_authorized(self, metric, build, route=None):
+        """
+        Posts the (url, payload, headers) returned by `build` on `route` of
+        the transport and returns the decoded response. A request refused
+        for its token is built and sent once more after a session refresh.
+        """
+        stale_token = self.Jwt_token
+        url, payload, headers = build()
+        with timed(metric):
+            res = self.transport.post(url, route=route, json=payload, headers=headers)
+            response = response_json(res)
+            if is_auth_failure(res.status_code, response) and self.refresh_session(stale_token):
+                url, payload, headers = build()
+                res = self.transport.post(url, route=route, json=payload, headers=headers)
+                response = response_json(res)
+        return response
+
+    def _restore_session(self):
+        """Takes over the stored session if it is still valid, True when it did."""
+        try:
+            if self.token_store is None:
+                return False
+            session = self.token_store.load(session_key(self.USER_KEY, self.email, self.base_url))
+            if not session_valid(session):
+                return False
+            self._set_tokens(session["client_code"], session["Jwt_token"],
+                             session.get("access_token") or session["Jwt_token"])
+            self.is_logged_in = True
+            self.login_response_message = None
+            log_response("Logged in from cached session")
+            return True
+        except Exception as e:
+            log_response(e)
+            return False
+
+    def _save_session(self):
+        # Tokens without a readable expiry are never cached
+        try:
+            expires_at = jwt_expiry(self.Jwt_token)
+            if self.token_store is None or expires_at is None:
+                return
+            self.token_store.save(session_key(self.USER_KEY, self.email, self.base_url), {
+                "client_code": self.client_code,
+                "Jwt_token": self.Jwt_token,
+                "access_token": self.access_token,
+                "expires_at": expires_at})
         except Exception as e:
             log_response(e)
 
@@ -97,10 +232,10 @@ class FivePaisaClient:
         except Exception as e:
             log_response(e)
 
-    def _login_request(self, route):
+    def _login_request(self, route, login_payload):
         try:
             requests.packages.urllib3.disable_warnings(InsecureRequestWarning)
-            res = self.session.post(route, json=self.login_payload, headers=HEADERS)
+            res = self.transport.post(route, route="login", json=login_payload, headers=dict(HEADERS))
             resp=res.json()
             self.Jwt_token=resp["body"]["JWTToken"]
             self.access_token=self.Jwt_token
@@ -116,129 +251,34 @@ class FivePaisaClient:
 
     def _user_info_request(self, data_type):
         try:
-            payload = GENERIC_PAYLOAD
-            payload["body"]["ClientCode"] = self.client_code
-            payload["head"]["key"] = self.USER_KEY
-            HEADERS["Authorization"] = f'Bearer {self.access_token}'
-            return_type = ""
-            if data_type == "MARGIN":
-                url = self.MARGIN_ROUTE
-                return_type = "EquityMargin"
-            elif data_type == "ORDER_BOOK":
-                url = self.ORDER_BOOK_ROUTE
-                return_type = "OrderBookDetail"
-            elif data_type == "HOLDINGS":
-                url = self.HOLDINGS_ROUTE
-                return_type = "Data"
-            elif data_type == "POSITIONS":
-                url = self.POSITIONS_ROUTE
-                return_type = "NetPositionDetail"
-            elif data_type == "IB":
-                url = self.IDEAS_ROUTE
-                return_type = "Data"
-            elif data_type == "IT":
-                url = self.IDEAS_ROUTE
-                return_type = "Data"
-            else:
+            if data_type not in USER_INFO_ROUTES:
                 raise Exception("Invalid data type requested")
-            response = self.session.post(url, json=payload, headers=HEADERS).json()
+            return_type = USER_INFO_ROUTES[data_type][1]
+            response = self._post_authorized("user_info." + data_type,
+                                             lambda: self._prepare_user_info_request(data_type))
 
             data = response["body"][return_type]
             return data
         except Exception as e:
             log_response(e)
 
-    def order_request(self, req_type) -> None:
-        try:
-            self.payload["body"]["ClientCode"] = self.client_code
-            self.payload["head"]["key"] = self.USER_KEY
-            HEADERS["Authorization"] = f'Bearer {self.access_token}'
-            if req_type == "OP":
-                url = self.ORDER_PLACEMENT_ROUTE
-                #self.payload["head"]["requestCode"] = "5PPlaceOrdReq"
-                if self.access_token != "" :
-                    HEADERS["Authorization"] = f'Bearer {self.Jwt_token}'
-            elif req_type == "OC":
-                url = self.ORDER_CANCEL_ROUTE
-                #self.payload["head"]["requestCode"] = "5PCancelOrdReq"
-                if self.access_token != "" :
-                    HEADERS["Authorization"] = f'Bearer {self.Jwt_token}'
-            elif req_type == "OM":
-                url = self.ORDER_MODIFY_ROUTE
-                #self.payload["head"]["requestCode"] = "5PModifyOrdReq"
-                if self.access_token != "" :
-                    HEADERS["Authorization"] = f'Bearer {self.Jwt_token}'
-            elif req_type == "OS":
-                url = self.ORDER_STATUS_ROUTE
-                self.payload["head"]["requestCode"] = "5POrdStatus"
-            elif req_type == "TI":
-                url = self.TRADE_INFO_ROUTE
-                self.payload["head"]["requestCode"] = "5PTrdInfo"
-            elif req_type == "TH":
-                url = self.TRADE_HISTORY_ROUTE
-            elif req_type == "MF":
-                url = self.MARKET_FEED_ROUTE
-                self.payload["head"]["requestCode"] = "5PMF"
-                self.payload["body"]["COUNT"]=self.client_code
-            elif req_type == "BM":
-                url = self.BRACKET_MOD_ROUTE
-                #self.payload["head"]["requestCode"] = "5PSModMOOrd"
-                # self.payload["body"]["legtype"]=0
-                # self.payload["body"]["TMOPartnerOrderID"]=0
-            elif req_type == "CM":
-                url = self.COVER_MOD_ROUTE
-            elif req_type == "CO":
-                url = self.COVER_ORDER_ROUTE
-            elif req_type == "MS":
-                url = self.MARKET_STATUS_ROUTE
-            elif req_type == "BO":
-                url = self.BRACKET_ORDER_ROUTE
-           
-                # self.payload["head"]["requestCode"] = "5PSMOOrd"
-                # self.payload["body"]["OrderRequesterCode"]=self.client_code
-            elif req_type == "BC":
-                url = self.BRACKET_CANCEL_ROUTE
-            elif req_type == "CC":
-                url = self.COVER_CANCEL_ROUTE
-            elif req_type == "MD":
-                url = self.MARKET_DEPTH_ROUTE
-                #self.payload["head"]["requestCode"] = "5PMD"
-            elif req_type == "MDS":
-                url = self.MARKET_DEPTH_BY_SYMBOL_ROUTE
-                #self.payload["head"]["requestCode"] = "5PMD"
-            elif req_type == "TB":
-                url = self.TRADEBOOK_ROUTE
-                #self.payload["head"]["requestCode"] = "5PTrdBkV1"
-            elif req_type == "GB":
-                url = self.GET_BASKET_ROUTE
-            elif req_type == "CB":
-                url = self.CREATE_BASKET_ROUTE
-            elif req_type == "RB":
-                url = self.RENAME_BASKET_ROUTE
-            elif req_type == "DB":
-                url = self.DELETE_BASKET_ROUTE
-            elif req_type == "CL":
-                url = self.CLONE_BASKET_ROUTE
-            elif req_type == "EB":
-                url = self.EXECUTE_BASKET_ROUTE
-            elif req_type == "GO":
-                url = self.GET_ORDER_IN_BASKET_ROUTE
-            elif req_type == "AB":
-                url = self.ADD_BASKET_ORDER_ROUTE
-            elif req_type == "GE":
-                url = self.OPTION_CHAIN_ROUTE
-            elif req_type == "GOC":
-                url = self.GET_OPTION_CHAIN_ROUTE
-            elif req_type == "CBO":
-                url = self.CANCEL_BULK_ORDER_ROUTE
-            elif req_type == "SO":
-                url = self.SQUAREOFF_ROUTE
-            elif req_type == "PO":
-                url = self.POSITION_CONVERSION_ROUTE
-            else:
-                raise Exception("Invalid request type!")
-            res = self.session.post(url, json=self.payload,
-                                    headers=HEADERS).json()
+    def _prepare_user_info_request(self, data_type):
+        route = USER_INFO_ROUTES[data_type][0]
+        client_code, _, access_token = self.tokens()
+        payload = {"head": {"key": self.USER_KEY},
+                   "body": {"ClientCode": client_code}}
+        headers = dict(HEADERS)
+        headers["Authorization"] = f'Bearer {access_token}'
+        return getattr(self, route), payload, headers
+
+    def order_request(self, req_type, body=None):
+        """
+        Sends a request of `req_type` with `body` merged into a freshly built
+        payload, e.g. the one staged by set_payload and friends.
+        """
+        try:
+            res = self._post_authorized("order_request." + req_type,
+                                        lambda: self._prepare_request(req_type, body), req_type)
           
             if req_type == "MS":
                 log_response(res["head"]["statusDescription"])
@@ -249,34 +289,49 @@ class FivePaisaClient:
         except Exception as e:
             log_response(e)
 
+    def _prepare_request(self, req_type, body=None):
+        """
+        Builds a fresh url, payload and headers for an order_request type
+        without touching any shared payload or header.
+        """
+        if req_type not in REQUEST_ROUTES:
+            raise Exception("Invalid request type!")
+        url = getattr(self, REQUEST_ROUTES[req_type])
+        client_code, jwt_token, access_token = self.tokens()
+        payload = {"head": {"key": self.USER_KEY},
+                   "body": dict(body) if body else {}}
+        payload["body"]["ClientCode"] = client_code
+        if req_type in REQUEST_CODES:
+            payload["head"]["requestCode"] = REQUEST_CODES[req_type]
+        if req_type == "MF":
+            payload["body"]["COUNT"] = client_code
+        token = access_token
+        if req_type in JWT_AUTH_REQUESTS and access_token != "":
+            token = jwt_token
+        headers = dict(HEADERS)
+        headers["Authorization"] = f'Bearer {token}'
+        return url, payload, headers
+
     def fetch_order_status(self, req_list:list) :
         try:
-            self.payload["body"]["OrdStatusReqList"] = req_list
-            return self.order_request("OS")
+            return self.order_request("OS", {"OrdStatusReqList": req_list})
         except Exception as e:
             log_response(e)
 
     def fetch_trade_info(self, req_list:list) :
         try:
-            self.payload["body"]["TradeInformationList"] = req_list
-            return self.order_request("TI")
+            return self.order_request("TI", {"TradeInformationList": req_list})
         except Exception as e:
             log_response(e)
 
     def fetch_market_depth(self, req_list:list):
         try:
-            self.payload["body"]["Count"]="1"
-            self.payload["body"]["Data"]=req_list
-        
-            return self.order_request("MD")
+            return self.order_request("MD", {"Count": "1", "Data": req_list})
         except Exception as e:
             log_response(e)
     def fetch_market_depth_by_symbol(self, req_list:list):
         try:
-            self.payload["body"]["Count"]="1"
-            self.payload["body"]["Data"]=req_list
-        
-            return self.order_request("MDS")
+            return self.order_request("MDS", {"Count": "1", "Data": req_list})
         except Exception as e:
             log_response(e)
     
@@ -285,106 +340,126 @@ class FivePaisaClient:
             market feed api
         """
         try:
-            self.payload["body"]["MarketFeedData"] = req_list
-            self.payload["body"]["ClientLoginType"] = 0
-            self.payload["body"]["LastRequestTime"] = f"/Date({TODAY_TIMESTAMP})/"
-            self.payload["body"]["RefreshRate"] = "H"
-            return self.order_request("MF")
+            return self.order_request("MF", {
+                "MarketFeedData": req_list,
+                "ClientLoginType": 0,
+                "LastRequestTime": f"/Date({TODAY_TIMESTAMP})/",
+                "RefreshRate": "H"})
         except Exception as e:
             log_response(e)
 
-    def set_payload(self, order) -> None:
+    def set_payload(self, order, body=None) -> dict:
+        """
+        Returns `body`, a fresh dict when None, with the fields of `order`
+        staged on it, for order_request or as the `body` of the order
+        methods. The client keeps no staged state.
+        """
+        body = {} if body is None else body
         try:
             for key, value in order.items():
-               self.payload["body"][key] = value
+               body[key] = value
         except Exception as e:
             log_response(e)
+        return body
         
         
-    def set_payload_bo(self,boco)-> None:
+    def set_payload_bo(self,boco,body=None)-> dict:
         """
-            this is for bo-co order placement
+            this is for bo-co order placement, stages like set_payload
         """
-        try:
-            self.payload["body"]["RequestType"] = boco.RequestType
-            self.payload["body"]["BuySell"] = boco.BuySell
-            self.payload["body"]["Qty"] = boco.Qty
-            self.payload["body"]["Exch"] = boco.Exch
-            self.payload["body"]["ExchType"] = boco.ExchType
-            self.payload["body"]["DisQty"] = boco.DisQty
-            self.payload["body"]["AtMarket"] = boco.AtMarket
-            self.payload["body"]["ExchOrderId"] = boco.ExchOrderId
-            self.payload["body"]["LimitPriceForSL"] = boco.LimitPriceForSL
-            self.payload["body"]["LimitPriceInitialOrder"] = boco.LimitPriceInitialOrder
-            self.payload["body"]["TriggerPriceInitialOrder"] = boco.TriggerPriceInitialOrder
-            self.payload["body"]["LimitPriceProfitOrder"] = boco.LimitPriceProfitOrder
-            self.payload["body"]["TriggerPriceForSL"] = boco.TriggerPriceForSL
-            self.payload["body"]["TrailingSL"] = boco.TrailingSL
-            self.payload["body"]["StopLoss"] = boco.StopLoss
-            self.payload["body"]["ScripCode"] = boco.scrip_code
-            self.payload["body"]["OrderFor"] = boco.order_for
-            self.payload["body"]["UniqueOrderIDNormal"] = boco.UniqueOrderIDNormal
-            self.payload["body"]["UniqueOrderIDSL"] = boco.UniqueOrderIDSL
-            self.payload["body"]["UniqueOrderIDLimit"] = boco.UniqueOrderIDLimit
-            self.payload["body"]["LocalOrderIDNormal"] = boco.LocalOrderIDNormal
-            self.payload["body"]["LocalOrderIDSL"] = boco.LocalOrderIDSL
-            self.payload["body"]["LocalOrderIDLimit"] = boco.LocalOrderIDLimit
-            self.payload["body"]["PublicIP"] = boco.public_ip
-            self.payload["body"]["AppSource"] = self.APP_SOURCE
-            self.payload["body"]["TradedQty"] = boco.traded_qty
-        except Exception as e:
-            log_response(e)
-
-    def set_basket_payload(self,basket_order:Basket_order,basket_list:list)-> None:
+        body = {} if body is None else body
+        try:
+            body["RequestType"] = boco.RequestType
+            body["BuySell"] = boco.BuySell
+            body["Qty"] = boco.Qty
+            body["Exch"] = boco.Exch
+            body["ExchType"] = boco.ExchType
+            body["DisQty"] = boco.DisQty
+            body["AtMarket"] = boco.AtMarket
+            body["ExchOrderId"] = boco.ExchOrderId
+            body["LimitPriceForSL"] = boco.LimitPriceForSL
+            body["LimitPriceInitialOrder"] = boco.LimitPriceInitialOrder
+            body["TriggerPriceInitialOrder"] = boco.TriggerPriceInitialOrder
+            body["LimitPriceProfitOrder"] = boco.LimitPriceProfitOrder
+            body["TriggerPriceForSL"] = boco.TriggerPriceForSL
+            body["TrailingSL"] = boco.TrailingSL
+            body["StopLoss"] = boco.StopLoss
+            body["ScripCode"] = boco.scrip_code
+            body["OrderFor"] = boco.order_for
+            body["UniqueOrderIDNormal"] = boco.UniqueOrderIDNormal
+            body["UniqueOrderIDSL"] = boco.UniqueOrderIDSL
+            body["UniqueOrderIDLimit"] = boco.UniqueOrderIDLimit
+            body["LocalOrderIDNormal"] = boco.LocalOrderIDNormal
+            body["LocalOrderIDSL"] = boco.LocalOrderIDSL
+            body["LocalOrderIDLimit"] = boco.LocalOrderIDLimit
+            body["PublicIP"] = boco.public_ip
+            body["AppSource"] = self.APP_SOURCE
+            body["TradedQty"] = boco.traded_qty
+        except Exception as e:
+            log_response(e)
+        return body
+
+    def _basket_body(self,basket_order:Basket_order,basket_list:list)-> dict:
+        return {
+            "Exchange": basket_order.Exchange,
+            "ExchangeType": basket_order.ExchangeType,
+            "Price": basket_order.Price,
+            "OrderType": basket_order.OrderType,
+            "Qty": basket_order.Qty,
+            "ScripCode": basket_order.ScripCode,
+            "AtMarket": basket_order.AtMarket,
+            "StopLossPrice": basket_order.StopLossPrice,
+            "IsStopLossOrder": basket_order.IsStopLossOrder,
+            "IOCOrder": basket_order.IOCOrder,
+            "DelvIntra": basket_order.DelvIntra,
+            "AppSource": self.APP_SOURCE,
+            "IsIntraday": basket_order.IsIntraday,
+            "ValidTillDate": f"/Date({NEXT_DAY_TIMESTAMP})/",
+            "AHPlaced": basket_order.AHPlaced,
+            "PublicIP": basket_order.PublicIP,
+            "DisQty": basket_order.DisQty,
+            "iOrderValidity": basket_order.iOrderValidity,
+            "BasketIDs": basket_list}
+
+    def set_basket_payload(self,basket_order:Basket_order,basket_list:list,body=None)-> dict:
         """
-            this is for Basket order placement
+            this is for Basket order placement, stages like set_payload
         """
+        body = {} if body is None else body
         try:
-            self.payload["body"]["Exchange"] = basket_order.Exchange
-            self.payload["body"]["ExchangeType"] = basket_order.ExchangeType
-            self.payload["body"]["Price"] = basket_order.Price
-            self.payload["body"]["OrderType"] = basket_order.OrderType
-            self.payload["body"]["Qty"] = basket_order.Qty
-            self.payload["body"]["ScripCode"] = basket_order.ScripCode
-            self.payload["body"]["AtMarket"] = basket_order.AtMarket
-            self.payload["body"]["StopLossPrice"] = basket_order.StopLossPrice
-            self.payload["body"]["IsStopLossOrder"] = basket_order.IsStopLossOrder
-            self.payload["body"]["IOCOrder"] = basket_order.IOCOrder
-            self.payload["body"]["DelvIntra"] = basket_order.DelvIntra
-            self.payload["body"]["AppSource"] = self.APP_SOURCE
-            self.payload["body"]["IsIntraday"] = basket_order.IsIntraday
-            self.payload["body"]["ValidTillDate"] =f"/Date({NEXT_DAY_TIMESTAMP})/"
-            self.payload["body"]["AHPlaced"] = basket_order.AHPlaced
-            self.payload["body"]["PublicIP"] = basket_order.PublicIP
-            self.payload["body"]["DisQty"] = basket_order.DisQty
-            self.payload["body"]["iOrderValidity"] = basket_order.iOrderValidity
-            self.payload["body"]["BasketIDs"] = basket_list
-        except Exception as e:
-            log_response(e)
-
-
-    def place_order(self, **order):
+            body.update(self._basket_body(basket_order,basket_list))
+        except Exception as e:
+            log_response(e)
+        return body
+
+
+    def _order_body(self, body, order):
+        # Keyword fields win over the ones staged in `body` by set_payload and friends
+        return self.set_payload(order, dict(body) if body else None)
+
+    def place_order(self, body=None, **order):
         """
-        Places a fresh order
+        Places a fresh order. The order methods send `order` on top of a
+        `body` staged by set_payload, set_payload_bo or set_basket_payload.
         """
         try:
+            order = self._order_body(body, order)
             if(order['Price'] >= 0 and order["ScripCode"] and order['Exchange'] and order['OrderType'] and order['Qty'] and order['ExchangeType']):
-                self.set_payload(order)
-                return self.order_request("OP")
+                return self.order_request("OP", order)
             else:
                 return log_response("please enter valid input")
             
         except Exception as e:
             log_response(e)
 
-    def modify_order(self, **order):
+    def modify_order(self, body=None, **order):
         """
         Modifies an existing order
         """
         try:
+            order = self._order_body(body, order)
             if(order['Price'] and order['ExchOrderID']):
-                self.set_payload(order)
-                return self.order_request("OM")
+                return self.order_request("OM", order)
         except Exception as e:
             log_response(e)
 
@@ -393,58 +468,57 @@ class FivePaisaClient:
         Cancels an existing order
         """
         try:
-            self.payload["body"]["ExchOrderID"]=exch_order_id
-            return self.order_request("OC")
+            return self.order_request("OC", {"ExchOrderID": exch_order_id})
         except Exception as e:
             log_response(e)
 
-    def bo_order(self,**order):
+    def bo_order(self,body=None,**order):
         try:
+            order = self._order_body(body, order)
             if( order["ScripCode"] and order['Exchange'] and order['OrderType'] and order['Qty'] and order['ExchangeType']):
-                self.set_payload(order)
-                return self.order_request("BO")
+                return self.order_request("BO", order)
         except Exception as e:
             log_response(e)
 
-    def modify_bo_order(self,**order):
+    def modify_bo_order(self,body=None,**order):
         try:
+            order = self._order_body(body, order)
             if(order['ExchangeOrderID']):
-                self.set_payload(order)
                 # self.payload["body"]["TriggerPriceForSL"] = order.stoploss_price
-                return self.order_request("BM")
+                return self.order_request("BM", order)
         except Exception as e:
             log_response(e)
     
-    def cancel_bo_order(self,**order):
+    def cancel_bo_order(self,body=None,**order):
         try:
+            order = self._order_body(body, order)
             if(order['ExchangeOrderID']):
-                self.set_payload(order)
                 # self.payload["body"]["TriggerPriceForSL"] = order.stoploss_price
-                return self.order_request("BC")
+                return self.order_request("BC", order)
         except Exception as e:
             log_response(e)
     
-    def cover_order(self,**order):
+    def cover_order(self,body=None,**order):
         try:
-            self.set_payload(order)
+            order = self._order_body(body, order)
            # self.payload["body"]["TriggerPriceForSL"] = order.stoploss_price
-            return self.order_request("CO")
+            return self.order_request("CO", order)
         except Exception as e:
             log_response(e)
     
-    def modify_cover_order(self,**order):
+    def modify_cover_order(self,body=None,**order):
         try:
-            self.set_payload(order)
+            order = self._order_body(body, order)
            # self.payload["body"]["TriggerPriceForSL"] = order.stoploss_price
-            return self.order_request("CM")
+            return self.order_request("CM", order)
         except Exception as e:
             log_response(e)
     
-    def cancel_cover_order(self,**order):
+    def cancel_cover_order(self,body=None,**order):
         try:
-            self.set_payload(order)
+            order = self._order_body(body, order)
            # self.payload["body"]["TriggerPriceForSL"] = order.stoploss_price
-            return self.order_request("CC")
+            return self.order_request("CC", order)
         except Exception as e:
             log_response(e)
     def Request_Feed(self,Method:str,Operation:str,req_list:list):
@@ -452,17 +526,31 @@ class FivePaisaClient:
             Method_dict={"mf":"MarketFeedV3","md":"MarketDepthService","oi":"GetScripInfoForFuture","i":"Indices"}
             Operation_dict={"s":"Subscribe","u":"Unsubscribe"}
         
-            self.ws_payload['Method']=Method_dict[Method]
-            self.ws_payload['Operation']=Operation_dict[Operation]
-            self.ws_payload['ClientCode']=self.client_code
-            self.ws_payload['MarketFeedData']=req_list
-            return self.ws_payload
+            ws_payload=dict(WS_PAYLOAD)
+            ws_payload['Method']=Method_dict[Method]
+            ws_payload['Operation']=Operation_dict[Operation]
+            ws_payload['ClientCode']=self.client_code
+            ws_payload['MarketFeedData']=req_list
+            return ws_payload
         except Exception as e:
             log_response(e)
     
+    def feed_url(self):
+        """Market feed websocket url for the current session token."""
+        return rebase_url(f'wss://openfeed.5paisa.com/Feeds/api/chat?Value1={self.Jwt_token}|{self.client_code}',
+                          self.base_url)
+
+    def depth_feed_url(self):
+        """20 level depth websocket url, fetches a fresh depth access token."""
+        self.token=self.market_depth_token()
+        self.subscription_key=SUBSCRIPTION_KEY
+        return rebase_url(f'wss://openapi.5paisa.com/ws?subscription-key={self.subscription_key}&access_token={self.token}',
+                          self.base_url)
+
     def connect(self,wspayload:dict):
         try:
-            self.web_url=f'wss://openfeed.5paisa.com/Feeds/api/chat?Value1={self.Jwt_token}|{self.client_code}'
+            import websocket
+            self.web_url=self.feed_url()
             
             def on_open(ws):
                 log_response("Streaming Started")
@@ -505,12 +593,13 @@ class FivePaisaClient:
         
     def Login_check(self):
         try:
-            self.login_check_payload["head"]["key"]=self.USER_KEY
-            self.login_check_payload["head"]["appName"]=self.APP_NAME
-            self.login_check_payload["head"]["LoginId"]=self.client_code
-            self.login_check_payload["body"]["RegistrationID"]=self.Jwt_token
+            login_check_payload=copy.deepcopy(LOGIN_CHECK_PAYLOAD)
+            login_check_payload["head"]["key"]=self.USER_KEY
+            login_check_payload["head"]["appName"]=self.APP_NAME
+            login_check_payload["head"]["LoginId"]=self.client_code
+            login_check_payload["body"]["RegistrationID"]=self.Jwt_token
             url=self.LOGIN_CHECK_ROUTE
-            resl=requests.post(url, json=self.login_check_payload,headers=HEADERS)
+            resl=self.transport.post(url, route="login", json=login_check_payload,headers=dict(HEADERS))
             self.Aspx_auth = resl.cookies.get('.ASPXAUTH',domain='openfeed.5paisa.com')
             
             return f'.ASPXAUTH={self.Aspx_auth}'
@@ -519,10 +608,11 @@ class FivePaisaClient:
 
     def jwt_validate(self):
         try:
-            self.jwt_payload['ClientCode']=self.client_code
-            self.jwt_payload['JwtCode']=self.Jwt_token
+            jwt_payload=dict(JWT_PAYLOAD)
+            jwt_payload['ClientCode']=self.client_code
+            jwt_payload['JwtCode']=self.Jwt_token
             url=self.JWT_VALIDATION_ROUTE
-            response = self.session.post(url, json=self.jwt_payload, headers=HEADERS).json()
+            response = self.transport.post(url, json=jwt_payload, headers=dict(HEADERS)).json()
             
             return response['body']['Message']
         except Exception as e:
@@ -530,14 +620,14 @@ class FivePaisaClient:
 
     def historical_data(self,Exch:str,ExchangeSegment:str,ScripCode: int,time: str,From:str,To: str):
         try:
-            self.jwt_headers['x-clientcode']=self.client_code
-            self.jwt_headers['x-auth-token']=self.Jwt_token
+            jwt_headers=self._jwt_headers()
             url=f'{self.HISTORICAL_DATA_ROUTE}{Exch}/{ExchangeSegment}/{ScripCode}/{time}?from={From}&end={To}'
             timeList=['1m','5m','10m','15m','30m','60m','1d']
             if time not in timeList:
                 return 'Invalid Time Frame. it should be within [1m,5m,10m,15m,30m,60m,1d].'
             else:
-                response = self.session.get(url, headers=self.jwt_headers).json()
+                import pandas as pd
+                response = self.transport.get(url, headers=jwt_headers).json()
                 candleList=response['data']['candles']
                 df=pd.DataFrame(candleList)
                 df.columns=['Datetime','Open','High','Low','Close','Volume']
@@ -550,6 +640,7 @@ class FivePaisaClient:
         try:
             res=self._user_info_request("IB")
             if len(res) > 0:
+                import pandas as pd
                 message = res[0]["payload"]
                 res1 = json.loads(message)
                 with pd.option_context('display.max_columns',None,'display.max_rows',None):
@@ -565,6 +656,7 @@ class FivePaisaClient:
         try:
             res=self._user_info_request("IT")
             if len(res) > 0:
+                import pandas as pd
                 message = res[1]["payload"]
                 res1 = json.loads(message)
                 with pd.option_context('display.max_columns',None,'display.max_rows',None):
@@ -579,7 +671,7 @@ class FivePaisaClient:
 
     def get_tradebook(self):
         try:
-            return self.order_request("TB")
+            return self.order_request("TB", {})
         except Exception as e:
             log_response(e)
 
@@ -626,31 +718,29 @@ class FivePaisaClient:
             self.MARKET_DEPTH_ROUTE_20=MARKET_DEPTH_ROUTE_20
             self.POSITION_CONVERSION_ROUTE=POSITION_CONVERSION_ROUTE
             self.MARKET_DEPTH_BY_SYMBOL_ROUTE=MARKET_DEPTH_BY_SYMBOL_ROUTE
+            if self.base_url:
+                for name in [name for name in vars(self) if "_ROUTE" in name]:
+                    setattr(self, name, rebase_url(getattr(self, name), self.base_url))
         except Exception as e:
             log_response(e)
     
 
-    def create_payload(self):
-        try:
-            self.payload = GENERIC_PAYLOAD
-            self.login_payload = LOGIN_PAYLOAD
-            self.login_check_payload= LOGIN_CHECK_PAYLOAD
-            self.ws_payload=WS_PAYLOAD
-            self.jwt_headers=JWT_HEADERS
-            self.jwt_payload=JWT_PAYLOAD
-            self.SOCKET_DEPTH_PAYLOAD=SOCKET_DEPTH_PAYLOAD
-        except Exception as e:
-            log_response(e)
+    def _jwt_headers(self):
+        jwt_headers=dict(JWT_HEADERS)
+        jwt_headers['x-clientcode']=self.client_code
+        jwt_headers['x-auth-token']=self.Jwt_token
+        return jwt_headers
         
     def get_access_token(self,request_token):
         try:
-            self.payload["head"]["Key"] = self.USER_KEY
-            self.payload["body"]["RequestToken"] = request_token
-            self.payload["body"]["EncryKey"] = self.ENCRYPTION_KEY
-            self.payload["body"]["UserId"] = self.USER_ID
-            url=ACCESS_TOKEN_ROUTE
+            payload = copy.deepcopy(GENERIC_PAYLOAD)
+            payload["head"]["Key"] = self.USER_KEY
+            payload["body"]["RequestToken"] = request_token
+            payload["body"]["EncryKey"] = self.ENCRYPTION_KEY
+            payload["body"]["UserId"] = self.USER_ID
+            url=self.ACCESS_TOKEN_ROUTE
 
-            res = self.session.post(url, json=self.payload).json()
+            res = self.transport.post(url, json=payload).json()
             message = res["body"]["Message"]
          
             if message == "Success":
@@ -659,6 +749,7 @@ class FivePaisaClient:
                 self._set_client_code(res["body"]["ClientCode"])
                 log_response("Logged in!!")
                 self.is_logged_in = True
+                self._save_session()
                 return self.access_token
             else:
                 self.login_response_message = message
@@ -668,16 +759,15 @@ class FivePaisaClient:
 
     def get_market_status(self):
         try:
-            market_status_response=self.order_request("MS")
+            market_status_response=self.order_request("MS", {})
             return market_status_response["Data"]
         except Exception as e:
             log_response(e)
 
     def get_trade_history(self,exchange_id):
         try:
-            self.payload["body"]["ExchOrderID"] = exchange_id
             if self.client_code != None:
-                return self.order_request("TH")
+                return self.order_request("TH", {"ExchOrderID": exchange_id})
         except Exception as e:
             log_response(e)
 
@@ -685,125 +775,110 @@ class FivePaisaClient:
         try:
             if self.client_code != None:
                 #self.payload["body"]["ClientCode"] = self.client_code
-                return self.order_request("GB")
+                return self.order_request("GB", {})
         except Exception as e:
             log_response(e)
 
     def create_basket(self,basket_name:str):
         try:
             if self.client_code != None:
-                self.payload["body"]["BasketName"] = basket_name
-                return self.order_request("CB")
+                return self.order_request("CB", {"BasketName": basket_name})
         except Exception as e:
             log_response(e)
 
     def rename_basket(self,basket_name:str,basket_id:int):
         try:
             if self.client_code != None:
-                self.payload["body"]["NewBasketName"] = basket_name
-                self.payload["body"]["BasketID"] = basket_id
-                return self.order_request("RB")
+                return self.order_request("RB", {"NewBasketName": basket_name, "BasketID": basket_id})
         except Exception as e:
             log_response(e)
 
     def delete_basket(self,basket_id:list):
         try:
             if self.client_code != None:
-                self.payload["body"]["BasketIDs"] = basket_id
-                return self.order_request("DB")
+                return self.order_request("DB", {"BasketIDs": basket_id})
         except Exception as e:
             log_response(e)
 
     def clone_basket(self,basket_id:int):
         try:
             if self.client_code != None:
-                self.payload["body"]["BasketID"] = basket_id
-                return self.order_request("CL")
+                return self.order_request("CL", {"BasketID": basket_id})
         except Exception as e:
             log_response(e)
 
     def execute_basket(self,basket_id:int):
         try:
             if self.client_code != None:
-                self.payload["body"]["BasketID"] = basket_id
-                return self.order_request("EB")
+                return self.order_request("EB", {"BasketID": basket_id})
         except Exception as e:
             log_response(e)
 
     def get_order_in_basket(self,basket_id:int):
         try:
             if self.client_code != None:
-                self.payload["body"]["BasketID"] = basket_id
-                return self.order_request("GO")
+                return self.order_request("GO", {"BasketID": basket_id})
         except Exception as e:
             log_response(e)
 
     def add_basket_order(self,basket_order:Basket_order,basket_list:list):
         try:
             if self.client_code != None:
-                self.set_basket_payload(basket_order,basket_list)
-                return self.order_request("AB")
+                return self.order_request("AB", self._basket_body(basket_order,basket_list))
         except Exception as e:
             log_response(e)
 
     def get_expiry(self,exch:str,symbol:str):
         try:
-            self.payload["body"]["Exch"] = exch
-            self.payload["body"]["Symbol"] = symbol
-            return self.order_request("GE")
+            return self.order_request("GE", {"Exch": exch, "Symbol": symbol})
         except Exception as e:
             log_response(e)
 
     def get_option_chain(self,exch:str,symbol:str,expire:int):
         try:
-            self.payload["body"]["Exch"] = exch
-            self.payload["body"]["Symbol"] = symbol
-            self.payload["body"]["ExpiryDate"] = f"/Date({expire})/"
-            return self.order_request("GOC")
+            return self.order_request("GOC", {
+                "Exch": exch,
+                "Symbol": symbol,
+                "ExpiryDate": f"/Date({expire})/"})
         except Exception as e:
             log_response(e)
 
     def cancel_bulk_order(self,ExchOrderIDs:list):
         try:
-            if self.client_code != None:
-                self.payload["body"]["ExchOrderIDs"] = ExchOrderIDs
-            return self.order_request("CBO")
+            return self.order_request("CBO", {"ExchOrderIDs": ExchOrderIDs})
         except Exception as e:
             log_response(e)
 
     def squareoff_all(self):
         try:
             if self.client_code != None:
-                return self.order_request("SO")
+                return self.order_request("SO", {})
         except Exception as e:
             log_response(e)
 
     def position_convertion(self,Exch:str,ExchType:str,ScripData:str,TradeType:str,ConvertQty:int,ConvertFrom:str,ConvertTo:str):
         try:
             if self.client_code != None:
-                self.payload["body"]["Exch"] = Exch
-                self.payload["body"]["ExchType"] = ExchType
-                self.payload["body"]["ScripData"] = ScripData
-                self.payload["body"]["TradeType"] = TradeType
-                self.payload["body"]["ConvertQty"] = ConvertQty
-                self.payload["body"]["ConvertFrom"] = ConvertFrom
-                self.payload["body"]["ConvertTo"] = ConvertTo
-                return self.order_request("PO")
+                return self.order_request("PO", {
+                    "Exch": Exch,
+                    "ExchType": ExchType,
+                    "ScripData": ScripData,
+                    "TradeType": TradeType,
+                    "ConvertQty": ConvertQty,
+                    "ConvertFrom": ConvertFrom,
+                    "ConvertTo": ConvertTo})
         except Exception as e:
             log_response(e)
 
     def socket_20_depth(self,socket_payload:dict):
         try:
-            self.token=self.market_depth_token()
             """
             self.SOCKET_DEPTH_PAYLOAD["operation"]=operation
             self.SOCKET_DEPTH_PAYLOAD["method"]=method
             self.SOCKET_DEPTH_PAYLOAD["instruments"]=instruments
             """
-            self.subscription_key=SUBSCRIPTION_KEY
-            
-
-            self.market_depth_url=f'wss://openapi.5paisa.com/ws?subscription-key={self.subscription_key}&access_token={self.token}'
+            import websocket
+            self.market_depth_url=self.depth_feed_url()
             
             def on_open(ws):
                 
@@ -819,7 +894,7 @@ class FivePaisaClient:
 
     def market_depth_token(self):
         try:
-            response = self.session.post(self.MARKET_DEPTH_ROUTE_20, headers=self.jwt_headers).json()
+            response = self.transport.post(self.MARKET_DEPTH_ROUTE_20, headers=self._jwt_headers()).json()
             return response["access_token"]
         except Exception as e:
             log_response(e)
\ No newline at end of file
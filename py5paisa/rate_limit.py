@@ -0,0 +1,149 @@
+"""
+Contains the opt-in rate limiter pacing requests to per-route limits,
+shared by every thread and process of the machine using the same API key
+"""
+import os
+import time
+import mmap
+import struct
+import hashlib
+import tempfile
+import threading
+from contextlib import contextmanager
+from .logging import log_response
+
+try:
+    import fcntl
+except ImportError:
+    # Windows, the budget is then shared by the threads of one process only
+    fcntl = None
+
+# Requests per second by order_request type, routes missing here are not limited.
+# Conservative placeholders rather than limits published by the broker, which
+# are set per API key : pass the rates of yours when they are known.
+ROUTE_RATES = {"GE": 5.0, "GOC": 10.0, "MD": 10.0, "MDS": 10.0, "MF": 10.0, "MS": 10.0}
+# Requests let through back to back before pacing starts
+BURST = 2
+# A stored arrival time further ahead than this is left over from a clock change
+MAX_AHEAD = 60.0
+SLOT = struct.Struct("d")
+
+
+def default_path(routes, key=None):
+    """
+    Shared file of a set of routes limited for the API key `key`, found by
+    every process of the same OS user limiting them for that key.
+    """
+    name = ",".join(sorted(routes)) + "|" + (key or "")
+    digest = hashlib.sha256(name.encode("utf-8")).hexdigest()[:12]
+    return os.path.join(tempfile.gettempdir(), f"py5paisa-rate-limit-{os.getuid()}-{digest}")
+
+
+class RateLimiter:
+
+    def __init__(self, rates=None, burst=BURST, path=None, key=None):
+        """
+        Generic cell rate algorithm per route : requests on a route are
+        spaced 1/rates[route] seconds apart, `burst` of them may go back
+        to back. Each route's theoretical arrival time lives in a file at
+        `path` mapped in memory and updated under an fcntl lock, so all
+        processes on the file share one budget per route. The default
+        path is keyed on the API key `key`, whose limits these are.
+        A file that cannot be opened leaves the budget to the threads of
+        this process. Callers reserve their slot and sleep until it comes
+        instead of being refused.
+        """
+        self.rates = dict(ROUTE_RATES if rates is None else rates)
+        self.burst = burst
+        self.key = key
+        self.slots = {route: index * SLOT.size for index, route in enumerate(sorted(self.rates))}
+        self.lock = threading.Lock()
+        size = SLOT.size * max(1, len(self.slots))
+        if fcntl is None:
+            self.path = None
+            self.fd = None
+            self.memory = bytearray(size)
+            return
+        self.path = path or default_path(self.rates, key)
+        try:
+            self.fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600)
+        except OSError as e:
+            log_response(f"Rate limit not shared with other processes, cannot open {self.path}: {e}")
+            self.path = None
+            self.fd = None
+            self.memory = bytearray(size)
+            return
+        with self._locked():
+            if os.fstat(self.fd).st_size < size:
+                os.ftruncate(self.fd, size)
+        self.memory = mmap.mmap(self.fd, size)
+
+    def spec(self):
+        """Keyword arguments of an equivalent limiter, for another process to share this one's budget."""
+        return {"rates": dict(self.rates), "burst": self.burst, "path": self.path, "key": self.key}
+
+    @contextmanager
+    def _locked(self):
+        # flock only excludes other open files, threads of this process share one
+        with self.lock:
+            if self.fd is None:
+                yield
+                return
+            fcntl.flock(self.fd, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(self.fd, fcntl.LOCK_UN)
+
+    def reserve(self, route, max_wait=None):
+        """
+        Takes the next slot of `route` and returns the seconds to wait for
+        it, 0 when the request can go now. None, and no slot taken, when
+        the wait would exceed `max_wait`.
+        """
+        rate = self.rates.get(route)
+        if not rate:
+            return 0.0
+        interval = 1.0 / rate
+        offset = self.slots[route]
+        with self._locked():
+            now = time.time()
+            arrival = SLOT.unpack_from(self.memory, offset)[0]
+            if arrival < now or arrival > now + MAX_AHEAD:
+                arrival = now
+            wait = max(0.0, arrival - (self.burst - 1) * interval - now)
+            if max_wait is not None and wait > max_wait:
+                return None
+            SLOT.pack_into(self.memory, offset, arrival + interval)
+        return wait
+
+    def acquire(self, route, max_wait=None):
+        """Blocks until a request on `route` may go, False when that takes longer than `max_wait`."""
+        wait = self.reserve(route, max_wait)
+        if wait is None:
+            return False
+        if wait:
+            time.sleep(wait)
+        return True
+
+    def close(self):
+        if self.fd is not None:
+            self.memory.close()
+            os.close(self.fd)
+            self.fd = None
+
+
+def rate_limiter(spec, key=None):
+    """
+    Limiter for a `rate_limit` argument : a RateLimiter, True for the
+    ROUTE_RATES, a dict of RateLimiter keyword arguments such as
+    {"rates": {"GOC": 5.0}} or what spec() returns, or None for none.
+    `key` is the API key a default path is keyed on.
+    """
+    if spec is None or spec is False:
+        return None
+    if spec is True:
+        return RateLimiter(key=key)
+    if isinstance(spec, dict):
+        return RateLimiter(**dict({"key": key}, **spec))
+    return spec
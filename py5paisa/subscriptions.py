@@ -0,0 +1,140 @@
+"""
+Contains the subscription manager keeping a feed socket subscribed to the
+instruments currently wanted, and the ATM tracker deciding when a strike
+window should move
+"""
+import json
+import math
+from .logging import log_response
+
+
+def item_key(item):
+    return (item["Exch"], item["ExchType"], int(item["ScripCode"]))
+
+
+class SubscriptionManager:
+
+    def __init__(self, client, method="mf", batch_size=50, send=None):
+        """
+        Tracks the instruments wanted on a Request_Feed socket per group
+        (e.g. one group per index) against what is actually subscribed.
+        sync() only sends the difference, batched `batch_size` instruments
+        per subscribe/unsubscribe message. An instrument wanted by several
+        groups is subscribed once and kept until no group wants it.
+        `send(payload)` defaults to the client's current websocket, it
+        may return False for a payload it could not send.
+        """
+        self.client = client
+        self.method = method
+        self.batch_size = batch_size
+        self._send = send
+        self.desired = {}
+        self.subscribed = {}
+        self.messages_sent = 0
+
+    def send(self, payload):
+        """True when `payload` went out."""
+        if self._send is not None:
+            sent = self._send(payload)
+        else:
+            sent = self.client.ws.send(json.dumps(payload))
+        if sent is False:
+            return False
+        self.messages_sent += 1
+        return True
+
+    def set_desired(self, group, items):
+        self.desired[group] = {item_key(item): item for item in items}
+
+    def discard(self, group):
+        self.desired.pop(group, None)
+
+    def wanted(self):
+        wanted = {}
+        for items in self.desired.values():
+            wanted.update(items)
+        return wanted
+
+    def diff(self):
+        """(items to subscribe, items to unsubscribe) to reach the desired set."""
+        wanted = self.wanted()
+        add = [item for key, item in wanted.items() if key not in self.subscribed]
+        remove = [item for key, item in self.subscribed.items() if key not in wanted]
+        return add, remove
+
+    def batches(self, operation, items):
+        return [(operation, items[i:i + self.batch_size]) for i in range(0, len(items), self.batch_size)]
+
+    def payloads(self, operation, items):
+        return [self.client.Request_Feed(self.method, operation, batch) for _, batch in self.batches(operation, items)]
+
+    def apply(self, operation, items):
+        for item in items:
+            if operation == "s":
+                self.subscribed[item_key(item)] = item
+            else:
+                self.subscribed.pop(item_key(item), None)
+
+    def take_pending(self):
+        """
+        Payloads bringing the socket to the desired set, marked as applied.
+        Used to subscribe from an on_open callback before the socket is up.
+        """
+        add, remove = self.diff()
+        self.apply("s", add)
+        self.apply("u", remove)
+        return self.payloads("s", add) + self.payloads("u", remove)
+
+    def sync(self):
+        """
+        Sends the pending diff, returns the (added, removed) counts that
+        went out. A batch counts as subscribed only once sent, the ones
+        failing stay pending for the next sync().
+        """
+        add, remove = self.diff()
+        added = removed = 0
+        try:
+            for operation, batch in self.batches("s", add) + self.batches("u", remove):
+                if not self.send(self.client.Request_Feed(self.method, operation, batch)):
+                    break
+                self.apply(operation, batch)
+                if operation == "s":
+                    added += len(batch)
+                else:
+                    removed += len(batch)
+        except Exception as e:
+            log_response(e)
+        return added, removed
+
+    def resubscribe_payloads(self):
+        """Payloads subscribing everything again, e.g. after a reconnect."""
+        return self.payloads("s", list(self.subscribed.values()))
+
+
+class AtmTracker:
+
+    def __init__(self, step, hysteresis=0.25, centre=None):
+        """
+        Centre strike of a subscription window. It only moves once spot is
+        more than (0.5 + hysteresis) strikes away from it, so spot hovering
+        around the midpoint between two strikes does not flip the window
+        back and forth.
+        """
+        self.step = step
+        self.hysteresis = hysteresis
+        self.centre = centre
+        self.moves = 0
+
+    def nearest(self, spot):
+        return float(math.floor(spot / self.step + 0.5) * self.step)
+
+    def update(self, spot):
+        """True when the centre moved."""
+        if self.centre is None:
+            self.centre = self.nearest(spot)
+            return True
+        if abs(spot - self.centre) <= (0.5 + self.hysteresis) * self.step:
+            return False
+        self.centre = self.nearest(spot)
+        self.moves += 1
+        return True
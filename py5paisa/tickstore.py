@@ -0,0 +1,189 @@
+"""
+Contains the tick store keeping a fixed size tick history per instrument
+in preallocated NumPy ring buffers
+"""
+import json
+import time
+import threading
+import numpy as np
+
+# 32 bytes a tick : float32 keeps exchange prices exact to the paisa once
+# rounded to 2 decimals, cumulative volume needs 64 bits
+TICK_FIELDS = {"time": np.int64,      # epoch milliseconds
+               "ltp": np.float32,
+               "volume": np.int64,
+               "oi": np.int32,
+               "bid": np.float32,
+               "ask": np.float32}
+PRICE_FIELDS = ("ltp", "bid", "ask")
+
+
+def _value(name, value):
+    return round(float(value), 2) if name in PRICE_FIELDS else int(value)
+
+
+def feed_time(tick):
+    """Epoch milliseconds of a feed tick from its "/Date(ms)/" TickDt, now when absent."""
+    tick_date = tick.get("TickDt")
+    if tick_date:
+        try:
+            return int(tick_date[6:-2].split("+")[0])
+        except ValueError:
+            pass
+    return int(time.time() * 1000)
+
+
+class TickStore:
+
+    def __init__(self, max_instruments=300, capacity=25000):
+        """
+        Tick history of up to `max_instruments` scrip codes, the last
+        `capacity` ticks each. Every field is one (max_instruments,
+        capacity) array allocated up front, so the footprint is fixed
+        (see footprint()) and appending a tick only writes scalars.
+        Ticks of instruments beyond `max_instruments` are counted in
+        `rejected` and dropped. The defaults, a session at about one tick
+        a second for 300 instruments, take 240 MB.
+        One thread, the feed dispatch, appends while others read: `lock`
+        keeps readers from seeing a tick half written or a ring mid
+        wraparound, and the arrays they get back are copies.
+        """
+        self.max_instruments = max_instruments
+        self.capacity = capacity
+        self.fields = {name: np.zeros((max_instruments, capacity), dtype=dtype)
+                       for name, dtype in TICK_FIELDS.items()}
+        self.counts = np.zeros(max_instruments, dtype=np.int64)
+        self.rows = {}
+        self.rejected = 0
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def footprint(max_instruments, capacity):
+        """Bytes held by a store of this size."""
+        per_tick = sum(np.dtype(dtype).itemsize for dtype in TICK_FIELDS.values())
+        return max_instruments * (capacity * per_tick + np.dtype(np.int64).itemsize)
+
+    @property
+    def nbytes(self):
+        return sum(array.nbytes for array in self.fields.values()) + self.counts.nbytes
+
+    def row(self, code):
+        row = self.rows.get(code)
+        if row is None:
+            if len(self.rows) >= self.max_instruments:
+                return None
+            row = self.rows[code] = len(self.rows)
+        return row
+
+    def append(self, code, tick_time, ltp, volume=0, oi=0, bid=np.nan, ask=np.nan):
+        with self.lock:
+            return self._append(code, tick_time, ltp, volume, oi, bid, ask)
+
+    def _append(self, code, tick_time, ltp, volume, oi, bid, ask):
+        row = self.row(code)
+        if row is None:
+            self.rejected += 1
+            return False
+        slot = self.counts[row] % self.capacity
+        fields = self.fields
+        fields["time"][row, slot] = tick_time
+        fields["ltp"][row, slot] = ltp
+        fields["volume"][row, slot] = volume
+        fields["oi"][row, slot] = oi
+        fields["bid"][row, slot] = bid
+        fields["ask"][row, slot] = ask
+        self.counts[row] += 1
+        return True
+
+    def ingest(self, message):
+        """
+        Appends every tick of a MarketFeedV3 message, a JSON string or the
+        already decoded list of dicts. Returns the number of ticks stored.
+        """
+        if isinstance(message, (str, bytes)):
+            message = json.loads(message)
+        if isinstance(message, dict):
+            message = [message]
+        stored = 0
+        with self.lock:
+            for tick in message:
+                if "Token" not in tick or "LastRate" not in tick:
+                    continue
+                stored += self._append(int(tick["Token"]), feed_time(tick), tick["LastRate"],
+                                       tick.get("TotalQty", 0), tick.get("OpenInterest", 0),
+                                       tick.get("BidRate", np.nan), tick.get("OffRate", np.nan))
+        return stored
+
+    def __len__(self):
+        return len(self.rows)
+
+    def __contains__(self, code):
+        return code in self.rows
+
+    def count(self, code):
+        """Ticks held for `code`, at most capacity."""
+        row = self.rows.get(code)
+        return 0 if row is None else int(min(self.counts[row], self.capacity))
+
+    def _order(self, row):
+        count = int(self.counts[row])
+        if count <= self.capacity:
+            return np.arange(count)
+        start = count % self.capacity
+        return np.concatenate((np.arange(start, self.capacity), np.arange(start)))
+
+    def history(self, code, fields=None):
+        """Dict of field to array of the ticks held for `code`, oldest first."""
+        fields = fields or list(TICK_FIELDS)
+        row = self.rows.get(code)
+        if row is None:
+            return {name: np.empty(0, dtype=TICK_FIELDS[name]) for name in fields}
+        with self.lock:
+            order = self._order(row)
+            return {name: self.fields[name][row, order] for name in fields}
+
+    def window(self, code, start=None, end=None, fields=None):
+        """
+        history() restricted to ticks with start <= time < end (epoch
+        milliseconds, either bound optional).
+        """
+        fields = fields or list(TICK_FIELDS)
+        history = self.history(code, list(dict.fromkeys(["time"] + fields)))
+        times = history["time"]
+        lo = 0 if start is None else np.searchsorted(times, start, side="left")
+        hi = len(times) if end is None else np.searchsorted(times, end, side="left")
+        return {name: history[name][lo:hi] for name in fields}
+
+    def last(self, code):
+        """Dict of the latest tick of `code`, None when it has none."""
+        row = self.rows.get(code)
+        if row is None:
+            return None
+        with self.lock:
+            if self.counts[row] == 0:
+                return None
+            slot = (self.counts[row] - 1) % self.capacity
+            return {name: _value(name, self.fields[name][row, slot]) for name in TICK_FIELDS}
+
+    def latest(self, codes, field="ltp"):
+        """Latest `field` of every code in `codes` as one array, NaN where unknown."""
+        out = np.full(len(codes), np.nan)
+        rows = np.array([self.rows.get(code, -1) for code in codes], dtype=np.int64)
+        known = rows >= 0
+        with self.lock:
+            known[known] = self.counts[rows[known]] > 0
+            slots = (self.counts[rows[known]] - 1) % self.capacity
+            out[known] = self.fields[field][rows[known], slots]
+        return np.round(out, 2) if field in PRICE_FIELDS else out
+
+    def vwap(self, code, start=None, end=None):
+        """
+        Volume weighted LTP over the window from the cumulative TotalQty,
+        None without volume in the window.
+        """
+        ticks = self.window(code, start, end, ["ltp", "volume"])
+        traded = np.diff(ticks["volume"])
+        if len(traded) == 0 or traded.sum() <= 0:
+            return None
+        traded = np.maximum(traded, 0)
+        return float(np.dot(ticks["ltp"][1:], traded) / traded.sum())
@@ -0,0 +1,112 @@
+"""
+Contains the expiry aware session refresh: a background thread logging the
+client in again ahead of JWT expiry, and the check spotting requests the
+broker refused for an expired or invalid token
+"""
+import time
+import threading
+from .token_store import jwt_expiry, jwt_claim
+from .logging import log_response
+
+AUTH_FAILURE_STATUS = (401, 403)
+AUTH_FAILURE_MESSAGES = ("invalid token", "token expired", "token is expired", "expired token",
+                         "unauthorized", "invalid session", "session expired")
+# The refresh lead never exceeds this share of the token's lifetime
+LEAD_FRACTION = 0.5
+
+
+def is_auth_failure(status, response):
+    """True when an HTTP status and decoded response mean the token was refused."""
+    if status in AUTH_FAILURE_STATUS:
+        return True
+    if not isinstance(response, dict):
+        return False
+    head = response.get("head") or {}
+    body = response.get("body") or {}
+    messages = [str(head.get("statusDescription", ""))]
+    if isinstance(body, dict):
+        messages.append(str(body.get("Message", "")))
+    return any(failure in message.lower() for message in messages for failure in AUTH_FAILURE_MESSAGES)
+
+
+def response_json(response):
+    try:
+        return response.json()
+    except ValueError:
+        return None
+
+
+class TokenRefresher:
+
+    def __init__(self, client, lead=600, retry_interval=30, max_sleep=300):
+        """
+        Calls client.refresh_session() `lead` seconds before the JWT of
+        `client` expires, at most LEAD_FRACTION of the token's lifetime
+        (from its `iat` claim, or from when it was first seen). Requests
+        keep using the current tokens until the new ones are swapped in.
+        A refresh that fails, or whose token does not expire later than
+        the old one and past its own lead, is retried every
+        `retry_interval` seconds. The expiry is re-read at least every
+        `max_sleep` seconds, so tokens replaced by an on demand refresh
+        reschedule the next one.
+        """
+        self.client = client
+        self.lead = lead
+        self.retry_interval = retry_interval
+        self.max_sleep = max_sleep
+        self.stopped = threading.Event()
+        self.thread = None
+        self.refreshes = 0
+        self.failures = 0
+        # Token without `iat` claim last seen, and since when
+        self.token = None
+        self.seen_at = None
+
+    def effective_lead(self, token, expires_at):
+        issued_at = jwt_claim(token, "iat")
+        if issued_at is None:
+            if token != self.token:
+                self.token, self.seen_at = token, time.time()
+            issued_at = self.seen_at
+        return min(self.lead, LEAD_FRACTION * max(0.0, expires_at - issued_at))
+
+    def refresh_due(self):
+        """Epoch seconds of the next refresh, None when the token has no expiry."""
+        token = self.client.Jwt_token
+        expires_at = jwt_expiry(token)
+        return None if expires_at is None else expires_at - self.effective_lead(token, expires_at)
+
+    def _extended(self, previous_expiry):
+        # A token reissued with the same expiry would be due again at once
+        expires_at = jwt_expiry(self.client.Jwt_token)
+        if expires_at is None or previous_expiry is None:
+            return True
+        return expires_at > previous_expiry and self.refresh_due() > time.time()
+
+    def _run(self):
+        while not self.stopped.is_set():
+            due = self.refresh_due()
+            wait = self.max_sleep if due is None else due - time.time()
+            if wait > 0:
+                self.stopped.wait(min(wait, self.max_sleep))
+                continue
+            token = self.client.Jwt_token
+            if self.client.refresh_session(token) and self._extended(jwt_expiry(token)):
+                self.refreshes += 1
+            else:
+                self.failures += 1
+                log_response("Session refresh failed or did not extend the session, retrying")
+                self.stopped.wait(self.retry_interval)
+
+    def start(self):
+        if self.thread is None:
+            self.stopped.clear()
+            self.thread = threading.Thread(target=self._run, name="token-refresh", daemon=True)
+            self.thread.start()
+        return self
+
+    def stop(self):
+        self.stopped.set()
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
@@ -0,0 +1,135 @@
+"""
+Contains the session token stores letting FivePaisaClient.login reuse a
+still valid JWT instead of logging in again
+"""
+import os
+import json
+import time
+import base64
+import hashlib
+import tempfile
+import threading
+
+# A cached session is only reused while it has this many seconds left
+EXPIRY_MARGIN = 300
+
+
+def jwt_claim(token, name):
+    """Numeric claim `name` of a JWT, None when it has none."""
+    try:
+        payload = token.split(".")[1]
+        payload += "=" * (-len(payload) % 4)
+        return float(json.loads(base64.urlsafe_b64decode(payload))[name])
+    except Exception:
+        return None
+
+
+def jwt_expiry(token):
+    """Epoch seconds of the `exp` claim of a JWT, None when it has none."""
+    return jwt_claim(token, "exp")
+
+
+def session_key(user_key, email, base_url=None):
+    """
+    Store key of an app/user pair on the API host `base_url`, None for the
+    real one, so a session of a stand-in server is never sent to 5paisa.
+    Hashed so the store never holds the email.
+    """
+    return hashlib.sha256(f"{user_key}:{email}:{base_url or ''}".encode("utf-8")).hexdigest()
+
+
+def session_valid(session, margin=EXPIRY_MARGIN, now=None):
+    if not session or not session.get("Jwt_token"):
+        return False
+    expires_at = session.get("expires_at")
+    return expires_at is not None and expires_at - margin > (time.time() if now is None else now)
+
+
+class MemoryTokenStore:
+
+    def __init__(self):
+        """
+        Sessions kept for the life of the process, shared by every client
+        handed the same store.
+        """
+        self.sessions = {}
+        self.lock = threading.Lock()
+
+    def load(self, key):
+        with self.lock:
+            session = self.sessions.get(key)
+            return dict(session) if session else None
+
+    def save(self, key, session):
+        with self.lock:
+            self.sessions[key] = dict(session)
+
+    def clear(self, key):
+        with self.lock:
+            self.sessions.pop(key, None)
+
+
+class FileTokenStore(MemoryTokenStore):
+
+    def __init__(self, path=None):
+        """
+        Sessions persisted as JSON at `path`, ~/.cache/py5paisa/sessions.json
+        by default, readable by the owner only. Writes go through a
+        temporary file and a rename so a crash never leaves half a file.
+        """
+        super().__init__()
+        self.path = path or os.path.join(os.path.expanduser("~"), ".cache", "py5paisa", "sessions.json")
+
+    def _read(self):
+        try:
+            with open(self.path) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _write(self, sessions):
+        directory = os.path.dirname(os.path.abspath(self.path))
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=directory, prefix=".sessions")
+        try:
+            with os.fdopen(fd, "w") as f:
+                json.dump(sessions, f)
+            os.chmod(tmp, 0o600)
+            os.replace(tmp, self.path)
+        except Exception:
+            os.unlink(tmp)
+            raise
+
+    def load(self, key):
+        with self.lock:
+            return self._read().get(key)
+
+    def save(self, key, session):
+        with self.lock:
+            sessions = self._read()
+            # Expired sessions of other users go on the way
+            sessions = {k: s for k, s in sessions.items() if session_valid(s, margin=0)}
+            sessions[key] = dict(session)
+            self._write(sessions)
+
+    def clear(self, key):
+        with self.lock:
+            sessions = self._read()
+            if sessions.pop(key, None) is not None:
+                self._write(sessions)
+
+
+def token_store(spec):
+    """
+    Store for a FetchOptionData TOKEN_CACHE setting : a store object, True
+    for the default FileTokenStore, a path, 'memory', or None for none.
+    """
+    if spec is None or spec is False:
+        return None
+    if spec is True:
+        return FileTokenStore()
+    if spec == "memory":
+        return MemoryTokenStore()
+    if isinstance(spec, str):
+        return FileTokenStore(spec)
+    return spec
@@ -0,0 +1,399 @@
+"""
+Contains the HTTP transport under FivePaisaClient: a pooled keep-alive
+session with per-route deadlines, budgeted, jittered retries of the
+idempotent market data routes, opt-in hedging of the slow ones and the
+opt-in per-route rate limit shared between processes
+"""
+import time
+import random
+import threading
+import collections
+import concurrent.futures
+import requests
+from requests.adapters import HTTPAdapter
+from .metrics import registry
+from .rate_limit import rate_limiter
+
+CONNECT_TIMEOUT = 3.05
+DEFAULT_DEADLINE = 15.0
+# Seconds a whole request may take, retries included, by order_request type
+ROUTE_DEADLINES = {"GE": 5.0, "GOC": 8.0, "MD": 5.0, "MDS": 5.0, "MF": 5.0, "MS": 5.0,
+                   "login": 20.0}
+# Market data reads, safe to send twice
+IDEMPOTENT_ROUTES = ("GE", "GOC", "MD", "MDS", "MF", "MS")
+RETRY_STATUS = (429, 500, 502, 503, 504)
+# Routes whose long tail holds up a whole tick : option chain and market depth
+HEDGE_ROUTES = ("GOC", "MD", "MDS", "MF")
+
+
+class RetryBudget:
+
+    def __init__(self, ratio=0.1, min_per_second=1.0, max_balance=10.0):
+        """
+        Caps retries at `ratio` of the requests sent plus `min_per_second`,
+        so a struggling broker sees at most that much extra load instead of
+        every request retried. Unused budget accrues up to `max_balance`.
+        """
+        self.ratio = ratio
+        self.min_per_second = min_per_second
+        self.max_balance = max_balance
+        self.balance = max_balance
+        self.updated = time.monotonic()
+        self.exhausted = 0
+        self.lock = threading.Lock()
+
+    def _refill(self, amount):
+        now = time.monotonic()
+        self.balance = min(self.max_balance, self.balance + amount + (now - self.updated) * self.min_per_second)
+        self.updated = now
+
+    def deposit(self):
+        with self.lock:
+            self._refill(self.ratio)
+
+    def withdraw(self):
+        with self.lock:
+            self._refill(0)
+            if self.balance >= 1:
+                self.balance -= 1
+                return True
+            self.exhausted += 1
+            return False
+
+
+class Transport:
+
+    def __init__(self, pool_size=20, keep_alive=True, deadlines=None, default_deadline=DEFAULT_DEADLINE,
+                 connect_timeout=CONNECT_TIMEOUT, retries=2, backoff=0.05, max_backoff=1.0,
+                 idempotent=IDEMPOTENT_ROUTES, budget=None, hedge=False, hedge_routes=HEDGE_ROUTES,
+                 hedge_percentile=95, hedge_min_samples=20, hedge_ratio=0.05, rate_limit=None,
+                 rate_limit_key=None):
+        """
+        One requests session whose adapter keeps up to `pool_size`
+        connections per host alive (`keep_alive` False closes each one
+        after its response). A request on `route` must complete within
+        its deadline, `deadlines` overriding ROUTE_DEADLINES. Requests on
+        `idempotent` routes failing to connect, timing out or answered
+        with a RETRY_STATUS are retried up to `retries` times after a
+        jittered exponential backoff, as long as the RetryBudget and the
+        deadline allow.
+        With `hedge`, a request on `hedge_routes` still unanswered after
+        the `hedge_percentile` latency of its route is sent a second time
+        and the first response wins. Hedging starts once the route has
+        `hedge_min_samples` latencies in metrics_registry, and hedges stay
+        within `hedge_ratio` of the requests sent. Fetch worker processes
+        hedge on the delays their parent shares (see shared_hedge_delays)
+        and send their counts back (see changes()).
+        With a `rate_limit` (see rate_limit.py), True for the ROUTE_RATES
+        or a dict of RateLimiter arguments such as {"rates": {"GOC": 5.0}},
+        every attempt waits for its slot of the budget shared by the
+        processes sending with the API key `rate_limit_key`.
+        """
+        self.config = {"pool_size": pool_size, "keep_alive": keep_alive, "deadlines": deadlines,
+                       "default_deadline": default_deadline, "connect_timeout": connect_timeout,
+                       "retries": retries, "backoff": backoff, "max_backoff": max_backoff,
+                       "idempotent": tuple(idempotent), "hedge": hedge, "hedge_routes": tuple(hedge_routes),
+                       "hedge_percentile": hedge_percentile, "hedge_min_samples": hedge_min_samples,
+                       "hedge_ratio": hedge_ratio}
+        self.deadlines = dict(ROUTE_DEADLINES, **(deadlines or {}))
+        self.default_deadline = default_deadline
+        self.connect_timeout = connect_timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.idempotent = set(idempotent)
+        self.budget = budget or RetryBudget()
+        self.hedge = hedge
+        self.hedge_routes = set(hedge_routes)
+        self.hedge_percentile = hedge_percentile
+        self.hedge_min_samples = hedge_min_samples
+        self.hedge_budget = RetryBudget(ratio=hedge_ratio, min_per_second=0.0, max_balance=5.0)
+        # Hedge delays of the parent process, which merges every fetch worker's latencies
+        self.shared_hedge_delays = {}
+        self._executor = None
+        self.limiter = rate_limiter(rate_limit, rate_limit_key)
+        self.config["rate_limit"] = None if self.limiter is None else self.limiter.spec()
+        self.adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=0)
+        self.session = requests.Session()
+        self.session.mount("http://", self.adapter)
+        self.session.mount("https://", self.adapter)
+        if not keep_alive:
+            self.session.headers["Connection"] = "close"
+        self.counts = collections.Counter()
+        self.lock = threading.Lock()
+
+    def deadline(self, route):
+        return self.deadlines.get(route, self.default_deadline)
+
+    def _count(self, name):
+        with self.lock:
+            self.counts[name] += 1
+
+    def latency_metric(self, route):
+        return "transport." + route
+
+    def pace(self, route, remaining):
+        """
+        Seconds to wait for the rate limit slot of `route`. Raises
+        requests.Timeout when the slot comes after the `remaining` deadline.
+        """
+        if self.limiter is None:
+            return 0.0
+        wait = self.limiter.reserve(route, remaining)
+        if wait is None:
+            self._count("rate_limited")
+            raise requests.Timeout(f"{route} rate limit leaves no slot before its deadline")
+        if wait:
+            self._count("rate_limit_delays")
+        return wait
+
+    def _sleep(self, attempt, remaining):
+        delay = min(self.max_backoff, self.backoff * 2 ** attempt) * random.uniform(0.5, 1)
+        if delay >= remaining:
+            return False
+        time.sleep(delay)
+        return True
+
+    def request(self, method, url, route=None, **kwargs):
+        """
+        Sends one request within the deadline of `route`, retrying when
+        it is idempotent and hedging it when enabled. The deadline covers
+        connecting, the response body and the retries, not each read.
+        Raises requests.Timeout once the deadline passed.
+        """
+        deadline = time.monotonic() + self.deadline(route)
+        self.budget.deposit()
+        delay = self.hedge_delay(route)
+        if delay is None:
+            return self._send(method, url, route, deadline, kwargs)
+        return self._hedged(delay, method, url, route, deadline, kwargs)
+
+    def _send(self, method, url, route, deadline, kwargs):
+        retryable = route in self.idempotent
+        attempt = 0
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                self._count("deadline_exceeded")
+                raise requests.Timeout(f"{route or url} exceeded its deadline")
+            wait = self.pace(route, remaining)
+            if wait:
+                time.sleep(wait)
+                remaining = deadline - time.monotonic()
+            self._count("requests")
+            started = time.perf_counter()
+            try:
+                res = self.session.request(method, url, timeout=(min(self.connect_timeout, remaining), remaining),
+                                           stream=True, **kwargs)
+                self._read(res, route or url, deadline)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                self._count("timeouts" if isinstance(e, requests.Timeout) else "connection_errors")
+                if not self._retry(retryable, attempt, deadline):
+                    raise
+            else:
+                if route is not None:
+                    registry.record(self.latency_metric(route), time.perf_counter() - started)
+                if res.status_code not in RETRY_STATUS or not self._retry(retryable, attempt, deadline):
+                    return res
+                res.close()
+            attempt += 1
+
+    def _read(self, res, name, deadline):
+        """
+        Reads the body of the streamed `res` by `deadline`. The read timeout
+        only bounds the wait for each chunk, a body trickling in would run
+        past it, so a timer shuts the socket down at the deadline.
+        """
+        state = {"read": False, "expired": False}
+        lock = threading.Lock()
+
+        def expire():
+            with lock:
+                if state["read"]:
+                    return
+                state["expired"] = True
+            try:
+                res.raw.shutdown()
+            except (AttributeError, ValueError, RuntimeError):
+                # urllib3 before 2.3 has no shutdown, closing ends the read on the next chunk
+                res.close()
+
+        watchdog = threading.Timer(max(deadline - time.monotonic(), 0.0), expire)
+        watchdog.daemon = True
+        watchdog.start()
+        try:
+            res.content
+        except requests.RequestException:
+            if not state["expired"]:
+                raise
+        finally:
+            with lock:
+                state["read"] = True
+            watchdog.cancel()
+        if state["expired"]:
+            res.close()
+            self._count("deadline_exceeded")
+            raise requests.Timeout(f"{name} exceeded its deadline reading the response")
+
+    def _retry(self, retryable, attempt, deadline):
+        if not retryable or attempt >= self.retries:
+            return False
+        if deadline <= time.monotonic():
+            return False
+        if not self.budget.withdraw():
+            return False
+        if not self._sleep(attempt, deadline - time.monotonic()):
+            return False
+        self._count("retries")
+        return True
+
+    def hedge_delay(self, route):
+        """
+        Seconds after which a request on `route` gets hedged, None when it
+        is not : hedging off, another route, or too few latencies yet.
+        A delay from shared_hedge_delays wins over the local latencies.
+        """
+        if not self.hedge or route not in self.hedge_routes:
+            return None
+        delay = self.shared_hedge_delays.get(route)
+        if delay is None:
+            delay = self.hedge_delays().get(route)
+        if delay is None:
+            return None
+        self._count("hedgeable")
+        self.hedge_budget.deposit()
+        return delay
+
+    def hedge_delays(self):
+        """{route: hedge delay} of the hedge routes with enough latencies in this process."""
+        delays = {}
+        if self.hedge:
+            for route in self.hedge_routes:
+                histogram = registry.histograms.get(self.latency_metric(route))
+                if histogram is not None and histogram.count >= self.hedge_min_samples:
+                    delays[route] = histogram.percentile(self.hedge_percentile)
+        return delays
+
+    def take_hedge(self):
+        """True when the hedge budget allows one more duplicate request."""
+        if not self.hedge_budget.withdraw():
+            return False
+        self._count("hedges")
+        return True
+
+    def hedge_won(self):
+        self._count("hedge_wins")
+
+    def hedge_saved(self, seconds):
+        """Records by how much a winning hedge beat the original request."""
+        registry.record("transport.hedge_saved", max(seconds, 0.0))
+
+    def _timed_send(self, *args):
+        return self._send(*args), time.perf_counter()
+
+    def _hedged(self, delay, method, url, route, deadline, kwargs):
+        if self._executor is None:
+            with self.lock:
+                if self._executor is None:
+                    self._executor = concurrent.futures.ThreadPoolExecutor(self.config["pool_size"],
+                                                                           thread_name_prefix="hedge")
+        args = (method, url, route, deadline, kwargs)
+        primary = self._executor.submit(self._timed_send, *args)
+        try:
+            return primary.result(timeout=delay)[0]
+        except concurrent.futures.TimeoutError:
+            pass
+        if not self.take_hedge():
+            return primary.result()[0]
+        hedge = self._executor.submit(self._timed_send, *args)
+        concurrent.futures.wait((primary, hedge), return_when=concurrent.futures.FIRST_COMPLETED)
+        if not hedge.done() or hedge.exception() is not None:
+            # The original answered first, or the hedge failed and only the original is left
+            return primary.result()[0]
+        if primary.done() and primary.exception() is None:
+            return primary.result()[0]
+        res, answered = hedge.result()
+        self.hedge_won()
+        primary.add_done_callback(lambda original: self._record_saved(original, answered))
+        return res
+
+    def _record_saved(self, original, answered):
+        if original.exception() is None:
+            res, finished = original.result()
+            res.close()
+            self.hedge_saved(finished - answered)
+
+    def post(self, url, route=None, **kwargs):
+        return self.request("POST", url, route, **kwargs)
+
+    def get(self, url, route=None, **kwargs):
+        return self.request("GET", url, route, **kwargs)
+
+    def _totals(self):
+        with self.lock:
+            counts = dict(self.counts)
+        for name, budget in (("retry_budget_exhausted", self.budget), ("hedge_budget_exhausted", self.hedge_budget)):
+            counts[name] = counts.get(name, 0) + budget.exhausted
+        return counts
+
+    def changes(self, reported):
+        """
+        Counts added since the call that filled `reported`, a dict this
+        updates. A fetch worker process sends them along with each task
+        result for the parent to merge() into the transport it reports,
+        the requests and hedges of process mode happening in the workers.
+        """
+        counts = self._totals()
+        changes = {name: count - reported.get(name, 0) for name, count in counts.items()
+                   if count != reported.get(name, 0)}
+        reported.update(counts)
+        return changes
+
+    def merge(self, changes):
+        with self.lock:
+            self.counts.update(changes)
+
+    def stats(self):
+        """
+        Request, retry and error counts, those of fetch workers merged in,
+        plus the connections opened by this pool against the requests sent
+        on them : reuse_ratio close to 1 means keep-alive is doing its job.
+        """
+        opened = served = 0
+        pools = self.adapter.poolmanager.pools
+        for key in pools.keys():
+            pool = pools.get(key)
+            if pool is not None:
+                opened += pool.num_connections
+                served += pool.num_requests
+        stats = self._totals()
+        hedge_budget_exhausted = stats.pop("hedge_budget_exhausted")
+        stats.update({"connections_opened": opened, "pooled_requests": served,
+                      "reuse_ratio": round(1 - opened / served, 4) if served else 0.0})
+        if self.hedge:
+            hedges = stats.get("hedges", 0)
+            stats.update({"hedge_rate": round(hedges / stats["hedgeable"], 4) if stats.get("hedgeable") else 0.0,
+                          "hedge_win_rate": round(stats.get("hedge_wins", 0) / hedges, 4) if hedges else 0.0,
+                          "hedge_budget_exhausted": hedge_budget_exhausted})
+        return stats
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+        if self.limiter is not None:
+            self.limiter.close()
+        self.session.close()
+
+
+def transport(spec, **defaults):
+    """
+    Transport for a `transport` argument : a Transport, a dict of its
+    keyword arguments, or None for the defaults. `defaults` fill the
+    arguments the dict leaves out.
+    """
+    if spec is None:
+        return Transport(**defaults)
+    if isinstance(spec, dict):
+        return Transport(**dict(defaults, **spec))
+    return spec
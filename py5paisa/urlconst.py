@@ -1,3 +1,5 @@
+from urllib.parse import urlsplit, urlunsplit
+
 BaseUrl='https://Openapi.5paisa.com/VendorsAPI/Service1.svc/'
 
 
@@ -52,4 +54,71 @@ GET_OPTION_CHAIN_ROUTE=f'{BaseUrl}GetOptionsForSymbol'
 CANCEL_BULK_ORDER_ROUTE=f'{BaseUrl}CancelOrderBulk'
 SQUAREOFF_ROUTE=f'{BaseUrl}SquareOffAll'
 POSITION_CONVERSION_ROUTE=f'{BaseUrl}PositionConversion'
-MARKET_DEPTH_ROUTE_20="https://openapi.5paisa.com/marketfeed-token/token"
\ No newline at end of file
+MARKET_DEPTH_ROUTE_20="https://openapi.5paisa.com/marketfeed-token/token"
+
+# Request type codes used by FivePaisaClient.order_request mapped to the
+# client attribute holding their route
+REQUEST_ROUTES={
+    "OP":"ORDER_PLACEMENT_ROUTE",
+    "OC":"ORDER_CANCEL_ROUTE",
+    "OM":"ORDER_MODIFY_ROUTE",
+    "OS":"ORDER_STATUS_ROUTE",
+    "TI":"TRADE_INFO_ROUTE",
+    "TH":"TRADE_HISTORY_ROUTE",
+    "MF":"MARKET_FEED_ROUTE",
+    "BM":"BRACKET_MOD_ROUTE",
+    "CM":"COVER_MOD_ROUTE",
+    "CO":"COVER_ORDER_ROUTE",
+    "MS":"MARKET_STATUS_ROUTE",
+    "BO":"BRACKET_ORDER_ROUTE",
+    "BC":"BRACKET_CANCEL_ROUTE",
+    "CC":"COVER_CANCEL_ROUTE",
+    "MD":"MARKET_DEPTH_ROUTE",
+    "MDS":"MARKET_DEPTH_BY_SYMBOL_ROUTE",
+    "TB":"TRADEBOOK_ROUTE",
+    "GB":"GET_BASKET_ROUTE",
+    "CB":"CREATE_BASKET_ROUTE",
+    "RB":"RENAME_BASKET_ROUTE",
+    "DB":"DELETE_BASKET_ROUTE",
+    "CL":"CLONE_BASKET_ROUTE",
+    "EB":"EXECUTE_BASKET_ROUTE",
+    "GO":"GET_ORDER_IN_BASKET_ROUTE",
+    "AB":"ADD_BASKET_ORDER_ROUTE",
+    "GE":"OPTION_CHAIN_ROUTE",
+    "GOC":"GET_OPTION_CHAIN_ROUTE",
+    "CBO":"CANCEL_BULK_ORDER_ROUTE",
+    "SO":"SQUAREOFF_ROUTE",
+    "PO":"POSITION_CONVERSION_ROUTE"}
+
+REQUEST_CODES={
+    "OS":"5POrdStatus",
+    "TI":"5PTrdInfo",
+    "MF":"5PMF"}
+
+# Order routes authorised with the JWT token once an access token is present
+JWT_AUTH_REQUESTS=("OP","OC","OM")
+
+# User info data types mapped to their route attribute and response key
+USER_INFO_ROUTES={
+    "MARGIN":("MARGIN_ROUTE","EquityMargin"),
+    "ORDER_BOOK":("ORDER_BOOK_ROUTE","OrderBookDetail"),
+    "HOLDINGS":("HOLDINGS_ROUTE","Data"),
+    "POSITIONS":("POSITIONS_ROUTE","NetPositionDetail"),
+    "IB":("IDEAS_ROUTE","Data"),
+    "IT":("IDEAS_ROUTE","Data")}
+
+
+def rebase_url(url, base_url):
+    """
+    `url` moved onto the scheme and host of `base_url`, path and query
+    kept, e.g. to point a client at a local stand-in server. Websocket
+    urls get the ws/wss scheme matching `base_url`.
+    """
+    if not base_url:
+        return url
+    parts = urlsplit(url)
+    base = urlsplit(base_url)
+    scheme = base.scheme
+    if parts.scheme in ("ws", "wss"):
+        scheme = "wss" if base.scheme == "https" else "ws"
+    return urlunsplit((scheme, base.netloc, parts.path, parts.query, parts.fragment))
@@ -0,0 +1,259 @@
+"""
+Contains the asyncio websocket consumer owning feed connections, with
+bounded queues, off-loop decoding and automatic reconnects
+"""
+import json
+import time
+import random
+import asyncio
+import threading
+from collections import deque
+import aiohttp
+from .logging import log_response
+
+DROP_POLICIES = ("oldest", "newest")
+# Seconds FeedConnection.send waits for a frame to be written
+SEND_TIMEOUT = 5.0
+
+
+class QueueClosed(Exception):
+    pass
+
+
+class BoundedQueue:
+
+    def __init__(self, maxsize=10000, drop="oldest"):
+        """
+        Thread safe queue whose put never blocks. When full, `drop`
+        decides whether the oldest queued item or the incoming one is
+        discarded, and the loss is counted in `dropped`.
+        """
+        if drop not in DROP_POLICIES:
+            raise ValueError(f"drop must be one of {DROP_POLICIES}")
+        self.items = deque()
+        self.maxsize = maxsize
+        self.drop = drop
+        self.cond = threading.Condition()
+        self.closed = False
+        self.dropped = 0
+
+    def put(self, item):
+        with self.cond:
+            if len(self.items) >= self.maxsize:
+                self.dropped += 1
+                if self.drop == "newest":
+                    return
+                self.items.popleft()
+            self.items.append(item)
+            self.cond.notify()
+
+    def get(self, timeout=None):
+        """Next item, None on timeout. Raises QueueClosed once closed and drained."""
+        with self.cond:
+            deadline = None if timeout is None else time.monotonic() + timeout
+            while not self.items:
+                if self.closed:
+                    raise QueueClosed
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return None
+                self.cond.wait(remaining)
+            return self.items.popleft()
+
+    def close(self):
+        with self.cond:
+            self.closed = True
+            self.cond.notify_all()
+
+    def __len__(self):
+        return len(self.items)
+
+
+class FeedConnection:
+
+    def __init__(self, name, url, payloads=None, decode=json.loads):
+        """
+        One websocket of the consumer. `url` and `payloads` may be
+        callables: they are evaluated again on every reconnect so a
+        refreshed token and the current subscriptions are used.
+        """
+        self.name = name
+        self.url = url
+        self.payloads = payloads or []
+        self.decode = decode
+        self.ws = None
+        self.loop = None
+        self.connects = 0
+        self.messages = 0
+        self.decode_errors = 0
+
+    def current_url(self):
+        return self.url() if callable(self.url) else self.url
+
+    def current_payloads(self):
+        return self.payloads() if callable(self.payloads) else self.payloads
+
+    def send(self, payload, timeout=SEND_TIMEOUT):
+        """
+        Sends `payload` from any thread but the consumer's loop and waits
+        up to `timeout` seconds for the frame to be written. True once it
+        was, False when disconnected, failing or timing out. Payloads sent
+        while disconnected are not queued, the subscriptions are restored
+        through `payloads` on reconnect.
+        """
+        ws, loop = self.ws, self.loop
+        if ws is None or ws.closed or loop is None:
+            return False
+        future = asyncio.run_coroutine_threadsafe(ws.send_str(json.dumps(payload)), loop)
+        try:
+            future.result(timeout)
+        except Exception as e:
+            future.cancel()
+            log_response(f"{self.name} send failed: {e!r}")
+            return False
+        return True
+
+    @property
+    def connected(self):
+        return self.ws is not None and not self.ws.closed
+
+
+class AsyncFeedConsumer:
+
+    def __init__(self, maxsize=10000, drop="oldest", reconnect_delay=0.5,
+                 max_reconnect_delay=30, heartbeat=30):
+        """
+        Owns any number of feed websockets on one event loop running in a
+        background thread. The loop only reads sockets and hands raw frames
+        to a decoder thread through a bounded queue, decoded messages land
+        in `messages` as (connection name, message). Both queues drop
+        instead of blocking, so a slow consumer never stalls socket reads.
+        Dropped connections reconnect with jittered exponential backoff and
+        re-send their subscription payloads.
+        """
+        self.raw = BoundedQueue(maxsize, drop)
+        self.messages = BoundedQueue(maxsize, drop)
+        self.reconnect_delay = reconnect_delay
+        self.max_reconnect_delay = max_reconnect_delay
+        self.heartbeat = heartbeat
+        self.connections = {}
+        self.loop = None
+        self.thread = None
+        self.decoder = None
+        self.tasks = {}
+        self.stopping = False
+
+    def add(self, name, url, payloads=None, decode=json.loads):
+        connection = FeedConnection(name, url, payloads, decode)
+        self.connections[name] = connection
+        if self.loop is not None:
+            connection.loop = self.loop
+            self.loop.call_soon_threadsafe(self._spawn, connection)
+        return connection
+
+    def add_market_feed(self, client, subscriptions, name="market_feed"):
+        """MarketFeedV3 socket of `client`, kept subscribed to `subscriptions` (a SubscriptionManager)."""
+        connection = self.add(name, client.feed_url, subscriptions.resubscribe_payloads)
+        subscriptions._send = connection.send
+        return connection
+
+    def add_depth_feed(self, client, payload, name="depth_feed"):
+        """
+        20 level depth socket of `client` subscribed with `payload`, or with
+        the payloads a callable `payload` returns on every (re)connect.
+        """
+        return self.add(name, client.depth_feed_url, payload if callable(payload) else [payload])
+
+    def _spawn(self, connection):
+        self.tasks[connection.name] = self.loop.create_task(self._run_connection(connection))
+
+    def backoff(self, attempt):
+        delay = min(self.max_reconnect_delay, self.reconnect_delay * 2 ** attempt)
+        return delay * random.uniform(0.5, 1)
+
+    async def _run_connection(self, connection):
+        attempt = 0
+        async with aiohttp.ClientSession() as session:
+            while not self.stopping:
+                try:
+                    url = await self.loop.run_in_executor(None, connection.current_url)
+                    async with session.ws_connect(url, heartbeat=self.heartbeat) as ws:
+                        connection.ws = ws
+                        connection.connects += 1
+                        attempt = 0
+                        for payload in connection.current_payloads():
+                            await ws.send_str(json.dumps(payload))
+                        async for frame in ws:
+                            if frame.type in (aiohttp.WSMsgType.TEXT, aiohttp.WSMsgType.BINARY):
+                                connection.messages += 1
+                                self.raw.put((connection, frame.data))
+                            elif frame.type == aiohttp.WSMsgType.ERROR:
+                                break
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    log_response(e)
+                finally:
+                    connection.ws = None
+                if self.stopping:
+                    break
+                await asyncio.sleep(self.backoff(attempt))
+                attempt += 1
+
+    def _decode(self):
+        while True:
+            try:
+                connection, data = self.raw.get()
+            except QueueClosed:
+                return
+            try:
+                message = connection.decode(data)
+            except Exception:
+                connection.decode_errors += 1
+                continue
+            self.messages.put((connection.name, message))
+
+    def start(self):
+        self.stopping = False
+        self.loop = asyncio.new_event_loop()
+        for connection in self.connections.values():
+            connection.loop = self.loop
+            self.loop.call_soon(self._spawn, connection)
+        self.thread = threading.Thread(target=self.loop.run_forever, daemon=True)
+        self.thread.start()
+        self.decoder = threading.Thread(target=self._decode, daemon=True)
+        self.decoder.start()
+        return self
+
+    def get(self, timeout=None):
+        """Next (connection name, message), None on timeout."""
+        return self.messages.get(timeout)
+
+    def stop(self):
+        if self.loop is None:
+            return
+        self.stopping = True
+
+        async def cancel():
+            for task in self.tasks.values():
+                task.cancel()
+            await asyncio.gather(*self.tasks.values(), return_exceptions=True)
+
+        asyncio.run_coroutine_threadsafe(cancel(), self.loop).result()
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join()
+        self.loop.close()
+        self.loop = None
+        self.raw.close()
+        self.messages.close()
+        self.decoder.join(timeout=1)
+
+    @property
+    def dropped(self):
+        return {"raw": self.raw.dropped, "messages": self.messages.dropped}
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
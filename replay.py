@@ -0,0 +1,134 @@
+"""
+Offline replay : feeds recorded spot/futures/option chain payloads through
+FetchOptionData.run without logging in, and reports the throughput.
+
+  python -m replay --archive DIR [--day 2023-03-16] [--index NIFTY] [--pace 1] [--no-render]
+  python -m replay --payloads ticks.jsonl [--pace 1] [--no-render]
+
+--archive reads a SnapshotRecorder archive (RECORD_DIR), --payloads a
+PayloadLog (RECORD_PAYLOADS). Without --pace payloads are replayed as
+fast as possible, --pace 2 replays at twice the recorded speed.
+"""
+import sys
+import json
+import math
+import time
+import argparse
+
+from snapshot_recorder import SnapshotArchive
+
+def archive_payloads(root, day=None, index=None):
+  """
+  (time, index, values) of every recorded snapshot, `values` rebuilt in
+  the shape of FetchEngine.fetch_all responses from the recorded rows.
+  Legs the recorder left blank are left out of the option chain.
+  """
+  archive = SnapshotArchive(root)
+  for segment_day in ([day] if day else archive.days()):
+    segment = archive.segment(segment_day)
+    for i in segment.positions(index):
+      record = segment.snapshot(i)
+      rows = record['rows']
+      options = []
+      for cp_type, ltp, oi in (('CE', rows['ce_ltp'], rows['ce_oi']), ('PE', rows['pe_ltp'], rows['pe_oi'])):
+        for strike, last_rate, open_interest in zip(rows['strike'].tolist(), ltp.tolist(), oi.tolist()):
+          if not math.isnan(last_rate):
+            options.append({'CPType' : cp_type, 'StrikeRate' : strike,
+                            'LastRate' : round(last_rate, 2), 'OpenInterest' : open_interest})
+      yield record['time']/1000, record['index'], {
+        'SPOT' : {'lastrate' : [{'LTP' : record['spot']}]},
+        'FUTURES' : {'Data' : [{'Mid' if record.get('futures_mid') else 'LastTradedPrice' : record['futures']}]},
+        'OPTION_CHAIN' : {'Options' : options}}
+
+def jsonl_payloads(path, index=None):
+  """(time, index, values) of every line of a PayloadLog file."""
+  with open(path) as f:
+    for line in f:
+      if not line.strip():
+        continue
+      tick = json.loads(line)
+      if index is not None and tick['index'] != index:
+        continue
+      yield tick['time'], tick['index'], {
+        'SPOT' : tick['spot'],
+        'FUTURES' : tick['futures'],
+        'OPTION_CHAIN' : tick['option_chain']}
+
+
+class ReplayReport:
+  def __init__(self, snapshots, failed, elapsed):
+    self.snapshots = snapshots
+    self.failed = failed
+    self.elapsed = elapsed
+
+  @property
+  def snapshots_per_second(self):
+    return self.snapshots / self.elapsed if self.elapsed else 0.0
+
+  def __str__(self):
+    return (f'{self.snapshots} snapshots ({self.failed} failed) in {self.elapsed:.3f}s : '
+            f'{self.snapshots_per_second:.1f} snapshots/s')
+
+
+class ReplayEngine:
+  """
+  Runs recorded payloads through `scanner` (a FetchOptionData, typically
+  FetchOptionData.offline()). With `render` each snapshot goes through
+  run() and the HTML table renderer like a live tick, otherwise only
+  through compute(). `pace` replays at that multiple of the recorded
+  speed, None as fast as possible. `on_tick(index, output)` receives each
+  result.
+  """
+  def __init__(self, scanner, payloads, render=True, pace=None, on_tick=None):
+    self.scanner = scanner
+    self.payloads = payloads
+    self.render = render
+    self.pace = pace
+    self.on_tick = on_tick
+
+  def run(self):
+    snapshots = failed = 0
+    first_recorded = None
+    started = time.perf_counter()
+    for recorded, index, values in self.payloads:
+      if self.pace:
+        if first_recorded is None:
+          first_recorded = recorded
+        wait = (recorded - first_recorded)/self.pace - (time.perf_counter() - started)
+        if wait > 0:
+          time.sleep(wait)
+      if self.render:
+        _, output = self.scanner.run(index, values['SPOT'], values['FUTURES'], values['OPTION_CHAIN'])
+      else:
+        output = self.scanner.snapshot(index, values['SPOT'], values['FUTURES'], values['OPTION_CHAIN'])
+      snapshots += 1
+      failed += output is None
+      if self.on_tick is not None:
+        self.on_tick(index, output)
+    return ReplayReport(snapshots, failed, time.perf_counter() - started)
+
+
+def main(argv=None):
+  parser = argparse.ArgumentParser(description='Replay recorded option chain payloads offline')
+  source = parser.add_mutually_exclusive_group(required=True)
+  source.add_argument('--archive', help='SnapshotRecorder archive directory')
+  source.add_argument('--payloads', help='PayloadLog JSON lines file')
+  parser.add_argument('--day', help='archive segment to replay, every day by default')
+  parser.add_argument('--index', help='replay a single index')
+  parser.add_argument('--pace', type=float, help='multiple of the recorded speed, as fast as possible by default')
+  parser.add_argument('--window', type=int, help='STRIKE_WINDOW of the scanner')
+  parser.add_argument('--no-render', action='store_true', help='compute only, skip the HTML tables')
+  args = parser.parse_args(argv)
+
+  from discount_check import FetchOptionData, STRIKE_WINDOW
+  scanner = FetchOptionData.offline(STRIKE_WINDOW=STRIKE_WINDOW if args.window is None else args.window)
+  if args.archive:
+    payloads = archive_payloads(args.archive, args.day, args.index)
+  else:
+    payloads = jsonl_payloads(args.payloads, args.index)
+  print(ReplayEngine(scanner, payloads, render=not args.no_render, pace=args.pace).run())
+  return 0
+
+
+if __name__ == '__main__':
+  sys.exit(main())
@@ -0,0 +1,308 @@
+import os
+import json
+import time
+import datetime
+import threading
+import numpy as np
+
+# One file per column. A snapshot points at its strike rows through
+# row_start/row_count, compact dtypes keep a row at 29 bytes.
+SNAPSHOT_COLUMNS = {
+  'time' : 'i8',          # epoch milliseconds
+  'index' : 'u1',         # position in the segment's meta.json indices
+  'spot' : 'f8',
+  'futures' : 'f8',
+  'futures_mid' : 'u1',   # 1 when futures is an order book mid, not a traded price
+  'atm_strike' : 'f4',
+  'call_premium' : 'f4',
+  'put_premium' : 'f4',
+  'row_start' : 'i8',
+  'row_count' : 'u2'}
+
+ROW_COLUMNS = {
+  'strike' : 'f4',
+  'ce_ltp' : 'f4',
+  'pe_ltp' : 'f4',
+  'ce_premium' : 'f4',
+  'pe_premium' : 'f4',
+  'discount' : 'u1',
+  'ce_oi' : 'i4',
+  'pe_oi' : 'i4'}
+
+def segment_name(timestamp):
+  return datetime.date.fromtimestamp(timestamp).isoformat()
+
+def _buffers(columns, capacity):
+  return {name : np.empty(capacity, dtype=dtype) for name, dtype in columns.items()}
+
+
+class SnapshotRecorder:
+  """
+  Appends every IndexSnapshot to a columnar archive under `root`, one
+  directory per day :
+
+    root/2023-03-16/meta.json
+    root/2023-03-16/snapshots/<column>.bin
+    root/2023-03-16/rows/<column>.bin
+
+  Snapshots are copied into preallocated buffers and written out in bulk
+  once `flush_rows` rows are pending or `flush_interval` seconds passed,
+  so recording a tick costs a few array copies. Read the archive back
+  with SnapshotArchive.
+  """
+  def __init__(self, root, flush_rows=8192, flush_interval=1.0):
+    self.root = root
+    self.flush_rows = flush_rows
+    self.flush_interval = flush_interval
+    self.lock = threading.Lock()
+    self.rows = _buffers(ROW_COLUMNS, flush_rows)
+    self.snapshots = _buffers(SNAPSHOT_COLUMNS, flush_rows)
+    self.n_rows = 0
+    self.n_snapshots = 0
+    self.segment = None
+    self.files = {}
+    self.indices = []
+    self.segment_rows = 0
+    self.last_flush = time.monotonic()
+    self.recorded = 0
+
+  def _open_segment(self, name):
+    path = os.path.join(self.root, name)
+    for table in ('snapshots', 'rows'):
+      os.makedirs(os.path.join(path, table), exist_ok=True)
+    meta = self._read_meta(path)
+    self.indices = meta['indices']
+    self.files = {}
+    for table, columns in (('snapshots', SNAPSHOT_COLUMNS), ('rows', ROW_COLUMNS)):
+      for column in columns:
+        self.files[table, column] = open(os.path.join(path, table, column + '.bin'), 'ab')
+    self._pad_new_columns(meta)
+    # Rows already in the segment, row_start keeps counting from there
+    self.segment_rows = self.files['rows', 'strike'].tell() // np.dtype(ROW_COLUMNS['strike']).itemsize
+    self.segment = name
+    self._write_meta()
+
+  def _pad_new_columns(self, meta):
+    # Snapshot columns added since the segment was started get zeros for
+    # its earlier snapshots, so every column keeps the same length
+    if 'snapshots' not in meta:
+      return
+    count = self.files['snapshots', 'time'].tell() // np.dtype(SNAPSHOT_COLUMNS['time']).itemsize
+    for column, dtype in SNAPSHOT_COLUMNS.items():
+      if column not in meta['snapshots']:
+        f = self.files['snapshots', column]
+        f.write(np.zeros(count - f.tell() // np.dtype(dtype).itemsize, dtype=dtype).tobytes())
+        f.flush()
+
+  def _read_meta(self, path):
+    try:
+      with open(os.path.join(path, 'meta.json')) as f:
+        return json.load(f)
+    except FileNotFoundError:
+      return {'indices' : []}
+
+  def _write_meta(self):
+    meta = {'indices' : self.indices, 'snapshots' : SNAPSHOT_COLUMNS, 'rows' : ROW_COLUMNS}
+    path = os.path.join(self.root, self.segment, 'meta.json')
+    with open(path + '.tmp', 'w') as f:
+      json.dump(meta, f)
+    os.replace(path + '.tmp', path)
+
+  def _close_segment(self):
+    for f in self.files.values():
+      f.close()
+    self.files = {}
+    self.segment = None
+
+  def _index_code(self, index):
+    if index not in self.indices:
+      self.indices.append(index)
+      self._write_meta()
+    return self.indices.index(index)
+
+  def _grow(self, rows):
+    capacity = max(rows, 2*len(self.rows['strike']))
+    for name, buf in self.rows.items():
+      grown = np.empty(capacity, dtype=buf.dtype)
+      grown[:self.n_rows] = buf[:self.n_rows]
+      self.rows[name] = grown
+
+  def record(self, snapshot, timestamp=None):
+    timestamp = time.time() if timestamp is None else timestamp
+    result = snapshot.result
+    n = len(result.strikes)
+    with self.lock:
+      name = segment_name(timestamp)
+      if name != self.segment:
+        self._flush()
+        self._close_segment()
+        self._open_segment(name)
+      if self.n_rows + n > len(self.rows['strike']) or self.n_snapshots == len(self.snapshots['time']):
+        self._flush()
+        if n > len(self.rows['strike']):
+          self._grow(n)
+
+      i, lo, hi = self.n_snapshots, self.n_rows, self.n_rows + n
+      rows = self.rows
+      rows['strike'][lo:hi] = result.strikes
+      rows['ce_ltp'][lo:hi] = result.ce_ltp
+      rows['pe_ltp'][lo:hi] = result.pe_ltp
+      rows['ce_premium'][lo:hi] = result.ce_premium
+      rows['pe_premium'][lo:hi] = result.pe_premium
+      rows['discount'][lo:hi] = result.discount
+      rows['ce_oi'][lo:hi] = 0 if result.ce_oi is None else result.ce_oi
+      rows['pe_oi'][lo:hi] = 0 if result.pe_oi is None else result.pe_oi
+
+      snapshots = self.snapshots
+      snapshots['time'][i] = int(timestamp*1000)
+      snapshots['index'][i] = self._index_code(snapshot.index)
+      snapshots['spot'][i] = snapshot.spot_value
+      snapshots['futures'][i] = snapshot.futures_value
+      snapshots['futures_mid'][i] = snapshot.futures_source == 'mid'
+      snapshots['atm_strike'][i] = result.strikes[result.atm] if n else np.nan
+      snapshots['call_premium'][i] = snapshot.call_premium
+      snapshots['put_premium'][i] = snapshot.put_premium
+      snapshots['row_start'][i] = self.segment_rows + lo
+      snapshots['row_count'][i] = n
+      self.n_rows, self.n_snapshots = hi, i + 1
+      self.recorded += 1
+
+      if time.monotonic() - self.last_flush >= self.flush_interval:
+        self._flush()
+
+  def record_all(self, snapshots, timestamp=None):
+    """Records every non None snapshot of a tick's {index : snapshot} dict."""
+    timestamp = time.time() if timestamp is None else timestamp
+    for snapshot in snapshots.values():
+      if snapshot is not None:
+        self.record(snapshot, timestamp)
+
+  def _flush(self):
+    self.last_flush = time.monotonic()
+    if self.segment is None or self.n_snapshots == 0:
+      return
+    # Rows land before the snapshots pointing at them, so a concurrent
+    # reader never sees a snapshot without its rows
+    for table, buffers, n in (('rows', self.rows, self.n_rows), ('snapshots', self.snapshots, self.n_snapshots)):
+      for column, buf in buffers.items():
+        f = self.files[table, column]
+        f.write(buf[:n].tobytes())
+        f.flush()
+    self.segment_rows += self.n_rows
+    self.n_rows = self.n_snapshots = 0
+
+  def flush(self):
+    with self.lock:
+      self._flush()
+
+  def close(self):
+    with self.lock:
+      self._flush()
+      self._close_segment()
+
+  def __enter__(self):
+    return self
+
+  def __exit__(self, *exc):
+    self.close()
+
+
+def _memmap(path, dtype):
+  # Whole values only, a write in progress may have left part of one
+  count = os.path.getsize(path) // np.dtype(dtype).itemsize if os.path.exists(path) else 0
+  if count == 0:
+    return np.empty(0, dtype=dtype)
+  return np.memmap(path, dtype=dtype, mode='r', shape=(count,))
+
+
+class Segment:
+  """
+  One day of an archive, every column memory-mapped read only. Snapshot
+  columns are indexed by snapshot, row columns by strike row.
+  """
+  def __init__(self, path):
+    self.path = path
+    with open(os.path.join(path, 'meta.json')) as f:
+      meta = json.load(f)
+    self.indices = meta['indices']
+    self.rows = {column : _memmap(os.path.join(path, 'rows', column + '.bin'), dtype)
+                 for column, dtype in meta['rows'].items()}
+    snapshots = {column : _memmap(os.path.join(path, 'snapshots', column + '.bin'), dtype)
+                 for column, dtype in meta['snapshots'].items()}
+    # A segment still being written may hold a partially flushed column
+    n = min(len(column) for column in snapshots.values())
+    self.snapshots = {column : values[:n] for column, values in snapshots.items()}
+
+  def __len__(self):
+    return len(self.snapshots['time'])
+
+  def positions(self, index=None):
+    """Snapshot positions, of one index only when given."""
+    if index is None:
+      return np.arange(len(self))
+    if index not in self.indices:
+      return np.empty(0, dtype=np.int64)
+    return np.flatnonzero(self.snapshots['index'] == self.indices.index(index))
+
+  def snapshot(self, i):
+    """Snapshot fields and strike rows of snapshot `i` as plain values and arrays."""
+    record = {column : values[i].item() for column, values in self.snapshots.items()}
+    record['index'] = self.indices[record['index']]
+    lo = record['row_start']
+    hi = lo + record['row_count']
+    record['rows'] = {column : values[lo:hi] for column, values in self.rows.items()}
+    return record
+
+  def __iter__(self):
+    for i in range(len(self)):
+      yield self.snapshot(i)
+
+
+class SnapshotArchive:
+  """Daily segments written by SnapshotRecorder under `root`."""
+  def __init__(self, root):
+    self.root = root
+
+  def days(self):
+    if not os.path.isdir(self.root):
+      return []
+    return sorted(name for name in os.listdir(self.root)
+                  if os.path.exists(os.path.join(self.root, name, 'meta.json')))
+
+  def segment(self, day):
+    return Segment(os.path.join(self.root, day))
+
+  def __iter__(self):
+    for day in self.days():
+      yield from self.segment(day)
+
+
+class PayloadLog:
+  """
+  Raw fetch responses of every tick as JSON lines, one line per index :
+
+    {"time" : .., "index" : .., "spot" : .., "futures" : .., "option_chain" : ..}
+
+  Larger than the columnar archive but replays the exact broker payloads.
+  """
+  def __init__(self, path):
+    self.path = path
+    self.stream = open(path, 'a')
+
+  def write(self, index, values, timestamp=None):
+    self.stream.write(json.dumps({
+      'time' : time.time() if timestamp is None else timestamp,
+      'index' : index,
+      'spot' : values.get('SPOT'),
+      'futures' : values.get('FUTURES'),
+      'option_chain' : values.get('OPTION_CHAIN')}) + '\n')
+
+  def write_tick(self, values, timestamp=None):
+    """Writes every index of a FetchEngine.fetch_all result, then flushes."""
+    timestamp = time.time() if timestamp is None else timestamp
+    for index, index_values in values.items():
+      self.write(index, index_values, timestamp)
+    self.stream.flush()
+
+  def close(self):
+    self.stream.close()
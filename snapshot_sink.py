@@ -0,0 +1,101 @@
+import abc
+import csv
+import sys
+import json
+import math
+import time
+
+def _clean(values):
+  return [None if isinstance(v, float) and math.isnan(v) else v for v in values]
+
+def snapshot_record(snapshot, timestamp):
+  """
+  Plain dict of an IndexSnapshot, NaN legs become None so the record is
+  valid JSON.
+  """
+  result = snapshot.result
+  return {
+    'time' : timestamp,
+    'index' : snapshot.index,
+    'spot' : snapshot.spot_value,
+    'futures' : snapshot.futures_value,
+    'futures_source' : snapshot.futures_source,
+    'atm_strike' : float(result.strikes[result.atm]),
+    'call_premium' : snapshot.call_premium,
+    'put_premium' : snapshot.put_premium,
+    'cheap' : snapshot.cheap,
+    'percentage_diff' : snapshot.percentage_diff,
+    'strikes' : result.strikes.tolist(),
+    'ce_ltp' : _clean(result.ce_ltp.tolist()),
+    'pe_ltp' : _clean(result.pe_ltp.tolist()),
+    'ce_premium' : _clean(result.ce_premium.tolist()),
+    'pe_premium' : _clean(result.pe_premium.tolist()),
+    'discount' : result.discount.tolist()}
+
+
+class SnapshotSink(abc.ABC):
+  """
+  Writes every tick of FetchOptionData.stream() to a text stream. Indices
+  that failed on a tick are skipped and the stream is flushed once per
+  tick so a reader tailing the output sees whole ticks. Subclasses
+  write one snapshot in their format.
+  """
+  def __init__(self, stream):
+    self.stream = stream
+    self.ticks = 0
+
+  @abc.abstractmethod
+  def write_snapshot(self, snapshot, timestamp):
+    pass
+
+  def __call__(self, snapshots):
+    timestamp = time.time()
+    for snapshot in snapshots.values():
+      if snapshot is not None:
+        self.write_snapshot(snapshot, timestamp)
+    self.stream.flush()
+    self.ticks += 1
+
+  def close(self):
+    if self.stream is not sys.stdout:
+      self.stream.close()
+
+
+class JsonLinesSink(SnapshotSink):
+  """One JSON object per index and tick."""
+  def write_snapshot(self, snapshot, timestamp):
+    self.stream.write(json.dumps(snapshot_record(snapshot, timestamp)) + '\n')
+
+
+class CsvSink(SnapshotSink):
+  """One row per strike, the snapshot fields repeated on every row."""
+  COLUMNS = ['time', 'index', 'spot', 'futures', 'futures_source', 'atm_strike', 'strike',
+             'ce_ltp', 'pe_ltp', 'ce_premium', 'pe_premium', 'discount']
+
+  def __init__(self, stream, header=True):
+    super().__init__(stream)
+    self.writer = csv.writer(stream)
+    if header:
+      self.writer.writerow(self.COLUMNS)
+
+  def write_snapshot(self, snapshot, timestamp):
+    record = snapshot_record(snapshot, timestamp)
+    head = [timestamp, snapshot.index, snapshot.spot_value, snapshot.futures_value, snapshot.futures_source,
+            record['atm_strike']]
+    legs = zip(record['strikes'], record['ce_ltp'], record['pe_ltp'],
+               record['ce_premium'], record['pe_premium'], record['discount'])
+    self.writer.writerows(head + ['' if v is None else v for v in leg] for leg in legs)
+
+
+SINKS = {'jsonl' : JsonLinesSink, 'csv' : CsvSink}
+
+def open_sink(fmt='jsonl', path='-'):
+  if fmt not in SINKS:
+    raise ValueError(f'Unknown output format {fmt!r}, expected one of {sorted(SINKS)}')
+  if path in (None, '-'):
+    return SINKS[fmt](sys.stdout)
+  stream = open(path, 'a', newline='')
+  if fmt == 'csv':
+    # Appending to an existing file keeps its header
+    return CsvSink(stream, header=stream.tell() == 0)
+  return SINKS[fmt](stream)
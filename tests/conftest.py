@@ -0,0 +1,44 @@
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from benchmarks.fake_broker import FakeBroker
+from benchmarks.load_harness import CREDS, LOGIN, broker_expiries
+from py5paisa import FivePaisaClient
+
+
+@pytest.fixture
+def fake_broker():
+  """Starts FakeBroker(**options) answering without delay, stopped after the test."""
+  brokers = []
+
+  def start(**options):
+    options = dict({'latency' : 0.0, 'jitter' : 0.0, 'strikes_each_side' : 5, 'expiries' : broker_expiries()}, **options)
+    brokers.append(FakeBroker(**options).start())
+    return brokers[-1]
+
+  yield start
+  for broker in brokers:
+    broker.stop()
+
+
+@pytest.fixture
+def logged_in_client():
+  """Logs a FivePaisaClient(**options) in against a broker, closed after the test."""
+  clients = []
+
+  def login(broker, **options):
+    client = FivePaisaClient(*LOGIN, cred=CREDS, base_url=broker.url, **options)
+    client.login()
+    assert client.is_logged_in
+    clients.append(client)
+    return client
+
+  yield login
+  for client in clients:
+    client.stop_token_refresh()
+    client.transport.close()
@@ -0,0 +1,38 @@
+import asyncio
+
+from benchmarks.load_harness import OPT_EXPIRY, FUT_EXPIRY
+from fetch_engine import AsyncFetchEngine
+from py5paisa import getEpochTime
+from py5paisa.async_client import AsyncFivePaisaClient
+
+
+def test_async_client_answers_like_the_blocking_one(fake_broker, logged_in_client):
+  client = logged_in_client(fake_broker())
+  expiry = getEpochTime(OPT_EXPIRY)
+
+  async def fetch():
+    async with AsyncFivePaisaClient.from_client(client) as async_client:
+      return await asyncio.gather(async_client.get_expiry('N', 'NIFTY'),
+                                  async_client.get_option_chain('N', 'NIFTY', expiry))
+
+  spot, chain = asyncio.run(fetch())
+  # prices move between calls, the rest of the answer does not
+  assert spot['Expiry'] == client.get_expiry('N', 'NIFTY')['Expiry']
+  assert spot['lastrate'][0]['LTP'] > 0
+  sides = lambda chain : sorted(oc['CPType'] for oc in chain['Options'])
+  assert sides(chain) == sides(client.get_option_chain('N', 'NIFTY', expiry)) == ['CE'] * 11 + ['PE'] * 11
+
+
+def test_async_engine_fetches_a_tick_under_the_rate_limit(fake_broker, logged_in_client, tmp_path):
+  broker = fake_broker()
+  rate_limit = {'rates' : {'GE' : 50.0, 'GOC' : 50.0, 'MDS' : 50.0}, 'burst' : 1, 'path' : str(tmp_path / 'limit')}
+  client = logged_in_client(broker, transport={'rate_limit' : rate_limit})
+  jobs = [(index, FUT_EXPIRY, getEpochTime(OPT_EXPIRY)) for index in ('NIFTY', 'BANKNIFTY')]
+  with AsyncFetchEngine(client) as engine:
+    values = engine.fetch_all(jobs)
+  for index in ('NIFTY', 'BANKNIFTY'):
+    assert values[index]['SPOT']['lastrate'][0]['LTP'] > 0
+    assert values[index]['FUTURES']['Data'][0]['LastTradedPrice'] > 0
+    assert values[index]['OPTION_CHAIN']['Options']
+  # both indices ask every route at once : the second request of each waits for its slot
+  assert client.transport.stats()['rate_limit_delays'] == 3
@@ -0,0 +1,133 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from discount_check import FetchOptionData
+from discount_engine import OptionChainArrays, IndexSnapshot, compute_discount
+from html_renderer import TableRenderer
+from snapshot_sink import snapshot_record
+from benchmarks.synthetic import SPOTS, STEPS, option_chain, spot_response, futures_response
+
+
+def test_whole_chain_strikes_come_from_the_chain():
+  scanner = FetchOptionData.offline(STRIKE_WINDOW=None)
+  chain = OptionChainArrays.from_options(option_chain('NIFTY', 10, spot=17400)['Options'])
+  atm, calls, puts = scanner.getStrikes('NIFTY', 17432.35, chain)
+  strikes = np.union1d(chain.call_strikes, chain.put_strikes)
+  assert atm == 17450
+  assert list(calls) == list(strikes[strikes <= 17500])
+  assert list(puts) == list(strikes[strikes >= 17400])
+  with pytest.raises(ValueError):
+    scanner.getStrikes('NIFTY', 17432.35)
+
+
+def test_window_strikes_are_unchanged():
+  atm, calls, puts = FetchOptionData.offline(STRIKE_WINDOW=2).getStrikes('NIFTY', 17432.35)
+  assert (atm, list(calls), list(puts)) == (17450, [17350, 17400, 17450, 17500], [17400, 17450, 17500, 17550])
+
+
+def test_book_mid_futures_are_labelled_mid():
+  scanner = FetchOptionData.offline(STRIKE_WINDOW=5)
+  spot, chain = spot_response('NIFTY', 17432.35), option_chain('NIFTY', 10, spot=17432.35)
+  traded = scanner.compute('NIFTY', spot, futures_response('NIFTY', 17432.35), chain)
+  booked = scanner.compute('NIFTY', spot, {'Data' : [{'Mid' : 17480.5, 'ScripCode' : 35001}]}, chain)
+  assert (traded.futures_source, booked.futures_source, booked.futures_value) == ('ltp', 'mid', 17480.5)
+  assert snapshot_record(booked, 0)['futures_source'] == 'mid'
+  assert 'Fut mid : 17480.5' in TableRenderer().captions(booked)[1]
+  assert 'Fut : ' in TableRenderer().captions(traded)[1]
+
+
+def legacy_strikes(index, spot):
+  # getStrikes before the strike window, ten strikes each side
+  step = 11
+  spot_diff = 1000 if index == 'BANKNIFTY' else 500
+  rem = spot%100
+  if index == 'BANKNIFTY':
+    spot = spot-rem if rem < 50 else spot+(100-rem)
+  else:
+    if rem <= 24:
+      spot = spot-rem
+    elif rem >= 25 and rem <= 74:
+      if rem <= 50:
+        spot = spot + (50 - rem)
+      else:
+        spot = spot - (rem - 50)
+    elif rem >= 75:
+      spot = spot+(100-rem)
+
+  call_strikes = np.linspace(spot-spot_diff, spot, step)
+  put_strikes = np.linspace(spot, spot+spot_diff, step)
+
+  if index == 'BANKNIFTY':
+    call_strikes = np.append(call_strikes, [call_strikes[-1]+100])
+    put_strikes = np.insert(put_strikes, 0, put_strikes[0]-100)
+  else:
+    call_strikes = np.append(call_strikes, [call_strikes[-1]+50])
+    put_strikes = np.insert(put_strikes, 0, put_strikes[0]-50)
+
+  return spot, call_strikes, put_strikes
+
+def legacy_table(index, spot_value, option_chain):
+  """The DataFrame FetchOptionData.run built before compute_discount, ATM label included."""
+  refined_spot, call_strikes, put_strikes = legacy_strikes(index, spot_value)
+  call_strike_ltp_map = {'Strikes':[], 'CE LTP':[]}
+  put_strike_ltp_map = {'Strikes':[], 'PE LTP':[]}
+
+  for oc in option_chain:
+    if oc['CPType'] == 'CE' and oc['StrikeRate'] in call_strikes:
+      call_strike_ltp_map['Strikes'].append(oc['StrikeRate'])
+      call_strike_ltp_map['CE LTP'].append(oc['LastRate'])
+    if oc['CPType'] == 'PE' and oc['StrikeRate'] in put_strikes:
+      put_strike_ltp_map['Strikes'].append(oc['StrikeRate'])
+      put_strike_ltp_map['PE LTP'].append(oc['LastRate'])
+
+  call_df = pd.DataFrame(call_strike_ltp_map)
+  call_df['CE IV'] = spot_value - call_df['Strikes']
+  call_df['CE Premium'] = np.where(call_df['CE IV'] <= 0, call_df['CE LTP'], call_df['CE LTP']-call_df['CE IV'])
+  call_df['CE Premium'] = np.where(call_df['CE LTP'] == 0, 0, call_df['CE Premium'])
+
+  put_df = pd.DataFrame(put_strike_ltp_map)
+  put_df['PE IV'] = put_df['Strikes'] - spot_value
+  put_df['PE Premium'] = np.where(put_df['PE IV'] <= 0, put_df['PE LTP'], put_df['PE LTP']-put_df['PE IV'])
+  put_df['PE Premium'] = np.where(put_df['PE LTP'] == 0, 0, put_df['PE Premium'])
+
+  df = pd.merge(call_df, put_df, on='Strikes', how='outer')
+  call_premium = float(df.iloc[10].iloc[3])
+  put_premium = float(df.iloc[10].iloc[-1])
+
+  max_value = max(call_premium, put_premium)
+  min_value = min(call_premium, put_premium)
+  percentage_diff = round(((max_value - min_value)/max_value)*100, 2)
+
+  df['Discount'] = np.where(((df['CE LTP'] < df['CE IV']) | (df['PE LTP'] < df['PE IV'])) & (df['CE Premium'] != 0) & (df['PE Premium'] != 0), 'Discount', ' ')
+  df['Discount'] = np.where(df['Strikes'] == refined_spot, str(round(abs(call_premium - put_premium),2)) + f'<br>({percentage_diff}%)', df['Discount'])
+
+  df.fillna(' ', inplace=True)
+  return df[['Strikes','CE LTP', 'PE LTP', 'CE Premium', 'PE Premium', 'Discount']]
+
+def snapshot_of(index, spot_value, options, window=10):
+  scanner = FetchOptionData.offline(STRIKE_WINDOW=window)
+  chain = OptionChainArrays.from_options(options)
+  atm = scanner.getATMStrike(index, spot_value)
+  result = compute_discount(spot_value, chain, atm, STEPS[index], window)
+  return IndexSnapshot(index, spot_value, spot_value, result)
+
+
+@pytest.mark.parametrize('index', ['NIFTY', 'BANKNIFTY', 'FINNIFTY'])
+def test_compute_discount_matches_the_pandas_loop(index):
+  spot_value = SPOTS[index]
+  for seed in range(200):
+    options = option_chain(index, 15, seed=seed)['Options']
+    snapshot = snapshot_of(index, spot_value, options)
+    expected = legacy_table(index, spot_value, options)
+    actual = snapshot.result.to_frame(snapshot.atm_label)
+    pd.testing.assert_frame_equal(actual, expected, check_dtype=False)
+
+
+def test_missing_atm_leg_leaves_the_label_blank():
+  spot_value = SPOTS['NIFTY']
+  options = [oc for oc in option_chain('NIFTY', 15)['Options']
+             if not (oc['CPType'] == 'CE' and oc['StrikeRate'] == 17450)]
+  snapshot = snapshot_of('NIFTY', spot_value, options)
+  assert snapshot.atm_label == '-'
+  assert 'nan' not in TableRenderer().render(snapshot, 'nifty')
@@ -0,0 +1,43 @@
+from fetch_engine import FetchEngine
+from benchmarks.load_harness import CREDS
+from py5paisa import metrics_registry
+from py5paisa.metrics import MetricsRegistry
+
+
+def test_changes_merge_only_new_durations():
+  worker, parent, reported = MetricsRegistry(), MetricsRegistry(), {}
+  for seconds in (0.01, 0.02):
+    worker.record('route', seconds)
+  parent.merge(worker.changes(reported))
+  worker.record('route', 0.5)
+  parent.merge(worker.changes(reported))
+  assert worker.changes(reported) == {}
+
+  merged, recorded = parent.histogram('route'), worker.histogram('route')
+  assert merged.counts == recorded.counts
+  assert (merged.count, merged.min, merged.max) == (3, 0.01, 0.5)
+  assert abs(merged.total - 0.53) < 1e-9
+
+
+def test_process_engine_reports_worker_route_timings(fake_broker, logged_in_client):
+  client = logged_in_client(fake_broker())
+  metrics_registry.reset()
+  with FetchEngine(client, CREDS, processes=2) as engine:
+    engine.fetch_all([('NIFTY', '30 MAR 2023', 1678962600000), ('BANKNIFTY', '30 MAR 2023', 1678962600000)])
+  summary = metrics_registry.summary()
+  for route in ('GE', 'GOC', 'MDS'):
+    assert summary['order_request.' + route]['count'] == 2
+    assert summary['transport.' + route]['count'] == 2
+  assert summary['login']['count'] == 0
+
+
+def test_process_engine_reports_worker_hedges(fake_broker, logged_in_client):
+  client = logged_in_client(fake_broker(tail_rate=0.2, tail_latency=0.2),
+                            transport={'hedge' : True, 'hedge_min_samples' : 1})
+  jobs = [('NIFTY', '30 MAR 2023', 1678962600000), ('BANKNIFTY', '30 MAR 2023', 1678962600000)]
+  with FetchEngine(client, CREDS, processes=2) as engine:
+    for _ in range(5):
+      engine.fetch_all(jobs)
+  stats = client.transport.stats()
+  assert stats['requests'] >= 30
+  assert stats['hedgeable'] > 0 and stats['hedges'] > 0
@@ -0,0 +1,67 @@
+import threading
+
+from py5paisa.order import Basket_order, Bo_co_order
+
+
+SYMBOLS = ('NIFTY', 'BANKNIFTY', 'FINNIFTY')
+
+
+def test_interleaved_requests_send_their_own_payload(fake_broker, logged_in_client):
+  client = logged_in_client(fake_broker(echo=True))
+  mismatches = []
+  barrier = threading.Barrier(8)
+
+  def option_chains(worker):
+    barrier.wait()
+    for i in range(25):
+      symbol, expiry = SYMBOLS[i % 3], 1700000000000 + worker * 100 + i
+      body = client.get_option_chain('N', symbol, expiry)
+      sent = body['Echo']['body']
+      if (sent['Symbol'], sent['ExpiryDate']) != (symbol, f'/Date({expiry})/') or 'Data' in sent:
+        mismatches.append(sent)
+
+  def market_depths(worker):
+    barrier.wait()
+    for i in range(25):
+      request = [{'Exchange' : 'N', 'ExchangeType' : 'D', 'Symbol' : f'DEPTH{worker}-{i}'}]
+      body = client.fetch_market_depth_by_symbol(request)
+      sent = body['Echo']['body']
+      if sent['Data'] != request or 'Symbol' in sent:
+        mismatches.append(sent)
+
+  def run(calls, worker):
+    try:
+      calls(worker)
+    except Exception as e:
+      mismatches.append(e)
+
+  threads = [threading.Thread(target=run, args=(option_chains if worker % 2 else market_depths, worker))
+             for worker in range(8)]
+  for thread in threads:
+    thread.start()
+  for thread in threads:
+    thread.join()
+  assert mismatches == []
+
+
+def test_staged_payloads_are_not_shared(fake_broker, logged_in_client):
+  client = logged_in_client(fake_broker(echo=True))
+  first = client.set_payload({'ScripCode' : 1660, 'Qty' : 1})
+  second = client.set_basket_payload(Basket_order('N', 'C', 0, 'BUY', 1, '1660', 'I'), ['7'])
+  assert 'BasketIDs' not in first and second['BasketIDs'] == ['7']
+
+  sent = client.order_request('MS')['Echo']['body']
+  assert 'ScripCode' not in sent and 'BasketIDs' not in sent
+
+
+def test_order_methods_send_the_staged_body(fake_broker, logged_in_client):
+  client = logged_in_client(fake_broker(echo=True))
+  boco = client.set_payload_bo(Bo_co_order(1660, 1, 100.0, 0, 110.0, 'B', 'N', 'C', 'P', 95.0, 96.0))
+  sent = client.bo_order(boco, ScripCode=1660, Exchange='N', OrderType='B', Qty=2, ExchangeType='C')['Echo']['body']
+  assert (sent['LimitPriceProfitOrder'], sent['TriggerPriceForSL'], sent['Qty']) == (110.0, 96.0, 2)
+
+  staged = client.set_payload({'RemoteOrderID' : 'R1', 'Price' : 0})
+  sent = client.place_order(staged, ScripCode=1660, Exchange='N', OrderType='B', Qty=1, ExchangeType='C',
+                            Price=101)['Echo']['body']
+  assert (sent['RemoteOrderID'], sent['Price']) == ('R1', 101)
+  assert staged['Price'] == 0
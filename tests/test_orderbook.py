@@ -0,0 +1,50 @@
+import time
+import random
+
+from futures_depth import FuturesDepth
+from py5paisa.orderbook import Ladder, OrderBooks, depth_levels
+
+
+def random_levels(rng):
+  levels = {}
+  for _ in range(rng.randint(0, 30)):
+    price = round(100 + rng.randint(-30, 30) * 0.05, 2)
+    levels[price] = (price, rng.choice([0, 1, 5, 50]), rng.randint(0, 9))
+  return list(levels.values())
+
+
+def test_apply_matches_a_full_replace():
+  rng = random.Random(7)
+  for descending in (True, False):
+    applied, replaced = Ladder(descending), Ladder(descending)
+    for _ in range(500):
+      levels = random_levels(rng)
+      applied.apply(levels)
+      replaced.replace(levels)
+      assert applied.levels() == replaced.levels()
+
+
+def test_ingest_updates_only_changed_levels():
+  books = OrderBooks()
+  details = [{'Price' : 100 - i, 'Quantity' : 10, 'NumberOfOrders' : 1, 'BbBuySellFlag' : 66} for i in range(20)]
+  details += [{'Price' : 101 + i, 'Quantity' : 10, 'NumberOfOrders' : 1, 'BbBuySellFlag' : 83} for i in range(20)]
+  books.ingest({'Token' : 1, 'Details' : details})
+  details[0] = dict(details[0], Quantity=30)
+  assert books[1].apply(*depth_levels(details)) == 1
+  quote = books.quote(1)
+  assert (quote['bid'], quote['ask'], quote['bid_qty'], quote['spread']) == (100, 101, 30, 1)
+
+
+def test_futures_come_from_the_depth_feed(fake_broker, logged_in_client):
+  client = logged_in_client(fake_broker(tick_interval=0.05))
+  depth = FuturesDepth(client)
+  try:
+    assert depth.futures('NIFTY') is None
+    depth.watch({'NIFTY' : {'FUTURES' : {'Data' : [{'ScripCode' : 35001, 'LastTradedPrice' : 0}]}}})
+    deadline = time.monotonic() + 5
+    while depth.futures('NIFTY') is None and time.monotonic() < deadline:
+      time.sleep(0.02)
+    futures = depth.futures('NIFTY')['Data'][0]
+    assert futures['ScripCode'] == 35001 and futures['Mid'] > 0 and 'LastTradedPrice' not in futures
+  finally:
+    depth.stop()
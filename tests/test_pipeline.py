@@ -0,0 +1,34 @@
+import time
+import itertools
+
+from pipeline import TickPipeline
+
+
+class Done(Exception):
+  pass
+
+
+def test_slow_render_does_not_fetch_extra_ticks():
+  ticks = itertools.count()
+  fetched, rendered = [], []
+
+  def fetch():
+    fetched.append(next(ticks))
+    return fetched[-1]
+
+  def render(tick):
+    time.sleep(0.02)
+    rendered.append(tick)
+    if len(rendered) == 10:
+      raise Done
+
+  pipeline = TickPipeline(fetch, lambda tick : tick, render)
+  try:
+    pipeline.run()
+  except Done:
+    pass
+  assert rendered == list(range(10))
+  # Tick 10 is computed and tick 11 fetched while tick 9 renders
+  assert len(fetched) <= 12
+  # Every fetched tick is either rendered or still in flight
+  assert fetched[:len(rendered)] == rendered
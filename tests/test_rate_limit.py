@@ -0,0 +1,51 @@
+import time
+import multiprocessing
+
+from py5paisa import RateLimiter
+from py5paisa.rate_limit import default_path
+
+
+def test_requests_are_spaced_after_the_burst(tmp_path):
+  limiter = RateLimiter({'GOC' : 20.0}, burst=2, path=str(tmp_path / 'limit'))
+  try:
+    waits = [limiter.reserve('GOC') for _ in range(6)]
+    assert limiter.reserve('GOC', max_wait=0.1) is None
+    assert limiter.reserve('GE') == 0.0
+  finally:
+    limiter.close()
+  for wait, expected in zip(waits, [0.0, 0.0, 0.05, 0.1, 0.15, 0.2]):
+    assert abs(wait - expected) < 0.02
+
+
+def test_default_path_is_per_api_key():
+  assert default_path(['GOC'], 'KEY1') != default_path(['GOC'], 'KEY2')
+  assert default_path(['GOC'], 'KEY1') == default_path(['GOC'], 'KEY1')
+
+
+def acquire_slots(spec):
+  limiter = RateLimiter(**spec)
+  try:
+    sent = []
+    for _ in range(10):
+      limiter.acquire('GOC')
+      sent.append(time.time())
+    return sent
+  finally:
+    limiter.close()
+
+
+def test_processes_share_one_budget(tmp_path):
+  spec = {'rates' : {'GOC' : 50.0}, 'burst' : 1, 'path' : str(tmp_path / 'limit')}
+  with multiprocessing.Pool(2) as pool:
+    sent = sorted(sum(pool.map(acquire_slots, [spec, spec]), []))
+  # 20 requests at 50 per second : alone each process would be done in 0.18s
+  assert sent[-1] - sent[0] > 19 / 50 * 0.9
+
+
+def test_unopenable_file_limits_this_process_only(tmp_path):
+  limiter = RateLimiter({'GOC' : 20.0}, burst=1, path=str(tmp_path / 'missing' / 'limit'))
+  try:
+    assert limiter.path is None
+    assert [limiter.reserve('GOC') > 0 for _ in range(2)] == [False, True]
+  finally:
+    limiter.close()
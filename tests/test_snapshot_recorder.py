@@ -0,0 +1,83 @@
+import os
+
+import numpy as np
+
+from benchmarks.synthetic import SPOTS, STEPS, option_chain
+from discount_check import FetchOptionData
+from discount_engine import OptionChainArrays, IndexSnapshot, compute_discount
+from snapshot_recorder import SnapshotArchive, SnapshotRecorder, segment_name
+
+# 2023-03-16 11:00 IST
+NOW = 1678944600.0
+
+
+def snapshots(index, count):
+  scanner = FetchOptionData.offline()
+  atm = scanner.getATMStrike(index, SPOTS[index])
+  for seed in range(count):
+    chain = OptionChainArrays.from_options(option_chain(index, 15, seed=seed)['Options'])
+    result = compute_discount(SPOTS[index], chain, atm, STEPS[index], 10)
+    yield IndexSnapshot(index, SPOTS[index], SPOTS[index] + seed, result, 'mid' if seed % 2 else 'ltp')
+
+
+def assert_recorded(record, snapshot, timestamp):
+  result = snapshot.result
+  assert record['index'] == snapshot.index
+  assert record['time'] == int(timestamp * 1000)
+  assert record['futures'] == snapshot.futures_value
+  assert record['futures_mid'] == (snapshot.futures_source == 'mid')
+  assert record['atm_strike'] == result.strikes[result.atm]
+  assert np.isclose(record['call_premium'], snapshot.call_premium)
+  rows = record['rows']
+  assert np.array_equal(rows['strike'], result.strikes)
+  assert np.allclose(rows['ce_ltp'], result.ce_ltp, equal_nan=True)
+  assert np.allclose(rows['pe_premium'], result.pe_premium, equal_nan=True)
+  assert np.array_equal(rows['discount'], result.discount)
+
+
+def test_flushed_snapshots_read_back(tmp_path):
+  recorded = list(snapshots('NIFTY', 3)) + list(snapshots('BANKNIFTY', 2))
+  with SnapshotRecorder(str(tmp_path), flush_interval=3600) as recorder:
+    for i, snapshot in enumerate(recorded[:4]):
+      recorder.record(snapshot, NOW + i)
+    recorder.flush()
+    recorder.record(recorded[4], NOW + 4)
+    # still in the recorder's buffers
+    assert len(SnapshotArchive(str(tmp_path)).segment(segment_name(NOW))) == 4
+
+  archive = SnapshotArchive(str(tmp_path))
+  assert archive.days() == [segment_name(NOW)]
+  segment = archive.segment(segment_name(NOW))
+  assert segment.indices == ['NIFTY', 'BANKNIFTY']
+  assert list(segment.positions('BANKNIFTY')) == [3, 4]
+  for i, snapshot in enumerate(recorded):
+    assert_recorded(segment.snapshot(i), snapshot, NOW + i)
+
+
+def test_reopened_segment_keeps_appending(tmp_path):
+  first, second = snapshots('NIFTY', 2)
+  with SnapshotRecorder(str(tmp_path)) as recorder:
+    recorder.record(first, NOW)
+  with SnapshotRecorder(str(tmp_path)) as recorder:
+    recorder.record(second, NOW + 1)
+  segment = SnapshotArchive(str(tmp_path)).segment(segment_name(NOW))
+  assert segment.snapshot(1)['row_start'] == len(first.result.strikes)
+  assert_recorded(segment.snapshot(0), first, NOW)
+  assert_recorded(segment.snapshot(1), second, NOW + 1)
+
+
+def test_partially_flushed_snapshot_is_left_out(tmp_path):
+  recorded = list(snapshots('NIFTY', 3))
+  with SnapshotRecorder(str(tmp_path)) as recorder:
+    for i, snapshot in enumerate(recorded):
+      recorder.record(snapshot, NOW + i)
+  path = os.path.join(str(tmp_path), segment_name(NOW), 'snapshots')
+  # the last snapshot's put premium was cut mid value, its row count never written
+  with open(os.path.join(path, 'put_premium.bin'), 'r+b') as f:
+    f.truncate(os.path.getsize(f.name) - 2)
+  with open(os.path.join(path, 'row_count.bin'), 'r+b') as f:
+    f.truncate(os.path.getsize(f.name) - 2)
+  segment = SnapshotArchive(str(tmp_path)).segment(segment_name(NOW))
+  assert len(segment) == 2
+  assert [record['time'] for record in segment] == [int(NOW * 1000), int((NOW + 1) * 1000)]
+  assert_recorded(segment.snapshot(1), recorded[1], NOW + 1)
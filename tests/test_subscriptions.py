@@ -0,0 +1,53 @@
+from benchmarks.load_harness import CREDS
+from py5paisa import FivePaisaClient, SubscriptionManager
+
+
+def items(codes):
+  return [{'Exch' : 'N', 'ExchType' : 'D', 'ScripCode' : code} for code in codes]
+
+
+class FlakySocket:
+  """Fails the sends listed in `failures` (0 based), by raising or returning False."""
+  def __init__(self, failures=()):
+    self.failures = dict(failures)
+    self.attempts = 0
+    self.sent = []
+
+  def __call__(self, payload):
+    attempt, self.attempts = self.attempts, self.attempts + 1
+    failure = self.failures.get(attempt)
+    if failure == 'raise':
+      raise ConnectionError('socket closed')
+    if failure == 'refuse':
+      return False
+    self.sent.append((payload['Operation'], [item['ScripCode'] for item in payload['MarketFeedData']]))
+
+
+def manager(socket):
+  return SubscriptionManager(FivePaisaClient(cred=CREDS), batch_size=2, send=socket)
+
+
+def test_failed_batch_stays_pending_until_sent():
+  socket = FlakySocket({1 : 'raise'})
+  subscriptions = manager(socket)
+  subscriptions.set_desired('NIFTY', items([1, 2, 3, 4]))
+
+  assert subscriptions.sync() == (2, 0)
+  assert set(subscriptions.subscribed) == {('N', 'D', 1), ('N', 'D', 2)}
+  assert subscriptions.sync() == (2, 0)
+  assert socket.sent == [('Subscribe', [1, 2]), ('Subscribe', [3, 4])]
+  assert subscriptions.diff() == ([], [])
+
+
+def test_refused_unsubscribe_is_retried():
+  socket = FlakySocket({2 : 'refuse'})
+  subscriptions = manager(socket)
+  subscriptions.set_desired('NIFTY', items([1, 2]))
+  subscriptions.sync()
+  subscriptions.set_desired('NIFTY', items([3]))
+
+  assert subscriptions.sync() == (1, 0)
+  assert set(subscriptions.subscribed) == {('N', 'D', 1), ('N', 'D', 2), ('N', 'D', 3)}
+  assert subscriptions.sync() == (0, 2)
+  assert socket.sent == [('Subscribe', [1, 2]), ('Subscribe', [3]), ('Unsubscribe', [1, 2])]
+  assert list(subscriptions.subscribed) == [('N', 'D', 3)]
@@ -0,0 +1,56 @@
+import threading
+
+import numpy as np
+
+from py5paisa import TickStore
+
+
+def test_ring_keeps_the_last_ticks_oldest_first():
+  store = TickStore(max_instruments=2, capacity=5)
+  for t in range(8):
+    store.append(101, t, 100 + t, volume=10 * t)
+  history = store.history(101)
+  assert list(history['time']) == [3, 4, 5, 6, 7]
+  assert list(history['ltp']) == [103, 104, 105, 106, 107]
+  assert store.count(101) == 5
+  assert store.last(101)['ltp'] == 107
+  assert list(store.latest([101, 202], 'ltp')[:1]) == [107] and np.isnan(store.latest([101, 202])[1])
+
+
+def test_window_reads_across_the_wraparound():
+  store = TickStore(max_instruments=1, capacity=4)
+  for t in (10, 20, 30, 40, 50, 60):
+    store.append(101, t, t / 10, volume=t)
+  # slots now hold 50, 60, 30, 40 : the window reads them in time order
+  assert list(store.window(101, 30, 60)['time']) == [30, 40, 50]
+  assert list(store.window(101, start=45)['ltp']) == [5, 6]
+  assert list(store.window(101, end=30)['time']) == []
+  assert store.vwap(101, 40) == (5 * 10 + 6 * 10) / 20
+  assert len(store.window(202, 0, 100)['time']) == 0
+
+
+def test_instruments_beyond_the_limit_are_rejected():
+  store = TickStore(max_instruments=2, capacity=4)
+  assert store.ingest([{'Token' : code, 'LastRate' : 1.0} for code in (1, 2, 3)]) == 2
+  assert store.rejected == 1 and 3 not in store
+
+
+def test_reads_never_see_a_torn_tick():
+  store = TickStore(max_instruments=1, capacity=64)
+  done = threading.Event()
+
+  def write():
+    for t in range(1, 50001):
+      store.append(101, t, t, volume=t, bid=t, ask=t)
+    done.set()
+
+  writer = threading.Thread(target=write)
+  writer.start()
+  torn = 0
+  while not done.is_set():
+    history = store.history(101)
+    times = history['time']
+    torn += not (np.all(np.diff(times) == 1) and np.array_equal(times, history['volume'])
+                 and np.array_equal(times.astype(np.float32), history['ask']))
+  writer.join()
+  assert torn == 0
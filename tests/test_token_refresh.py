@@ -0,0 +1,45 @@
+import json
+import time
+import base64
+
+from py5paisa.token_refresh import TokenRefresher
+
+LOGIN_ROUTE = 'V4/LoginRequestMobileNewbyEmail'
+
+
+def jwt(**claims):
+  return 'eyJhbGciOiJub25lIn0.' + base64.urlsafe_b64encode(json.dumps(claims).encode()).rstrip(b'=').decode() + '.'
+
+
+class ReissuingClient:
+  """Hands out a new token with the same expiry on every refresh."""
+  def __init__(self, lifetime):
+    self.expires_at = time.time() + lifetime
+    self.refreshes = 0
+    self.Jwt_token = jwt(exp=self.expires_at, jti=0)
+
+  def refresh_session(self, stale_token=None):
+    self.refreshes += 1
+    self.Jwt_token = jwt(exp=self.expires_at, jti=self.refreshes)
+    return True
+
+
+def test_lead_is_clamped_to_the_token_lifetime(fake_broker, logged_in_client):
+  broker = fake_broker(token_lifetime=120)
+  client = logged_in_client(broker)
+  refresher = client.start_token_refresh(600)
+  time.sleep(1)
+  assert broker.requests[LOGIN_ROUTE] == 1
+  assert refresher.refreshes == refresher.failures == 0
+  assert refresher.refresh_due() - time.time() > 50
+
+
+def test_refresh_without_a_later_expiry_backs_off():
+  client = ReissuingClient(0.3)
+  refresher = TokenRefresher(client, lead=600, retry_interval=0.1).start()
+  try:
+    time.sleep(0.6)
+  finally:
+    refresher.stop()
+  assert 1 <= client.refreshes <= 7
+  assert refresher.failures == client.refreshes and refresher.refreshes == 0
@@ -0,0 +1,18 @@
+from benchmarks.load_harness import CREDS, LOGIN
+from py5paisa import FivePaisaClient, MemoryTokenStore
+
+
+def test_sessions_are_not_shared_between_hosts(fake_broker, logged_in_client):
+  store = MemoryTokenStore()
+  first, second = fake_broker(), fake_broker()
+  logged_in_client(first, token_store=store)
+  logins = first.requests['V4/LoginRequestMobileNewbyEmail']
+
+  logged_in_client(first, token_store=store)
+  assert first.requests['V4/LoginRequestMobileNewbyEmail'] == logins
+
+  logged_in_client(second, token_store=store)
+  assert second.requests['V4/LoginRequestMobileNewbyEmail'] == 1
+  # The real API gets no session of either stand-in
+  real = FivePaisaClient(*LOGIN, cred=CREDS, token_store=store)
+  assert not real._restore_session()
@@ -0,0 +1,100 @@
+import time
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+import requests
+
+from py5paisa.transport import RetryBudget, Transport
+
+
+class StubHandler(BaseHTTPRequestHandler):
+  """
+  /trickle sends its body a byte every 0.1s, /unavailable answers 503,
+  /flaky answers 503 to its first two requests and 200 after.
+  """
+  protocol_version = 'HTTP/1.1'
+
+  def do_GET(self):
+    server = self.server
+    with server.lock:
+      server.hits[self.path] = server.hits.get(self.path, 0) + 1
+      hits = server.hits[self.path]
+    if self.path == '/trickle':
+      self.send_response(200)
+      self.send_header('Content-Length', '30')
+      self.end_headers()
+      for _ in range(30):
+        self.wfile.write(b'x')
+        self.wfile.flush()
+        time.sleep(0.1)
+      return
+    status = 503 if self.path == '/unavailable' or (self.path == '/flaky' and hits <= 2) else 200
+    body = b'{}'
+    self.send_response(status)
+    self.send_header('Content-Length', str(len(body)))
+    self.end_headers()
+    self.wfile.write(body)
+
+  def log_message(self, *args):
+    pass
+
+
+@pytest.fixture
+def stub_server():
+  server = ThreadingHTTPServer(('127.0.0.1', 0), StubHandler)
+  server.daemon_threads = True
+  server.hits = {}
+  server.lock = threading.Lock()
+  threading.Thread(target=server.serve_forever, daemon=True).start()
+  server.url = f'http://127.0.0.1:{server.server_address[1]}'
+  yield server
+  server.shutdown()
+  server.server_close()
+
+
+def test_deadline_covers_a_trickling_body(stub_server):
+  transport = Transport(deadlines={'GOC' : 0.5}, retries=0)
+  try:
+    started = time.monotonic()
+    with pytest.raises(requests.Timeout):
+      transport.get(stub_server.url + '/trickle', route='GOC')
+    # every byte comes well within the read timeout, only the deadline stops it
+    assert time.monotonic() - started < 1.0
+    assert transport.stats()['deadline_exceeded'] == 1
+  finally:
+    transport.close()
+
+
+def test_idempotent_routes_are_retried(stub_server):
+  transport = Transport(retries=2, backoff=0.001)
+  try:
+    assert transport.get(stub_server.url + '/flaky', route='GOC').status_code == 200
+    assert stub_server.hits['/flaky'] == 3
+    assert transport.stats()['retries'] == 2
+  finally:
+    transport.close()
+
+
+def test_orders_are_not_retried(stub_server):
+  transport = Transport(retries=2, backoff=0.001)
+  try:
+    assert transport.get(stub_server.url + '/unavailable', route='OP').status_code == 503
+    assert stub_server.hits['/unavailable'] == 1
+  finally:
+    transport.close()
+
+
+def test_retries_stop_when_the_budget_runs_out(stub_server):
+  budget = RetryBudget(ratio=0.0, min_per_second=0.0, max_balance=1.0)
+  transport = Transport(retries=5, backoff=0.001, budget=budget)
+  try:
+    assert transport.get(stub_server.url + '/unavailable', route='GOC').status_code == 503
+    assert transport.get(stub_server.url + '/unavailable', route='GOC').status_code == 503
+    stats = transport.stats()
+  finally:
+    transport.close()
+  # the one retry the budget holds goes to the first request
+  assert stub_server.hits['/unavailable'] == 3
+  assert stats['retries'] == 1
+  assert stats['retry_budget_exhausted'] == 2
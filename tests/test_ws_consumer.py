@@ -0,0 +1,109 @@
+import json
+import time
+import asyncio
+import threading
+
+import pytest
+
+from benchmarks.fake_broker import FakeBroker
+from benchmarks.load_harness import broker_expiries
+from py5paisa.ws_consumer import AsyncFeedConsumer, BoundedQueue, FeedConnection, QueueClosed
+
+NIFTY_FEED = {'Method' : 'MarketFeedV3', 'Operation' : 's', 'ClientCode' : 'loadtest',
+              'MarketFeedData' : [{'Exch' : 'N', 'ExchType' : 'C', 'ScripCode' : 999920000}]}
+
+
+class StubSocket:
+  """aiohttp websocket stand-in whose send_str fails with `error` or takes `delay` seconds."""
+  def __init__(self, error=None, delay=0):
+    self.error = error
+    self.delay = delay
+    self.closed = False
+    self.sent = []
+
+  async def send_str(self, data):
+    await asyncio.sleep(self.delay)
+    if self.error is not None:
+      raise self.error
+    self.sent.append(json.loads(data))
+
+
+@pytest.fixture
+def loop():
+  loop = asyncio.new_event_loop()
+  thread = threading.Thread(target=loop.run_forever, daemon=True)
+  thread.start()
+  yield loop
+  loop.call_soon_threadsafe(loop.stop)
+  thread.join()
+  loop.close()
+
+
+def connected(loop, ws):
+  connection = FeedConnection('feed', 'ws://unused')
+  connection.loop, connection.ws = loop, ws
+  return connection
+
+
+def test_send_reports_whether_the_frame_was_written(loop):
+  ws = StubSocket()
+  assert connected(loop, ws).send({'Operation' : 'Subscribe'}) is True
+  assert ws.sent == [{'Operation' : 'Subscribe'}]
+  assert connected(loop, StubSocket(ConnectionResetError('closed'))).send({}) is False
+  assert connected(loop, StubSocket(delay=1)).send({}, timeout=0.05) is False
+  assert FeedConnection('feed', 'ws://unused').send({}) is False
+
+
+@pytest.mark.parametrize('drop, kept', [('oldest', [2, 3, 4]), ('newest', [0, 1, 2])])
+def test_full_queue_drops_by_policy(drop, kept):
+  queue = BoundedQueue(maxsize=3, drop=drop)
+  for item in range(5):
+    queue.put(item)
+  assert queue.dropped == 2
+  assert [queue.get(timeout=0) for _ in range(3)] == kept
+  assert queue.get(timeout=0) is None
+  queue.close()
+  with pytest.raises(QueueClosed):
+    queue.get()
+
+
+def feed_url(broker):
+  return broker.url.replace('http', 'ws') + '/Feeds/api/chat'
+
+def wait_for(condition, timeout=5):
+  deadline = time.monotonic() + timeout
+  while not condition():
+    assert time.monotonic() < deadline
+    time.sleep(0.01)
+
+
+def test_slow_reader_drops_instead_of_stalling_the_socket(fake_broker):
+  broker = fake_broker(tick_interval=0.005, tick_ratio=1.0)
+  with AsyncFeedConsumer(maxsize=5) as consumer:
+    connection = consumer.add('feed', feed_url(broker), [NIFTY_FEED])
+    wait_for(lambda : consumer.dropped['messages'] >= 10)
+    # the socket kept being read while nobody took the messages
+    assert connection.messages >= 15
+    assert len(consumer.messages) == 5
+
+
+def test_dropped_feed_reconnects_and_resubscribes(fake_broker):
+  broker = fake_broker(tick_interval=0.01, tick_ratio=1.0)
+  port = int(broker.url.rsplit(':', 1)[1])
+  with AsyncFeedConsumer(reconnect_delay=0.05, max_reconnect_delay=0.2) as consumer:
+    connection = consumer.add('feed', feed_url(broker), [NIFTY_FEED])
+    assert consumer.get(timeout=5)[0] == 'feed'
+    broker.stop()
+    wait_for(lambda : not connection.connected)
+    restarted = FakeBroker(latency=0.0, jitter=0.0, expiries=broker_expiries(), tick_interval=0.01, tick_ratio=1.0)
+    restarted.start(port=port)
+    try:
+      wait_for(lambda : connection.connects == 2)
+      while consumer.get(timeout=0) is not None:
+        pass
+      # ticks only flow again once the subscription was sent on the new socket
+      name, ticks = consumer.get(timeout=5)
+      assert ticks[0]['Token'] == 999920000
+      assert restarted.requests['Feeds/api/chat'] == 1
+    finally:
+      restarted.stop()